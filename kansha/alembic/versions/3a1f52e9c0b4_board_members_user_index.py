@@ -0,0 +1,26 @@
+"""Index board memberships by user
+
+Revision ID: 3a1f52e9c0b4
+Revises: 2c0a3788227
+Create Date: 2016-02-02 10:12:37.204513
+
+"""
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '3a1f52e9c0b4'
+down_revision = '2c0a3788227'
+
+
+def upgrade():
+    op.create_index('ix_board_members_user', 'user_boards__board_members',
+                    ['user_username', 'user_source'])
+    op.create_index('ix_board_managers_user', 'user_managed_boards__board_managers',
+                    ['user_username', 'user_source'])
+
+
+def downgrade():
+    op.drop_index('ix_board_managers_user', 'user_managed_boards__board_managers')
+    op.drop_index('ix_board_members_user', 'user_boards__board_members')
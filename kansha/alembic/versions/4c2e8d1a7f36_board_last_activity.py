@@ -0,0 +1,34 @@
+"""Denormalize last activity on boards
+
+Revision ID: 4c2e8d1a7f36
+Revises: 3a1f52e9c0b4
+Create Date: 2016-02-03 14:26:05.718240
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '4c2e8d1a7f36'
+down_revision = '3a1f52e9c0b4'
+
+
+def upgrade():
+    op.add_column('board', sa.Column('last_activity', sa.DateTime, nullable=True))
+
+    board = sa.table('board',
+                     sa.column('id', sa.Integer),
+                     sa.column('last_activity', sa.DateTime))
+    history = sa.table('history',
+                       sa.column('board_id', sa.Integer),
+                       sa.column('when', sa.DateTime))
+    last_activity = sa.select([sa.func.max(history.c.when)]).where(history.c.board_id == board.c.id)
+    op.execute(board.update().values(last_activity=last_activity.as_scalar()))
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.engine.name != 'sqlite':
+        op.drop_column('board', 'last_activity')
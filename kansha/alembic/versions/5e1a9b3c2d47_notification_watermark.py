@@ -0,0 +1,26 @@
+"""Watermark of the notifications per subscriber
+
+Revision ID: 5e1a9b3c2d47
+Revises: 4c2e8d1a7f36
+Create Date: 2016-02-05 11:02:44.381906
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '5e1a9b3c2d47'
+down_revision = '4c2e8d1a7f36'
+
+
+def upgrade():
+    # NULL: the next run sends the events of its timespan, as before
+    op.add_column('user_boards__board_members', sa.Column('last_notified_event', sa.Integer, nullable=True))
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.engine.name != 'sqlite':
+        op.drop_column('user_boards__board_members', 'last_notified_event')
@@ -0,0 +1,34 @@
+"""Index the history by board and date, add the history archive
+
+Revision ID: 6a2f0c4b8e13
+Revises: 5e1a9b3c2d47
+Create Date: 2016-02-08 09:41:17.520314
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '6a2f0c4b8e13'
+down_revision = '5e1a9b3c2d47'
+
+
+def upgrade():
+    op.create_index('ix_history_board_when', 'history', ['board_id', 'when'])
+    op.create_index('ix_history_when', 'history', ['when'])
+    op.create_table(
+        'history_archive',
+        sa.Column('id', sa.Integer, primary_key=True, autoincrement=False),
+        sa.Column('board_id', sa.Integer),
+        sa.Column('when', sa.DateTime),
+        sa.Column('content', sa.LargeBinary)
+    )
+    op.create_index('ix_history_archive_board_when', 'history_archive', ['board_id', 'when'])
+
+
+def downgrade():
+    op.drop_table('history_archive')
+    op.drop_index('ix_history_when', 'history')
+    op.drop_index('ix_history_board_when', 'history')
@@ -0,0 +1,25 @@
+"""Version of the card summaries
+
+Revision ID: 7b3d1e5f9a20
+Revises: 6a2f0c4b8e13
+Create Date: 2016-02-10 15:12:03.104518
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '7b3d1e5f9a20'
+down_revision = '6a2f0c4b8e13'
+
+
+def upgrade():
+    op.add_column('card', sa.Column('version', sa.Integer, nullable=True, server_default='0'))
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.engine.name != 'sqlite':
+        op.drop_column('card', 'version')
@@ -0,0 +1,40 @@
+"""Change journal of the boards
+
+Revision ID: 8c4e2f6a0b31
+Revises: 7b3d1e5f9a20
+Create Date: 2016-02-12 10:27:45.630218
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '8c4e2f6a0b31'
+down_revision = '7b3d1e5f9a20'
+
+
+def upgrade():
+    op.create_table(
+        'board_change',
+        sa.Column('id', sa.Integer, primary_key=True, autoincrement=True),
+        sa.Column('board_id', sa.Integer, sa.ForeignKey('board.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('kind', sa.Unicode(16)),
+        sa.Column('card_id', sa.Integer),
+        sa.Column('column_id', sa.Integer),
+        sa.Column('origin', sa.Unicode(64)),
+        sa.Column('when', sa.DateTime)
+    )
+    op.create_index('ix_board_change_board_id', 'board_change', ['board_id', 'id'])
+    # the boards are synchronized from the journal, not by version anymore
+    bind = op.get_bind()
+    if bind.engine.name != 'sqlite':
+        op.drop_column('board', 'version')
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.engine.name != 'sqlite':
+        op.add_column('board', sa.Column('version', sa.Integer, server_default='0'))
+    op.drop_table('board_change')
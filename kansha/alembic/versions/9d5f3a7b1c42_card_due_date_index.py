@@ -0,0 +1,22 @@
+"""Index the due dates of the cards
+
+Revision ID: 9d5f3a7b1c42
+Revises: 8c4e2f6a0b31
+Create Date: 2016-02-15 14:08:32.417906
+
+"""
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '9d5f3a7b1c42'
+down_revision = '8c4e2f6a0b31'
+
+
+def upgrade():
+    op.create_index('ix_card_due_date_due_date', 'card_due_date', ['due_date'])
+
+
+def downgrade():
+    op.drop_index('ix_card_due_date_due_date', 'card_due_date')
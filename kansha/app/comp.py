@@ -11,17 +11,21 @@
 import cgi
 import sys
 import json
+import time
 import urlparse
+import multiprocessing
 from collections import OrderedDict
+from datetime import datetime, timedelta
 
 import webob
 import configobj
 import pkg_resources
+from elixir import metadata as __metadata__
 
 from nagare.i18n import _, _L
 from nagare.admin import command
 from nagare.namespaces import xhtml5
-from nagare import component, wsgi, security, config, log, i18n
+from nagare import component, wsgi, security, config, log, i18n, database
 
 from kansha import events
 from kansha.card import Card
@@ -29,9 +33,11 @@ from kansha import exceptions
 from kansha.menu import MenuEntry
 from kansha.authentication import login
 from kansha import services, notifications
+from kansha.services.mail import RateLimiter
 from kansha.services.search import SearchEngine
 from kansha.user.usermanager import UserManager
 from kansha.user.user_profile import get_userform  # !!!!!!!!!!!!!!!
+from kansha.board.models import DataBoardChange
 from kansha.board.boardsmanager import BoardsManager
 from kansha.security import SecurityManager, Unauthorized
 
@@ -280,6 +286,8 @@ class WSGIApp(wsgi.WSGIApp):
 
     def start_request(self, root, request, response):
         super(WSGIApp, self).start_request(root, request, response)
+        # the changes made by a session are already displayed by its boards
+        DataBoardChange.set_origin(request.params.get('_s'))
         if security.get_user():
             self.set_locale(security.get_user().get_locale())
 
@@ -346,33 +354,141 @@ class WSGIApp(wsgi.WSGIApp):
         if self.debug:
             raise
 
-    def send_notifications(self, hours, url):
+    def render_notifications(self, board_ids, last_id, hours, url):
+        """Render the notification emails of some boards
 
-        mail_sender = self._services['mail_sender']
-        # Group users by board
-        boards = {}
-        for subscriber in notifications.get_subscribers():
-            boards.setdefault(subscriber.board.id, {'board': subscriber.board,
-                                                    'subscribers': []})['subscribers'].append(subscriber)
-
-        for board in boards.itervalues():
-            if not board['board'].archived:
-                events = services.ActionLog.get_events_for_data(board['board'], hours)
-                for subscriber in board['subscribers']:
-                    data = notifications.filter_events(events, subscriber)
-                    if not data:
-                        continue
-                    locale = UserManager.get_app_user(subscriber.member.username).get_locale()
+        Only plain data is returned, so that the rendering can happen in
+        another process.
+
+        In:
+          - ``board_ids`` -- ids of the boards
+          - ``last_id`` -- id of the last event to notify
+          - ``hours`` -- on their first notification, the subscribers get the events of the last ``hours`` hours
+          - ``url`` -- root URL of the application
+        Return:
+          - a (board id, rendering duration, emails, subscribers) tuple per board, where
+            ``emails`` are (subscriber, email address, subject, content, html content) tuples
+            and ``subscribers`` the subscribers already done, without email to send.
+            Subscribers are identified by (board id, username, source).
+        """
+        boards = OrderedDict()
+        subscribers = notifications.get_subscribers(board_ids).all()
+        subscribers_cards = notifications.get_subscribers_cards(subscribers)
+        for subscriber in subscribers:
+            boards.setdefault(subscriber.board_id, []).append(subscriber)
+
+        # the events after their watermark for the subscribers already notified,
+        # the events of the last hours for the new ones
+        watermarks = [subscriber.last_notified_event for subscriber in subscribers]
+        known = [watermark for watermark in watermarks if watermark is not None]
+        after_id = min(known) if known else None
+        since = datetime.utcnow() - timedelta(hours=hours)
+        new_events = services.ActionLog.get_new_events_for_data(boards.keys(), after_id, last_id,
+                                                                hours if None in watermarks else None)
+        # events rendered once per locale: {locale: {event id: string}}
+        rendered = {}
+
+        digests = []
+        for board_id, board_subscribers in boards.iteritems():
+            start = time.time()
+            events = new_events.get(board_id, [])
+            emails = []
+            done = []
+            for subscriber in board_subscribers:
+                watermark = subscriber.last_notified_event
+                if watermark is None:
+                    data = [event for event in events if event.when >= since]
+                else:
+                    data = [event for event in events if event.id > watermark]
+                member = subscriber.member
+                key = (board_id, member.username, member.source)
+                data = notifications.filter_events(data, subscriber,
+                                                   subscribers_cards.get((member.username, member.source)))
+                if data and not subscriber.board.archived:
+                    locale = UserManager.get_app_user(member.username, data=member).get_locale()
                     self.set_locale(locale)
-                    subject, content, content_html = notifications.generate_email(self.app_title, board['board'],
-                                                                                  subscriber.member, hours, url, data)
-                    mail_sender.send(subject, [subscriber.member.email], content, content_html)
+                    subject, content, content_html = notifications.generate_email(
+                        self.app_title, subscriber.board, member, hours, url, data,
+                        rendered.setdefault((locale.language, locale.territory), {})
+                    )
+                    emails.append((key, member.email, subject, content, content_html))
+                else:
+                    done.append(key)
+            digests.append((board_id, time.time() - start, emails, done))
+        return digests
+
+    def send_notifications(self, hours, url, workers=1, rate=0):
+        """Send the events that happened since the last run to the subscribers
+
+        Each subscriber has a watermark, the id of the last event already
+        processed for them. The watermarks of the subscribers whose email was
+        sent are advanced together, committed by the caller once all the emails
+        are sent, so that a missed or overlapping run neither loses nor
+        duplicates events.
+
+        With several workers, the boards are split in ranges of ids rendered
+        in parallel by a pool of processes, each with its own database
+        connection, while this process sends the emails as they come.
+
+        In:
+          - ``hours`` -- on their first notification, the subscribers get the events of the last ``hours`` hours
+          - ``url`` -- root URL of the application
+          - ``workers`` -- number of processes rendering the emails
+          - ``rate`` -- maximum number of emails sent per second, 0 for no limit
+        Return:
+          - a (board id, rendering duration, number of emails) tuple per board
+        """
+        mail_sender = self._services['mail_sender']
+        # first, the emails previous runs failed to send
+        mail_sender.send_spooled()
+        # events created while sending will be processed by the next run
+        last_id = services.ActionLog.get_last_event_id()
+
+        board_ids = notifications.get_subscribed_boards()
+        size = len(board_ids) // (workers * NOTIFICATIONS_CHUNKS_PER_WORKER) + 1
+        tasks = [(board_ids[i:i + size], last_id, hours, url) for i in xrange(0, len(board_ids), size)]
+
+        pool = None
+        if workers > 1 and len(tasks) > 1:
+            # the workers must not share the connections of this process
+            database.session.close()
+            __metadata__.bind.dispose()
+            pool = multiprocessing.Pool(workers, _init_notifications_worker, (self,))
+            results = pool.imap_unordered(_render_notifications, tasks)
+        else:
+            results = (self.render_notifications(*task) for task in tasks)
+
+        timings = []
+        processed = []
+        limiter = RateLimiter(rate)
+        try:
+            with mail_sender.batch():
+                for digests in results:
+                    for board_id, duration, emails, done in digests:
+                        processed.extend(done)
+                        for key, email, subject, content, content_html in emails:
+                            limiter.wait()
+                            try:
+                                mail_sender.send(subject, [email], content, content_html, raise_errors=True)
+                            except Exception:
+                                # keep the watermark, the events will be sent by the next run
+                                log.exception('Notification to %s failed' % email)
+                                continue
+                            processed.append(key)
+                        timings.append((board_id, duration, len(emails)))
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+        notifications.advance_watermarks(processed, last_id)
+        database.session.flush()
         if self.activity_monitor:
             events = services.ActionLog.get_events_for_data(None, hours)
             new_users = UserManager.get_all_users(hours)
 
             if not (events or new_users):
-                return
+                return timings
             h = xhtml5.Renderer()
             with h.html:
                 h << h.h1('Boards')
@@ -402,6 +518,26 @@ class WSGIApp(wsgi.WSGIApp):
                             h << h.td(usr.registration_date.isoformat())
 
             mail_sender.send('Activity report for '+url, [self.activity_monitor], u'', h.root.write_htmlstring())
+        return timings
+
+
+# boards ranges per worker, so that the load is balanced
+NOTIFICATIONS_CHUNKS_PER_WORKER = 4
+
+# in the notification workers, the application inherited from the parent process
+_notifications_app = None
+
+
+def _init_notifications_worker(app):
+    global _notifications_app
+    _notifications_app = app
+
+
+def _render_notifications(task):
+    try:
+        return _notifications_app.render_notifications(*task)
+    finally:
+        database.session.close()
 
 
 def create_pipe(app, *args, **kw):
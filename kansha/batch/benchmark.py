@@ -0,0 +1,350 @@
+#--
+# Copyright (c) 2012-2015 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+#--
+
+"""
+Benchmark the hot paths of Kansha on synthetic data.
+
+Creates boards with configurable numbers of columns, cards, comments,
+checklists, labels and members in a scratch SQLite database, then times the
+main hot paths and counts their SQL statements. Results are written as JSON
+so that they can be compared between commits.
+
+Registered as a nagare-admin command.
+Usage :
+nagare-admin benchmark [options] <app name | config file>
+"""
+
+import os
+import sys
+import json
+import shutil
+import random
+import tempfile
+import datetime
+import subprocess
+import pkg_resources
+from timeit import default_timer
+
+from sqlalchemy import event
+from elixir import metadata as __metadata__
+from nagare.admin import util, command
+from nagare import database, local, security
+
+from kansha.user.models import DataUser
+from kansha.card.models import DataCard
+from kansha.security import SecurityManager
+from kansha.services.mail import DummyMailSender
+from kansha.board.boardsmanager import BoardsManager
+from kansha.board.models import DataBoard, create_template_empty, create_template_todo
+from kansha.populate import create_boards_from_templates
+from kansha.card_addons.comment import DataComment
+from kansha.services.search import SearchEngine
+from kansha.services.actionlog.models import DataHistory
+from kansha.user.usermanager import UserManager
+from kansha.card_addons.checklist.models import DataChecklist, DataChecklistItem
+
+from .create_index import rebuild_index
+
+
+WORDS = (u'lorem', u'ipsum', u'dolor', u'sit', u'amet', u'consectetur', u'adipiscing', u'elit',
+         u'sed', u'eiusmod', u'tempor', u'incididunt', u'labore', u'dolore', u'magna', u'aliqua')
+
+
+def sentence(nb_words=6):
+    return u' '.join(random.choice(WORDS) for __ in xrange(nb_words)).capitalize()
+
+
+def generate_data(nb_boards=5, nb_columns=5, nb_cards=20, nb_comments=3, nb_checklists=1,
+                  nb_items=5, nb_labels=2, nb_members=5, nb_events=10, templates=None):
+    """Create synthetic users and boards
+
+    The boards are copies of the empty board template, as the boards created
+    by the users. The per board and per card numbers are the same for all the
+    boards and cards.
+
+    In:
+      - ``nb_boards`` -- number of boards
+      - ``nb_columns`` -- number of columns per board, archive excluded
+      - ``nb_cards`` -- number of cards per column
+      - ``nb_comments`` -- number of comments per card
+      - ``nb_checklists`` -- number of checklists per card
+      - ``nb_items`` -- number of items per checklist
+      - ``nb_labels`` -- number of labels per card
+      - ``nb_members`` -- number of members per board, manager included
+      - ``nb_events`` -- number of history events per card
+      - ``templates`` -- folder of board template files (``*.btpl``)
+        to import as additional boards of the manager
+    Return:
+      - the user managing all the boards (DataUser instance)
+    """
+    random.seed(0)
+    template = create_template_empty()
+    create_template_todo()
+
+    users = []
+    for i in xrange(max(nb_members, 1)):
+        user = DataUser(u'bench%d' % i, u'password', u'Bench User %d' % i,
+                        u'bench%d@example.com' % i, language=u'en')
+        user.confirm_email()
+        users.append(user)
+    database.session.flush()
+    manager = users[0]
+
+    now = datetime.datetime.utcnow()
+    for i in xrange(nb_boards):
+        board = template.copy()
+        board.title = u'Benchmark %d' % i
+        for user in users[:nb_members]:
+            board.members.append(user)
+        board.managers.append(manager)
+        for index in xrange(nb_columns):
+            board.create_column(index, sentence(2))
+        board.create_column(nb_columns, u'Archive', archive=True)
+        database.session.flush()
+
+        for column in board.columns[:nb_columns]:
+            for index in xrange(nb_cards):
+                card = DataCard(title=sentence(), index=index, column=column, creation_date=now)
+                card.members = random.sample(users[:nb_members], min(2, nb_members))
+                for label in random.sample(board.labels, min(nb_labels, len(board.labels))):
+                    label.add(card)
+                for __ in xrange(nb_comments):
+                    DataComment(comment=sentence(12), card=card, author=random.choice(users),
+                                creation_date=now)
+                for ck_index in xrange(nb_checklists):
+                    checklist = DataChecklist(title=sentence(2), card=card, author=manager, index=ck_index)
+                    for item_index in xrange(nb_items):
+                        checklist.items.append(DataChecklistItem(title=sentence(3), index=item_index,
+                                                                 done=random.random() < 0.5))
+                for __ in xrange(nb_events):
+                    DataHistory(when=now, action=u'card_create', board=board, card=card, user=manager,
+                                data={'action': u'card_create', 'card': card.title,
+                                      'column': column.title, 'author': manager.fullname})
+            database.session.flush()
+        board.last_activity = now
+    if templates:
+        create_boards_from_templates(manager, templates)
+    database.session.flush()
+    return manager
+
+
+class StatementCounter(object):
+
+    """Count the SQL statements executed by an engine, until closed"""
+
+    def __init__(self, engine):
+        self.count = 0
+        self.engine = engine
+        event.listen(engine, 'before_cursor_execute', self.on_execute)
+
+    def on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+    def close(self):
+        """Stop counting"""
+        if self.engine is not None:
+            event.remove(self.engine, 'before_cursor_execute', self.on_execute)
+            self.engine = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class Benchmark(object):
+
+    """Time and count the SQL statements of the hot paths"""
+
+    def __init__(self, app, user, runs=5):
+        """Initialization
+
+        In:
+          - ``app`` -- the activated WSGIApp
+          - ``user`` -- the DataUser the benchmark runs as
+          - ``runs`` -- number of timed runs per hot path
+        """
+        self.app = app
+        self.runs = runs
+        self.username = user.username
+        self.counter = None
+        self.boards_manager = app._services(BoardsManager, app.app_title, app.app_config['pub_cfg']['banner'],
+                                            app.theme, app.card_extensions)
+        self.results = {}
+
+    def measure(self, name, func, setup=None):
+        """Time ``func``, each run from a cold session
+
+        In:
+          - ``name`` -- name of the hot path in the results
+          - ``func`` -- the function to time, its argument is the result of ``setup``
+          - ``setup`` -- untimed function called before each run
+        """
+        timings = []
+        statements = []
+        for __ in xrange(self.runs):
+            self.new_request()
+            arg = setup() if setup else None
+            count = self.counter.count
+            start = default_timer()
+            func(arg)
+            database.session.flush()
+            timings.append(default_timer() - start)
+            statements.append(self.counter.count - count)
+        timings.sort()
+        self.results[name] = {
+            'runs': self.runs,
+            'min': timings[0],
+            'median': timings[len(timings) // 2],
+            'mean': sum(timings) / len(timings),
+            'max': timings[-1],
+            'statements': max(statements)
+        }
+        print '%-20s %8.4fs (median) %6d statements' % (name, self.results[name]['median'],
+                                                        self.results[name]['statements'])
+
+    def new_request(self):
+        """Start from a cold session, as a new request would"""
+        database.session.flush()
+        database.session.expunge_all()
+        local.request = local.Thread()
+        security.set_manager(SecurityManager('benchmark'))
+        user = UserManager.get_app_user(self.username)
+        security.set_user(user)
+        self.app.set_locale(user.get_locale())
+
+    def run(self):
+        with StatementCounter(__metadata__.bind) as self.counter:
+            self.new_request()
+
+            board_id = DataBoard.query.filter_by(is_template=False).order_by(DataBoard.id).first().id
+
+            def open_board(arg):
+                return self.boards_manager.get_by_id(board_id)
+
+            self.measure('rebuild_index', lambda arg: rebuild_index(self.app))
+            self.measure('board_open', open_board)
+            self.measure('load_user_boards', lambda arg: self.boards_manager.load_user_boards())
+
+            def move_card(board):
+                orig, dest = board.columns[0](), board.columns[1]()
+                card = orig.cards[0]()
+                board.update_card_position(json.dumps({'orig': orig.id, 'dest': dest.id,
+                                                       'card': card.id, 'index': 0}))
+            self.measure('card_move', move_card, lambda: open_board(None))
+            self.measure('search', lambda board: board.search(random.choice(WORDS)), lambda: open_board(None))
+            self.measure('send_notifications', lambda arg: self.app.send_notifications(24, 'http://localhost/'))
+        return self.results
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                                       cwd=os.path.dirname(__file__),
+                                       stderr=subprocess.STDOUT).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, reference):
+    """Print the ratios between results and reference results"""
+    for name, result in sorted(results.iteritems()):
+        ref = reference.get(name)
+        if ref is None:
+            continue
+        print '%-20s time x%.2f, statements %+d' % (name,
+                                                    result['median'] / ref['median'] if ref['median'] else 0,
+                                                    result['statements'] - ref['statements'])
+
+
+class BenchmarkCommand(command.Command):
+
+    desc = 'Benchmark the hot paths on synthetic data.'
+
+    @staticmethod
+    def set_options(optparser):
+        optparser.usage += ' [application]'
+        optparser.add_option('--db', dest='db', default='sqlite://',
+                             help='scratch database URI, default: in memory SQLite')
+        optparser.add_option('--boards', dest='boards', type='int', default=5)
+        optparser.add_option('--columns', dest='columns', type='int', default=5, help='per board')
+        optparser.add_option('--cards', dest='cards', type='int', default=20, help='per column')
+        optparser.add_option('--comments', dest='comments', type='int', default=3, help='per card')
+        optparser.add_option('--checklists', dest='checklists', type='int', default=1, help='per card')
+        optparser.add_option('--items', dest='items', type='int', default=5, help='per checklist')
+        optparser.add_option('--labels', dest='labels', type='int', default=2, help='per card')
+        optparser.add_option('--members', dest='members', type='int', default=5, help='per board')
+        optparser.add_option('--events', dest='events', type='int', default=10, help='per card')
+        optparser.add_option('--templates', dest='templates', default=None,
+                             help='folder of board templates (*.btpl) to import as additional boards')
+        optparser.add_option('--runs', dest='runs', type='int', default=5)
+        optparser.add_option('-o', '--output', dest='output', default='benchmark.json',
+                             help='JSON results file')
+        optparser.add_option('--compare', dest='compare', default=None,
+                             help='previous JSON results file to compare with')
+
+    @staticmethod
+    def run(parser, options, args):
+
+        try:
+            application = args[0]
+        except IndexError:
+            application = 'kansha'
+
+        (cfgfile, app, dist, conf) = util.read_application(application,
+                                                           parser.error)
+        requirement = (
+            None if not dist
+            else pkg_resources.Requirement.parse(dist.project_name)
+        )
+        data_path = (
+            None if not requirement
+            else pkg_resources.resource_filename(requirement, '/data')
+        )
+
+        (active_app, databases) = util.activate_WSGIApp(
+            app, cfgfile, conf, parser.error, data_path=data_path)
+        if not active_app:
+            return
+
+        # never touch the configured database, index and mail server
+        database.set_metadata(__metadata__, options.db, False, {})
+        __metadata__.create_all()
+        index_folder = tempfile.mkdtemp()
+        active_app.search_engine = SearchEngine(engine='sqlite', index='benchmark', index_folder=index_folder)
+        active_app._services.register('search_engine', active_app.search_engine)
+        active_app._services.register('mail_sender', DummyMailSender())
+
+        parameters = dict((name, getattr(options, name))
+                          for name in ('boards', 'columns', 'cards', 'comments', 'checklists',
+                                       'items', 'labels', 'members', 'events', 'templates', 'runs'))
+        try:
+            user = generate_data(options.boards, options.columns, options.cards, options.comments,
+                                 options.checklists, options.items, options.labels, options.members,
+                                 options.events, options.templates)
+            results = Benchmark(active_app, user, options.runs).run()
+        finally:
+            database.session.rollback()
+            shutil.rmtree(index_folder, ignore_errors=True)
+
+        report = {
+            'revision': git_revision(),
+            'date': datetime.datetime.utcnow().isoformat(),
+            'python': sys.version.split()[0],
+            'parameters': parameters,
+            'results': results
+        }
+        with open(options.output, 'w') as output:
+            json.dump(report, output, indent=2, sort_keys=True)
+        print 'Results written to', options.output
+
+        if options.compare:
+            with open(options.compare) as reference:
+                compare(results, json.load(reference)['results'])
@@ -25,27 +25,63 @@ Usage :
 nagare-admin create-index <app name | config file>
 """
 
+import sys
+import time
 import pkg_resources
 
 from nagare import database
 from nagare.admin import util, command
 
 from kansha.card.comp import Card
-from kansha.column.comp import Column
 from kansha.card.models import DataCard
-from kansha.services.actionlog import DummyActionLog
+from kansha.column.models import DataColumn
 
 
-# FIXME: too low level
-def rebuild_index(app):
-    # init index
-    action_log = DummyActionLog()
+def iter_card_rows(chunk_size):
+    """Yield the rows needed to index the cards, in chunks paginated on the card id
+
+    Return:
+        - iterator on lists of (card id, title, board id, archived)
+    """
+    last_id = 0
+    while True:
+        q = database.session.query(DataCard.id, DataCard.title, DataColumn.board_id, DataColumn.archive)
+        q = q.join(DataCard.column)
+        q = q.filter(DataCard.id > last_id).order_by(DataCard.id).limit(chunk_size)
+        rows = q.all()
+        if not rows:
+            break
+        yield rows
+        last_id = rows[-1][0]
+
+
+def rebuild_index(app, chunk_size=1000, verbose=False):
+    """Rebuild the whole search index
+
+    Documents are built from the rows and the batched extension data,
+    without instantiating any component, and committed chunk by chunk.
+    """
     app.search_engine.create_collection([Card.schema])
-    for card in DataCard.query:
-        board_id = card.column.board.id
-        card = app._services(Card, card.id, app.card_extensions, action_log, data=card)
-        card.add_to_index(app.search_engine, board_id)
-    app.search_engine.commit()
+    start = time.time()
+    nb_cards = 0
+    for rows in iter_card_rows(chunk_size):
+        documents = dict((card_id, Card.schema(docid='card_%d' % card_id, title=title, board_id=board_id,
+                                               archived=bool(archived)))
+                         for card_id, title, board_id, archived in rows)
+        app.card_extensions.update_documents(documents)
+        # durability is useless while the index is rebuilt
+        app.search_engine.add_documents(documents.values(), bulk=True)
+        app.search_engine.commit()
+        # keep the memory use flat
+        database.session.expunge_all()
+        nb_cards += len(rows)
+        if verbose:
+            duration = time.time() - start
+            sys.stdout.write('\r%d cards indexed (%.0f cards/s)' % (nb_cards, nb_cards / duration if duration else 0))
+            sys.stdout.flush()
+    if verbose:
+        sys.stdout.write('\n')
+    app.search_engine.optimize()
 
 
 class ReIndex(command.Command):
@@ -55,6 +91,10 @@ class ReIndex(command.Command):
     @staticmethod
     def set_options(optparser):
         optparser.usage += ' [application]'
+        optparser.add_option('--chunk-size', dest='chunk_size', type='int', default=1000,
+                             help='number of cards indexed per commit')
+        optparser.add_option('-q', '--quiet', dest='verbose', action='store_false', default=True,
+                             help="don't show the progress")
 
     @staticmethod
     def run(parser, options, args):
@@ -80,4 +120,4 @@ class ReIndex(command.Command):
         for (database_settings, populate) in databases:
             database.set_metadata(*database_settings)
         if active_app:
-            rebuild_index(active_app)
+            rebuild_index(active_app, options.chunk_size, options.verbose)
@@ -0,0 +1,83 @@
+#--
+# Copyright (c) 2012-2015 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+#--
+
+"""
+Move the files of an assets folder to the storage by content, so that
+identical files are stored once.
+Registered as a nagare-admin command.
+Usage :
+nagare-admin migrate-assets <app name | config file>
+"""
+
+import sys
+import pkg_resources
+
+from nagare.admin import util, command
+
+
+def migrate_assets(assets_manager, verbose=False):
+    """Migrate all the files stored before
+
+    In:
+      - ``assets_manager`` -- the assets manager service
+      - ``verbose`` -- show the progress
+    Return:
+      - (number of files migrated, number of files whose content was already stored)
+    """
+    nb = shared = 0
+    for __, already_stored in assets_manager.migrate_all():
+        nb += 1
+        shared += already_stored
+        if verbose:
+            sys.stdout.write('\r%d file(s) migrated' % nb)
+            sys.stdout.flush()
+    if verbose and nb:
+        sys.stdout.write('\n')
+    return nb, shared
+
+
+class MigrateAssets(command.Command):
+
+    desc = 'Store the assets by content, identical files being stored once.'
+
+    @staticmethod
+    def set_options(optparser):
+        optparser.usage += ' [application]'
+        optparser.add_option('-q', '--quiet', dest='verbose', action='store_false', default=True,
+                             help="don't show the progress")
+
+    @staticmethod
+    def run(parser, options, args):
+
+        try:
+            application = args[0]
+        except IndexError:
+            application = 'kansha'
+
+        (cfgfile, app, dist, conf) = util.read_application(application,
+                                                           parser.error)
+        requirement = (
+            None if not dist
+            else pkg_resources.Requirement.parse(dist.project_name)
+        )
+        data_path = (
+            None if not requirement
+            else pkg_resources.resource_filename(requirement, '/data')
+        )
+
+        (active_app, databases) = util.activate_WSGIApp(
+            app, cfgfile, conf, parser.error, data_path=data_path)
+        if not active_app:
+            return
+
+        assets_manager = active_app._services['assets_manager']
+        if not hasattr(assets_manager, 'migrate_all'):
+            parser.error('The assets manager has nothing to migrate')
+        nb, shared = migrate_assets(assets_manager, options.verbose)
+        print '%d file(s) migrated, %d duplicate(s) removed' % (nb, shared)
@@ -0,0 +1,94 @@
+#--
+# Copyright (c) 2012-2015 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+#--
+
+"""
+Send the notification emails, the emails being rendered by a pool of processes.
+Registered as a nagare-admin command.
+Usage :
+nagare-admin send-notifications --url <application url> [options] <app name | config file>
+"""
+
+import time
+import pkg_resources
+
+from nagare import database
+from nagare.admin import util, command
+
+
+def report(timings, duration, nb_slowest=10):
+    """Print the rendering times per board
+
+    In:
+      - ``timings`` -- list of (board id, rendering duration, number of emails)
+      - ``duration`` -- total duration of the run
+      - ``nb_slowest`` -- number of boards detailed
+    """
+    print '%d board(s), %d email(s) in %.2fs, %.2fs of rendering' % (
+        len(timings), sum(nb for __, __, nb in timings), duration, sum(d for __, d, __ in timings))
+    slowest = sorted(timings, key=lambda timing: timing[1], reverse=True)[:nb_slowest]
+    if slowest:
+        print 'Slowest boards:'
+        for board_id, board_duration, nb in slowest:
+            print '  board %-8d %8.3fs %6d email(s)' % (board_id, board_duration, nb)
+
+
+class SendNotifications(command.Command):
+
+    desc = 'Send the notification emails.'
+
+    @staticmethod
+    def set_options(optparser):
+        optparser.usage += ' [application]'
+        optparser.add_option('--url', dest='url', default=None,
+                             help='root URL of the application, mandatory')
+        optparser.add_option('--hours', dest='hours', type='int', default=24,
+                             help='events older than that are never sent, default: 24')
+        optparser.add_option('-w', '--workers', dest='workers', type='int', default=1,
+                             help='number of processes rendering the emails')
+        optparser.add_option('--rate', dest='rate', type='float', default=0,
+                             help='maximum number of emails sent per second, default: no limit')
+        optparser.add_option('--slowest', dest='slowest', type='int', default=10,
+                             help='number of slowest boards reported')
+
+    @staticmethod
+    def run(parser, options, args):
+
+        try:
+            application = args[0]
+        except IndexError:
+            application = 'kansha'
+
+        if not options.url:
+            parser.error('The root URL of the application is mandatory')
+        if options.workers < 1:
+            parser.error('At least one worker is needed')
+
+        (cfgfile, app, dist, conf) = util.read_application(application,
+                                                           parser.error)
+        requirement = (
+            None if not dist
+            else pkg_resources.Requirement.parse(dist.project_name)
+        )
+        data_path = (
+            None if not requirement
+            else pkg_resources.resource_filename(requirement, '/data')
+        )
+
+        (active_app, databases) = util.activate_WSGIApp(
+            app, cfgfile, conf, parser.error, data_path=data_path)
+        for (database_settings, populate) in databases:
+            database.set_metadata(*database_settings)
+        if not active_app:
+            return
+
+        start = time.time()
+        timings = active_app.send_notifications(options.hours, options.url, options.workers, options.rate)
+        # advance the watermarks
+        database.session.commit()
+        report(timings, time.time() - start, options.slowest)
@@ -0,0 +1,127 @@
+#--
+# Copyright (c) 2012-2015 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+#--
+
+"""
+Move the events older than the retention delay from the action log
+to the compact history archive, or delete them.
+The events are processed by chunks, each in its own transaction, so
+that it can run on a live site.
+The old entries of the board change journal are deleted too.
+Registered as a nagare-admin command.
+Usage :
+nagare-admin prune-history --days <retention delay> [--delete] <app name | config file>
+"""
+
+import sys
+import time
+import datetime
+import pkg_resources
+
+from nagare import database
+from nagare.admin import util, command
+
+from kansha.board.models import DataBoardChange
+from kansha.services.actionlog.models import DataHistory
+
+
+def prune_history(days, chunk_size=1000, delete=False, pause=0, verbose=False):
+    """Archive or delete the events older than ``days`` days
+
+    In:
+      - ``days`` -- retention delay
+      - ``chunk_size`` -- number of events per transaction
+      - ``delete`` -- delete the events instead of archiving them
+      - ``pause`` -- seconds between two chunks, to spare the database
+      - ``verbose`` -- show the progress
+    Return:
+      - number of events processed
+    """
+    before = datetime.datetime.utcnow() - datetime.timedelta(days=days)
+    process = DataHistory.prune if delete else DataHistory.archive
+    total = 0
+    while True:
+        nb = process(before, chunk_size)
+        database.session.commit()
+        if not nb:
+            break
+        total += nb
+        if verbose:
+            sys.stdout.write('\r%d events %s' % (total, 'deleted' if delete else 'archived'))
+            sys.stdout.flush()
+        if pause:
+            time.sleep(pause)
+    if verbose:
+        sys.stdout.write('\n')
+    return total
+
+
+def prune_changes(days):
+    """Delete the board changes older than ``days`` days
+
+    The journal is only read by the boards displayed in the live sessions.
+
+    In:
+      - ``days`` -- retention delay
+    Return:
+      - number of changes deleted
+    """
+    nb = DataBoardChange.prune(datetime.datetime.utcnow() - datetime.timedelta(days=days))
+    database.session.commit()
+    return nb
+
+
+class PruneHistory(command.Command):
+
+    desc = 'Archive or delete the action log events older than the retention delay.'
+
+    @staticmethod
+    def set_options(optparser):
+        optparser.usage += ' [application]'
+        optparser.add_option('--days', dest='days', type='int', default=None,
+                             help='retention delay in days, mandatory')
+        optparser.add_option('--chunk-size', dest='chunk_size', type='int', default=1000,
+                             help='number of events per transaction')
+        optparser.add_option('--delete', dest='delete', action='store_true', default=False,
+                             help="delete the events instead of archiving them")
+        optparser.add_option('--pause', dest='pause', type='float', default=0,
+                             help='seconds between two chunks')
+        optparser.add_option('--journal-days', dest='journal_days', type='int', default=7,
+                             help='retention delay of the board change journal, in days, default: 7')
+        optparser.add_option('-q', '--quiet', dest='verbose', action='store_false', default=True,
+                             help="don't show the progress")
+
+    @staticmethod
+    def run(parser, options, args):
+
+        try:
+            application = args[0]
+        except IndexError:
+            application = 'kansha'
+
+        if options.days is None or options.days < 0:
+            parser.error('The retention delay is mandatory')
+
+        (cfgfile, app, dist, conf) = util.read_application(application,
+                                                           parser.error)
+        requirement = (
+            None if not dist
+            else pkg_resources.Requirement.parse(dist.project_name)
+        )
+        data_path = (
+            None if not requirement
+            else pkg_resources.resource_filename(requirement, '/data')
+        )
+
+        (active_app, databases) = util.activate_WSGIApp(
+            app, cfgfile, conf, parser.error, data_path=data_path)
+        for (database_settings, populate) in databases:
+            database.set_metadata(*database_settings)
+        if active_app:
+            prune_history(options.days, options.chunk_size, options.delete, options.pause, options.verbose)
+            prune_changes(options.journal_days)
@@ -0,0 +1,94 @@
+#--
+# Copyright (c) 2012-2015 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+#--
+
+"""
+Send the emails of the mail queue, see the ``queue`` option of the mail service.
+Registered as a nagare-admin command.
+Usage :
+nagare-admin send-mails [--loop] <app name | config file>
+nagare-admin send-mails --dead-letters [--purge] <app name | config file>
+"""
+
+import time
+import pkg_resources
+
+from nagare.admin import util, command
+
+
+def send_mails(mail_sender, loop=False, interval=10):
+    """Drain the mail queue
+
+    In:
+      - ``mail_sender`` -- the mail service
+      - ``loop`` -- keep on polling the queue, instead of stopping once it is empty
+      - ``interval`` -- seconds between two polls of an empty queue
+    Return:
+      - number of emails taken from the queue
+    """
+    total = 0
+    while True:
+        nb = mail_sender.process_queue()
+        total += nb
+        if not nb:
+            if not loop:
+                return total
+            time.sleep(interval)
+
+
+class SendMails(command.Command):
+
+    desc = 'Send the emails of the mail queue.'
+
+    @staticmethod
+    def set_options(optparser):
+        optparser.usage += ' [application]'
+        optparser.add_option('--loop', dest='loop', action='store_true', default=False,
+                             help='run as a worker, polling the queue forever')
+        optparser.add_option('--interval', dest='interval', type='int', default=10,
+                             help='seconds between two polls of an empty queue')
+        optparser.add_option('--dead-letters', dest='dead_letters', action='store_true', default=False,
+                             help='list the emails abandoned after too many attempts, instead of sending')
+        optparser.add_option('--purge', dest='purge', action='store_true', default=False,
+                             help='with --dead-letters, delete them')
+
+    @staticmethod
+    def run(parser, options, args):
+
+        try:
+            application = args[0]
+        except IndexError:
+            application = 'kansha'
+
+        (cfgfile, app, dist, conf) = util.read_application(application,
+                                                           parser.error)
+        requirement = (
+            None if not dist
+            else pkg_resources.Requirement.parse(dist.project_name)
+        )
+        data_path = (
+            None if not requirement
+            else pkg_resources.resource_filename(requirement, '/data')
+        )
+
+        (active_app, databases) = util.activate_WSGIApp(
+            app, cfgfile, conf, parser.error, data_path=data_path)
+        if not active_app:
+            return
+
+        mail_sender = active_app._services['mail_sender']
+        if mail_sender.queue is None:
+            parser.error('No mail queue configured')
+        if options.dead_letters:
+            for id_, from_, to, error in mail_sender.queue.dead_letters():
+                print '%d: from %s to %s, %s' % (id_, from_, ', '.join(to), error)
+            if options.purge:
+                print '%d dead letter(s) deleted' % mail_sender.queue.purge()
+            return
+        nb = send_mails(mail_sender, options.loop, options.interval)
+        print '%d mail(s) processed, %d still queued' % (nb, len(mail_sender.queue))
@@ -9,6 +9,8 @@
 
 import sys
 
+from nagare import database
+
 
 APP = 'kansha'
 
@@ -23,3 +25,5 @@ if len(sys.argv) < 3 or not sys.argv[1].isdigit():
     print 'Please provide the timespan (in hours, as integer) of the summary and the root URL of the app'
     sys.exit(0)
 app.send_notifications(int(sys.argv[1]), sys.argv[2])
+# advance the watermarks
+database.session.commit()
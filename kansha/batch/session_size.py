@@ -0,0 +1,136 @@
+#--
+# Copyright (c) 2012-2015 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+#--
+
+"""
+Report what a board takes in a session: the pickled size of the board
+component, once rendered, by type of object, and the pickling time.
+Registered as a nagare-admin command.
+Usage :
+nagare-admin session-size --board <board id> [--user <username>] <app name | config file>
+"""
+
+import cPickle
+import pkg_resources
+from timeit import default_timer
+
+from nagare.namespaces import xhtml5
+from nagare.admin import util, command
+from nagare import component, database, local, security
+
+from kansha.pickle import SizePickler
+from kansha.board.models import DataBoard
+from kansha.security import SecurityManager
+from kansha.user.usermanager import UserManager
+from kansha.board.boardsmanager import BoardsManager
+
+
+def measure_board(app, board_id, username, render=True):
+    """Pickle a board component the way the sessions do
+
+    In:
+      - ``app`` -- the activated WSGIApp
+      - ``board_id`` -- id of the board
+      - ``username`` -- the user displaying the board
+      - ``render`` -- render the board before, as the sessions keep what the rendering built
+    Return:
+      - the SizePickler, the pickling time or None if the board is only picklable with Stackless Python
+    """
+    local.request = local.Thread()
+    security.set_manager(SecurityManager('session-size'))
+    user = UserManager.get_app_user(username)
+    security.set_user(user)
+    app.set_locale(user.get_locale())
+
+    boards_manager = app._services(BoardsManager, app.app_title, app.app_config['pub_cfg']['banner'],
+                                   app.theme, app.card_extensions)
+    board = component.Component(boards_manager.get_by_id(board_id))
+    if render:
+        board.on_answer(lambda x: None).render(xhtml5.Renderer())
+
+    try:
+        start = default_timer()
+        cPickle.dumps(board, cPickle.HIGHEST_PROTOCOL)
+        duration = default_timer() - start
+    except (cPickle.PicklingError, TypeError):
+        duration = None
+
+    pickler = SizePickler()
+    pickler.measure(board)
+    return pickler, duration
+
+
+def report(pickler, duration, limit=30):
+    """Print the sizes by type, largest first"""
+    total = pickler.output.tell()
+    print '%-60s %8s %10s %8s %6s' % ('type', 'number', 'bytes', 'average', '%')
+    sizes = sorted(pickler.sizes.iteritems(), key=lambda size: size[1][1], reverse=True)
+    for name, (nb, size) in sizes[:limit]:
+        print '%-60s %8d %10d %8d %5.1f%%' % (name, nb, size, size // nb, 100.0 * size / total)
+    print 'Total: %d bytes' % total
+    if pickler.unpicklable:
+        print 'Closures counted as unpicklable, use Stackless Python for exact sizes: %d' % (
+            sum(pickler.unpicklable.itervalues()))
+    if duration is not None:
+        print 'Pickling time: %.4fs' % duration
+
+
+class SessionSize(command.Command):
+
+    desc = 'Report the pickled size of a board component by type of object.'
+
+    @staticmethod
+    def set_options(optparser):
+        optparser.usage += ' [application]'
+        optparser.add_option('--board', dest='board', type='int', default=None,
+                             help='id of the board, mandatory')
+        optparser.add_option('--user', dest='user', default=None,
+                             help='username of the user displaying the board, default: a manager')
+        optparser.add_option('--no-render', dest='render', action='store_false', default=True,
+                             help="don't render the board before pickling it")
+        optparser.add_option('--limit', dest='limit', type='int', default=30,
+                             help='number of types reported')
+
+    @staticmethod
+    def run(parser, options, args):
+
+        try:
+            application = args[0]
+        except IndexError:
+            application = 'kansha'
+
+        if options.board is None:
+            parser.error('The board id is mandatory')
+
+        (cfgfile, app, dist, conf) = util.read_application(application,
+                                                           parser.error)
+        requirement = (
+            None if not dist
+            else pkg_resources.Requirement.parse(dist.project_name)
+        )
+        data_path = (
+            None if not requirement
+            else pkg_resources.resource_filename(requirement, '/data')
+        )
+
+        (active_app, databases) = util.activate_WSGIApp(
+            app, cfgfile, conf, parser.error, data_path=data_path)
+        for (database_settings, populate) in databases:
+            database.set_metadata(*database_settings)
+        if not active_app:
+            return
+
+        board = DataBoard.get(options.board)
+        if board is None:
+            parser.error('No board %d' % options.board)
+        username = options.user or board.managers[0].username
+        try:
+            pickler, duration = measure_board(active_app, options.board, username, options.render)
+        finally:
+            database.session.rollback()
+        report(pickler, duration, options.limit)
@@ -13,10 +13,44 @@ from collections import OrderedDict
 from nagare import security, component, i18n
 
 from kansha import events
+from kansha.services import ActionLog
 
+from .models import DataBoard
 from .comp import Board, BOARD_PRIVATE, BOARD_PUBLIC
 
 
+class BoardMembership(object):
+    """Roles of a user on a board, as prefetched by ``DataBoard.get_user_boards``
+
+    Used as a lightweight security subject so that the board list
+    can be filtered without instantiating ``Board`` components.
+    """
+
+    def __init__(self, data, user, is_member, is_manager):
+        """Initialization
+
+        In:
+         - ``data`` -- the DataBoard instance
+         - ``user`` -- the user the roles belong to (User instance)
+         - ``is_member`` -- is the user member of the board?
+         - ``is_manager`` -- is the user manager of the board?
+        """
+        self.id = data.id
+        self.archived = data.archived
+        self._user = (user.username, user.source)
+        self._is_member = is_member
+        self._is_manager = is_manager
+
+    def _is_user(self, user):
+        return (user.username, user.source) == self._user
+
+    def has_member(self, user):
+        return self._is_member and self._is_user(user)
+
+    def has_manager(self, user):
+        return self._is_manager and self._is_user(user)
+
+
 class BoardsManager(object):
     def __init__(self, app_title, app_banner, theme, card_extensions, search_engine_service, services_service):
         self.app_title = app_title
@@ -27,9 +61,9 @@ class BoardsManager(object):
         self._services = services_service
 
         self.last_modified_boards = {}
-        self.my_boards = {}
-        self.guest_boards = {}
-        self.archived_boards = {}
+        self.my_boards = OrderedDict()
+        self.guest_boards = OrderedDict()
+        self.archived_boards = OrderedDict()
         self.templates = {}
 
     def get_by_id(self, id_):
@@ -76,22 +110,33 @@ class BoardsManager(object):
         self.guest_boards.clear()
         self.archived_boards.clear()
         last_modifications = {}
-        for board_id, in Board.get_all_board_ids(): # Comma is important
+        never_modified = {}
+        for data, member_id, manager_id in DataBoard.get_user_boards(user.username, user.source):
+            membership = BoardMembership(data, user, member_id is not None, manager_id is not None)
+            is_manager = security.has_permissions('manage', membership)
+            if not (is_manager or security.has_permissions('edit', membership)):
+                continue
+            board_id = data.id
             board_obj = self._services(Board, board_id, self.app_title, self.app_banner, self.theme,
                                        self.card_extensions,
                                        load_children=False)
-            if security.has_permissions('manage', board_obj) or security.has_permissions('edit', board_obj):
-                board_comp = component.Component(board_obj)
-                if board_obj.archived:
-                    self.archived_boards[board_id] = board_comp
+            board_comp = component.Component(board_obj)
+            if membership.archived:
+                self.archived_boards[board_id] = board_comp
+            else:
+                # denormalized by the action log, no need to query the history
+                if data.last_activity is not None:
+                    last_modifications[board_id] = (data.last_activity, board_comp)
                 else:
-                    last_activity = board_obj.get_last_activity()
-                    if last_activity is not None:
-                        last_modifications[board_id] = (last_activity, board_comp)
-                    if security.has_permissions('manage', board_obj):
-                        self.my_boards[board_id] = board_comp
-                    elif security.has_permissions('edit', board_obj):
-                        self.guest_boards[board_id] = board_comp
+                    never_modified[board_id] = board_comp
+                if is_manager:
+                    self.my_boards[board_id] = board_comp
+                else:
+                    self.guest_boards[board_id] = board_comp
+
+        # boards without denormalized date yet: one grouped query for all of them
+        for board_id, last_activity in ActionLog.get_last_activities_for_data(never_modified.keys()).iteritems():
+            last_modifications[board_id] = (last_activity, never_modified[board_id])
 
         last_5 = sorted(last_modifications.values(), reverse=True)[:5]
         self.last_modified_boards = OrderedDict((comp().id, comp) for _modified, comp in last_5)
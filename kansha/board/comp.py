@@ -11,6 +11,7 @@
 import re
 import json
 import unicodedata
+import dateutil.parser
 from cStringIO import StringIO
 from functools import partial
 
@@ -28,13 +29,15 @@ from kansha.column import comp as column
 from kansha.user.comp import PendingUser
 from kansha.toolbox import popin, overlay
 from kansha.card_addons.label import Label
+from kansha.card_addons.due_date.models import DataCardDueDate
 from kansha.authentication.database import forms
 from kansha import events, exceptions, validator
 
+from .snapshot import BoardSnapshot
 from .boardconfig import BoardConfig
 from .excel_export import ExcelExport
 from .templates import SaveTemplateTask
-from .models import DataBoard, DataBoardMember
+from .models import DataBoard, DataBoardMember, DataBoardChange, CARD_UPDATED, COLUMN_CHANGES
 
 
 # Board visibility
@@ -64,6 +67,8 @@ class Board(events.EventHandlerMixIn):
 
     MAX_SHOWN_MEMBERS = 4
     background_max_size = 3 * 1024  # in Bytes
+    # beyond that many changes, the columns are reloaded instead of synchronized
+    MAX_SYNC_CHANGES = 50
 
     def __init__(self, id_, app_title, app_banner, theme, card_extensions, search_engine_service,
                  assets_manager_service, mail_sender_service, services_service,
@@ -97,7 +102,7 @@ class Board(events.EventHandlerMixIn):
 
         self.action_log = ActionLog(self)
 
-        self.version = self.data.version
+        self.last_change = None  # sequence number of the last change displayed
         self.modal = component.Component(popin.Empty())
         self.card_matches = set()  # search results
         self.last_search = u''
@@ -231,32 +236,128 @@ class Board(events.EventHandlerMixIn):
     def switch_view(self):
         self.model = 'calendar' if self.model == 'columns' else 'columns'
 
+    def find_card(self, card_id):
+        """Find the component of a card
+
+        In:
+            - ``card_id`` -- id of the card
+        Return:
+            - the column component and the card component, or ``(None, None)``
+        """
+        for col_comp in self.columns:
+            for card_comp in col_comp().cards:
+                if getattr(card_comp(), 'db_id', None) == card_id:
+                    return col_comp, card_comp
+        return None, None
+
+    def calendar_events(self, start, end):
+        """The cards due in a window of the calendar
+
+        In:
+            - ``start`` -- first day of the window
+            - ``end`` -- day after the window
+        Return:
+            - the FullCalendar events, one per card
+        """
+        editable = security.has_permissions('edit', self)
+        return [{'id': card_id, 'title': card_title, 'start': due_date.isoformat(),
+                 'allDay': True, 'editable': editable}
+                for card_id, card_title, due_date
+                in DataCardDueDate.get_board_due_dates(self.data, start, end, self.show_archive)]
+
+    def calendar_feed(self, request, response):
+        """Event source of the calendar: the cards due between the
+        ``start`` and ``end`` parameters, in JSON
+        """
+        try:
+            start = dateutil.parser.parse(request.GET['start']).date()
+            end = dateutil.parser.parse(request.GET['end']).date()
+        except (KeyError, ValueError):
+            raise exc.HTTPBadRequest()
+        e = exc.HTTPOk()
+        e.content_type = 'application/json'
+        e.cache_control = 'no-cache'
+        e.body = json.dumps(self.calendar_events(start, end))
+        raise e
+
+    def open_calendar_card(self, card_id):
+        """A card of the calendar was clicked, open it in the card editor
+
+        In:
+            - ``card_id`` -- id of the card
+        """
+        col_comp, card_comp = self.find_card(int(card_id))
+        if card_comp is not None:
+            card_comp.on_answer(col_comp().handle_event, col_comp)
+            card_comp().emit_event(card_comp, events.CardClicked, card_comp)
+
+    @security.permissions('edit')
+    def move_calendar_card(self, data):
+        """A card of the calendar was dropped on a new date
+
+        In:
+            - ``data`` -- JSON of the card id and the new date
+        """
+        data = json.loads(data)
+        __, card_comp = self.find_card(data['card'])
+        if card_comp is not None:
+            card_comp().card_dropped(dateutil.parser.parse(data['start']).date())
+
     def load_children(self):
         columns = []
-        for c in self.data.columns:
+        self.last_change = DataBoardChange.get_last_id(self.data)
+        snapshot = BoardSnapshot(self.data, self.card_extensions)
+        for c in snapshot.columns:
             col = self._services(
                 column.Column, c.id, self, self.card_extensions,
-                self.action_log, data=c)
+                self.action_log, data=c, prefetched=snapshot.prefetched)
             if col.is_archive:
                 self.archive_column = col
             columns.append(component.Component(col))
 
         self.columns = columns
 
-    def increase_version(self):
-        refresh = False
-        self.version += 1
-        self.data.increase_version()
-        if self.data.version - self.version != 0:
-            self.refresh()  # when does that happen?
-            self.version = self.data.version
-            refresh = True
-        return refresh
-
-    def refresh(self):
-        print "refresh!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!"
-        print "if you see this message, please contact RTE."
-        self.load_children()
+    def sync(self):
+        """Catch up with the changes made by the other sessions
+
+        Only the columns whose cards were added, moved or removed and the
+        updated cards are refreshed. The changes made by this session
+        are already displayed.
+
+        Return:
+            - ``None`` if nothing changed
+            - ``True`` if all the columns were reloaded
+            - else the list of the refreshed column components and the list
+              of the refreshed card components
+        """
+        changes = DataBoardChange.get_changes(self.data, self.last_change or 0, self.MAX_SYNC_CHANGES + 1)
+        if not changes:
+            return None
+        origin = DataBoardChange.get_origin()
+        others = [change for change in changes if change.origin != origin]
+        if (self.last_change is None or len(changes) > self.MAX_SYNC_CHANGES or
+                any(change.kind in COLUMN_CHANGES for change in others)):
+            self.load_children()
+            return True
+        self.last_change = changes[-1].id
+        if not others:
+            return None
+
+        column_ids = set(change.column_id for change in others if change.kind != CARD_UPDATED)
+        card_ids = set(change.card_id for change in others if change.kind == CARD_UPDATED)
+        columns = []
+        cards = []
+        for col_comp in self.columns:
+            col = col_comp()
+            if col.db_id in column_ids:
+                col.refresh()
+                columns.append(col_comp)
+            else:
+                for card_comp in col.cards:
+                    if card_comp().db_id in card_ids:
+                        card_comp().refresh()
+                        cards.append(card_comp)
+        return columns, cards
 
     @property
     def all_members(self):
@@ -322,7 +423,6 @@ class Board(events.EventHandlerMixIn):
             self.card_extensions, self.action_log)
         self.columns.insert(
             index, component.Component(col_obj))
-        self.increase_version()
         return col_obj
 
     @security.permissions('edit')
@@ -334,7 +434,6 @@ class Board(events.EventHandlerMixIn):
         """
         self.columns.remove(col_comp)
         col_comp().delete()
-        self.increase_version()
         return popin.Empty()
 
     @security.permissions('edit')
@@ -466,6 +565,7 @@ class Board(events.EventHandlerMixIn):
         for column in self.columns:
             column().delete(purge=True)
         self.data.delete_history()
+        self.data.delete_changes()
         self.data.delete_members()
         session.refresh(self.data)
         self.data.delete()
@@ -683,10 +783,11 @@ class Board(events.EventHandlerMixIn):
         Params:
             - ``emails`` -- list of emails
         """
-        for email in set(emails):
-            # If user already exists add it to the board directly or invite it otherwise
-            invitation = forms.EmailInvitation(self.app_title, self.app_banner, self.theme, email, security.get_user().data, self.data, application_url)
-            invitation.send_email(self.mail_sender)
+        with self.mail_sender.batch():
+            for email in set(emails):
+                # If user already exists add it to the board directly or invite it otherwise
+                invitation = forms.EmailInvitation(self.app_title, self.app_banner, self.theme, email, security.get_user().data, self.data, application_url)
+                invitation.send_email(self.mail_sender)
 
     def resend_invitation(self, pending_member, application_url):
         """Resend an invitation,
@@ -10,17 +10,26 @@
 
 import uuid
 import urllib
+import weakref
+import threading
+from datetime import datetime
 
-from elixir import using_options
+from elixir import using_options, using_table_options
 from elixir import ManyToOne, OneToMany
-from elixir import Field, Unicode, Integer, Boolean, UnicodeText
+from elixir import Field, Unicode, Integer, Boolean, UnicodeText, DateTime
 
+from kansha import push
 from kansha.models import Entity
 from nagare.database import session
+from sqlalchemy import and_, select, union, event, func, Index
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import instance_state
+from kansha.card.models import DataCard
 from kansha.card_addons.label import DataLabel
 from kansha.column.models import DataColumn
 from sqlalchemy.ext.associationproxy import AssociationProxy
 from kansha.user.models import DataUser, DataBoardMember, DataBoardManager
+from kansha.services.actionlog.models import DataHistory, DataHistoryArchive
 
 
 class DataBoard(Entity):
@@ -41,6 +50,7 @@ class DataBoard(Entity):
      - ``pending`` -- invitations pending for new members (use token)
      - ``archive`` -- display archive column ? (0 false, 1 true)
      - ``archived`` -- is board archived ?
+     - ``last_activity`` -- date of the last event logged on the board
     """
     using_options(tablename='board')
     title = Field(Unicode(255))
@@ -52,7 +62,6 @@ class DataBoard(Entity):
     votes_allowed = Field(Integer, default=1)
     description = Field(UnicodeText, default=u'')
     visibility = Field(Integer, default=0)
-    version = Field(Integer, default=0, server_default='0')
     board_members = OneToMany('DataBoardMember', cascade='delete')
     board_managers = OneToMany('DataBoardManager', cascade='delete')
     members = AssociationProxy('board_members', 'member', creator=lambda member: DataBoardMember(member=member))
@@ -67,6 +76,7 @@ class DataBoard(Entity):
     title_color = Field(Unicode(255))
     show_archive = Field(Integer, default=0)
     archived = Field(Boolean, default=False)
+    last_activity = Field(DateTime, nullable=True)
 
     weighting_cards = Field(Integer, default=0)
     weights = Field(Unicode(255), default=u'')
@@ -102,14 +112,15 @@ class DataBoard(Entity):
         session.flush()
 
     def delete_history(self):
-        for event in self.history:
-            session.delete(event)
+        # no need to load the events, there may be lots of them
         session.flush()
+        DataHistory.query.filter_by(board=self).delete(synchronize_session=False)
+        DataHistoryArchive.delete_board(self.id)
+        session.expire(self, ['history'])
 
-    def increase_version(self):
-        self.version += 1
-        if self.version > 2147483600:
-            self.version = 1
+    def delete_changes(self):
+        session.flush()
+        DataBoardChange.query.filter_by(board=self).delete(synchronize_session=False)
 
     @property
     def url(self):
@@ -202,6 +213,42 @@ class DataBoard(Entity):
     def get_all_board_ids(cls):
         return session.query(cls.id).filter_by(is_template=False).order_by(cls.title)
 
+    @classmethod
+    def get_user_boards(cls, user_username, user_source):
+        """Return the boards of a user along with his roles on them
+
+        The boards are selected through the membership tables so that the
+        cost only depends on the number of boards the user belongs to.
+
+        In:
+         - ``user_username`` -- username of the user
+         - ``user_source`` -- authentication source of the user
+        Return:
+         - query of (DataBoard instance, member board id, manager board id) tuples,
+           the ids being None when the user doesn't have the role
+        """
+        member = and_(DataBoardMember.board_id == cls.id,
+                      DataBoardMember.user_username == user_username,
+                      DataBoardMember.user_source == user_source)
+        manager = and_(DataBoardManager.board_id == cls.id,
+                       DataBoardManager.user_username == user_username,
+                       DataBoardManager.user_source == user_source)
+        board_ids = union(
+            select([DataBoardMember.board_id]).where(
+                and_(DataBoardMember.user_username == user_username,
+                     DataBoardMember.user_source == user_source)),
+            select([DataBoardManager.board_id]).where(
+                and_(DataBoardManager.user_username == user_username,
+                     DataBoardManager.user_source == user_source))
+        )
+
+        q = session.query(cls, DataBoardMember.board_id, DataBoardManager.board_id)
+        q = q.outerjoin((DataBoardMember, member))
+        q = q.outerjoin((DataBoardManager, manager))
+        q = q.filter(cls.id.in_(board_ids))
+        q = q.filter(cls.is_template == False)
+        return q.order_by(cls.title)
+
     @classmethod
     def get_templates_for(cls, user_username, user_source, public_value):
         q = cls.query
@@ -228,6 +275,176 @@ class DataBoard(Entity):
         return label
 
 
+# Kinds of changes of the board journal
+CARD_ADDED = u'card_added'
+CARD_UPDATED = u'card_updated'
+CARD_MOVED = u'card_moved'
+CARD_REMOVED = u'card_removed'
+COLUMN_ADDED = u'column_added'
+COLUMN_UPDATED = u'column_updated'
+COLUMN_REMOVED = u'column_removed'
+COLUMN_CHANGES = (COLUMN_ADDED, COLUMN_UPDATED, COLUMN_REMOVED)
+
+# the nagare session of the current request
+_origin = threading.local()
+# last changes to push once committed: {session: {board uri: sequence number}}
+_unpublished = weakref.WeakKeyDictionary()
+
+
+class DataBoardChange(Entity):
+    """Change journal of the boards
+
+    The id is the sequence number of the change. The cards and the columns
+    are only referenced by id, they may not exist anymore.
+
+     - ``kind`` -- kind of change, see the constants above
+     - ``card_id`` -- id of the card added, updated or removed
+     - ``column_id`` -- id of the column changed, or of the column whose
+       cards were added, moved or removed
+     - ``origin`` -- id of the session which made the change
+     - ``when`` -- date of the change
+    """
+    using_options(tablename='board_change')
+    using_table_options(Index('ix_board_change_board_id', 'board_id', 'id'))
+
+    board = ManyToOne('DataBoard', ondelete='cascade', required=True)
+    kind = Field(Unicode(16))
+    card_id = Field(Integer)
+    column_id = Field(Integer)
+    origin = Field(Unicode(64))
+    when = Field(DateTime)
+
+    @staticmethod
+    def set_origin(origin):
+        """Set the session making the changes of the current request"""
+        _origin.value = origin and unicode(origin)
+
+    @staticmethod
+    def get_origin():
+        return getattr(_origin, 'value', None)
+
+    @classmethod
+    def get_last_id(cls, board):
+        """Sequence number of the last change of the board, 0 if there is none"""
+        return session.query(func.max(cls.id)).filter(cls.board_id == board.id).scalar() or 0
+
+    @classmethod
+    def get_changes(cls, board, after_id, limit=None):
+        """Changes of the board, in order
+
+        In:
+          - ``board`` -- DataBoard instance
+          - ``after_id`` -- sequence number of the last change already known
+          - ``limit`` -- maximum number of changes
+        Return:
+          - list of DataBoardChange
+        """
+        q = cls.query.filter(cls.board_id == board.id).filter(cls.id > after_id)
+        q = q.order_by(cls.id)
+        if limit is not None:
+            q = q.limit(limit)
+        return q.all()
+
+    @classmethod
+    def get_last_ids(cls, boards):
+        """Sequence numbers of the last changes of several boards, in one query
+
+        In:
+          - ``boards`` -- DataBoard instances
+        Return:
+          - a dictionary {board uri: sequence number}
+        """
+        uris = dict((board.id, board.uri) for board in boards)
+        q = session.query(cls.board_id, func.max(cls.id)).filter(cls.board_id.in_(uris))
+        return dict((uris[board_id], last_id) for board_id, last_id in q.group_by(cls.board_id))
+
+    @classmethod
+    def prune(cls, before):
+        """Delete the changes older than ``before``, return their number"""
+        return cls.query.filter(cls.when < before).delete(synchronize_session=False)
+
+    @classmethod
+    def write_changes(cls, session, changes, deleted=()):
+        """Insert the changes in one statement
+
+        In:
+          - ``session`` -- the SQLAlchemy session
+          - ``changes`` -- set of (board, kind, card id, column id)
+          - ``deleted`` -- objects being deleted, the changes of their boards
+            are dropped
+        Return:
+          - the boards changed
+        """
+        when = datetime.utcnow()
+        origin = cls.get_origin()
+        changes = [change for change in changes if change[0] is not None and change[0] not in deleted]
+        rows = [
+            {'board_id': board.id, 'kind': kind, 'card_id': card_id, 'column_id': column_id,
+             'origin': origin, 'when': when}
+            for board, kind, card_id, column_id in changes
+        ]
+        if rows:
+            session.execute(cls.table.insert().values(rows))
+        return set(board for board, __, __, __ in changes)
+
+
+def _card_changes(session, card):
+    column = card.column
+    if card in session.new:
+        kind = CARD_ADDED
+    elif card in session.deleted:
+        kind = CARD_REMOVED
+    elif set(instance_state(card).committed_state) - set(('index', 'column', 'column_id')):
+        kind = CARD_UPDATED
+    else:
+        # moves are seen on the columns
+        return []
+    return [(column and column.board, kind, card.id, column and column.id)]
+
+
+def _column_changes(session, column):
+    changes = set(instance_state(column).committed_state)
+    if column in session.new:
+        kind = COLUMN_ADDED
+    elif column in session.deleted:
+        kind = COLUMN_REMOVED
+    elif changes - set(('cards',)):
+        kind = COLUMN_UPDATED
+    elif changes:
+        # cards were added, removed or moved in the column
+        kind = CARD_MOVED
+    else:
+        return []
+    return [(column.board, kind, None, column.id)]
+
+
+@event.listens_for(Session, 'after_flush')
+def _write_board_changes(session, flush_context):
+    # the history of the objects is still available and the new ones have an id
+    changes = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, DataCard):
+            changes.update(_card_changes(session, obj))
+        elif isinstance(obj, DataColumn):
+            changes.update(_column_changes(session, obj))
+    if changes:
+        # nobody displays the boards created by this flush yet
+        boards = DataBoardChange.write_changes(session, changes, set(session.deleted) | set(session.new))
+        if boards and push.activated():
+            _unpublished.setdefault(session, {}).update(DataBoardChange.get_last_ids(boards))
+
+
+@event.listens_for(Session, 'after_commit')
+def _publish_board_changes(session):
+    for uri, last_id in _unpublished.pop(session, {}).iteritems():
+        push.publish(uri, last_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _drop_board_changes(session):
+    _unpublished.pop(session, None)
+
+
 # Populate
 DEFAULT_LABELS = (
     (u'Green', u'#22C328'),
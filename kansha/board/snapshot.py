@@ -0,0 +1,75 @@
+# -*- coding:utf-8 -*-
+#--
+# Copyright (c) 2012-2014 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+#--
+
+from sqlalchemy.orm import joinedload, subqueryload
+from sqlalchemy.orm.attributes import set_committed_value
+
+from kansha.column.models import DataColumn
+from kansha.user.models import DataBoardMember, DataBoardManager
+
+
+class BoardSnapshot(object):
+
+    """Everything needed to display a board, loaded in a fixed number of queries
+
+    Whatever the number of cards, loads:
+      - the columns and their cards (2 queries),
+      - the board members and managers, with their users (2 queries),
+      - the summaries of the card extensions: labels, members, votes, checklists,
+        comments, due dates, covers... (about one query per extension type).
+
+    ``Column`` and ``Card`` components are then built from ``columns`` and
+    ``prefetched`` without hitting the database again.
+    """
+
+    def __init__(self, data, card_extensions):
+        """Initialization
+
+        In:
+          - ``data`` -- the DataBoard instance
+          - ``card_extensions`` -- the card extensions repository
+        """
+        self.data = data
+        self.columns = self.load_columns(data)
+        self.load_members(data)
+        self.prefetched = card_extensions.prefetch([card.id for card in self.cards])
+
+    @property
+    def cards(self):
+        """All the cards of the board, archived ones included"""
+        return [card for column in self.columns for card in column.cards]
+
+    @staticmethod
+    def load_columns(data):
+        """Load the columns of the board and their cards
+
+        The ``columns`` relationship of the board is set with them.
+
+        In:
+          - ``data`` -- the DataBoard instance
+        Return:
+          - list of DataColumn instances, by index
+        """
+        q = DataColumn.query.filter_by(board=data)
+        q = q.options(subqueryload('cards')).order_by(DataColumn.index)
+        columns = q.all()
+        set_committed_value(data, 'columns', columns)
+        return columns
+
+    @staticmethod
+    def load_members(data):
+        """Load the members and managers of the board, with their users
+
+        In:
+          - ``data`` -- the DataBoard instance
+        """
+        for relation, cls in (('board_members', DataBoardMember), ('board_managers', DataBoardManager)):
+            q = cls.query.filter_by(board=data).options(joinedload('member'))
+            set_committed_value(data, relation, q.all())
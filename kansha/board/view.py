@@ -11,7 +11,7 @@
 from nagare.i18n import _, _N
 from nagare import ajax, component, presentation, security, var
 
-from kansha import notifications
+from kansha import notifications, push
 from kansha.toolbox import overlay, remote
 from kansha.board.boardconfig import WeightsSequenceEditor
 
@@ -257,32 +257,80 @@ def render_Board_columns(self, h, comp, *args):
     if lang != 'en':
         h.head.javascript_url('js/fullcalendar-2.2.6/lang/%s.js' % lang)
 
+    cards_id = h.generate_id('cards')
+    # the events are fetched by window, one callback serves all the cards
+    feed_url = h.a.action(self.calendar_feed, with_request=True).get('href')
+
+    # On card click
+    action = ajax.Update(action=self.open_calendar_card,
+                         render=lambda r: render_calendar_cards(self, r, cards_id),
+                         component_to_update=cards_id)
+    clicked_url = '%s;_a;%s=' % (h.add_sessionid_in_url(sep=';'), action._generate_replace(1, h))
+
+    # On card drop
+    action = ajax.Update(action=self.move_calendar_card, render=lambda r: '')
+    dropped_url = '%s;_a;%s=' % (h.add_sessionid_in_url(sep=';'), action._generate_replace(1, h))
+
     with h.div(id='viewport-wrapper'):
         with h.div(class_='clearfix', id='viewport'):
             h << h.div(id='calendar')
-            h << h.script("""YAHOO.kansha.app.create_board_calendar($('#calendar'), %s)""" % ajax.py2js(True, h))
-    for column in self.columns:
-        h << column.render(h, 'calendar')
+            h << h.script("YAHOO.kansha.app.create_board_calendar($('#calendar'), %s, %s, %s, %s)" % (
+                ajax.py2js(True, h), ajax.py2js(feed_url), ajax.py2js(clicked_url), ajax.py2js(dropped_url)
+            ))
+    h << render_calendar_cards(self, h, cards_id)
+    return h.root
+
+
+def render_calendar_cards(self, h, cards_id):
+    """Render the cards of the calendar opened in the card editor
+
+    In:
+      - ``cards_id`` -- id of the element replaced by the rendering
+    """
+    # the editor is closed with a reload of the page, that refetches the events
+    r = h.SyncRenderer()
+    with h.div(id=cards_id):
+        h << [column.render(r, 'calendar') for column in self.columns]
+    return h.root
+
+
+def render_sync(self, h, sync_id):
+    """Render the changes made by the other sessions
+
+    In:
+      - ``sync_id`` -- id of the element replaced by the rendering
+    """
+    changes = self.sync()
+    with h.div(id=sync_id):
+        if changes is True:
+            h << h.script('reload_columns();')
+        elif changes:
+            columns, cards = changes
+            h << h.script('YAHOO.kansha.app.syncBoard(%s, %s);' % (
+                ajax.py2js([col().id for col in columns]),
+                ajax.py2js([card().id for card in cards])
+            ))
     return h.root
 
 
 @presentation.render_for(Board, 'columns')
 def render_Board_columns(self, h, comp, *args):
     """Render viewport containing the columns"""
-    update_if_version_mismatch = lambda renderer: comp.render(renderer, 'columns') if self.increase_version() else ''
+    sync_id = h.generate_id()
+    sync = lambda renderer: render_sync(self, renderer, sync_id)
 
     with h.div(id='viewport-wrapper'):
         with h.div(class_='clearfix', id='viewport'):
 
             # On cards drag and drop
-            action = ajax.Update(action=self.update_card_position, render=update_if_version_mismatch)
+            action = ajax.Update(action=self.update_card_position, render=sync, component_to_update=sync_id)
             action = '%s;_a;%s=' % (h.add_sessionid_in_url(sep=';'), action._generate_replace(1, h))
             h.head.javascript(h.generate_id(), '''function _send_card_position(data) {
                 nagare_getAndEval(%s + YAHOO.lang.JSON.stringify(data));
             }''' % ajax.py2js(action))
 
             # On columns drag and drop
-            action = ajax.Update(action=self.update_column_position, render=update_if_version_mismatch)
+            action = ajax.Update(action=self.update_column_position, render=sync, component_to_update=sync_id)
             action = '%s;_a;%s=' % (h.add_sessionid_in_url(sep=';'), action._generate_replace(1, h))
             h.head.javascript(h.generate_id(), '''function _send_column_position(data) {
                 nagare_getAndEval(%s + YAHOO.lang.JSON.stringify(data));
@@ -293,8 +341,16 @@ def render_Board_columns(self, h, comp, *args):
             reload_board = h.a.action(ajax.Update()).get('onclick').replace('return', "")
             h.head.javascript(h.generate_id(), """function reload_columns(){%s}""" % reload_board)
 
-            increase_version = h.a.action(ajax.Update(render=update_if_version_mismatch))
-            h.head.javascript(h.generate_id(), """function increase_version() {%s}""" % increase_version.get('onclick'))
+            # Render only what the other users changed since the last call
+            sync_board = h.a.action(ajax.Update(render=sync, component_to_update=sync_id))
+            h.head.javascript(h.generate_id(), """function sync_board() {%s}""" % sync_board.get('onclick'))
+            h << h.div(id=sync_id)
+
+            # Synchronize when the other users change the board
+            push_url = push.get_url(h.request.application_url, self.data.uri)
+            if push_url:
+                h << h.script('YAHOO.kansha.app.subscribeBoard(%s, %s);' % (
+                    ajax.py2js(push_url), ajax.py2js(self.last_change or 0)))
 
             # Render columns
             with h.div(id='lists'):
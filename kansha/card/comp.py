@@ -8,9 +8,9 @@
 # this distribution.
 # --
 
-import dateutil.parser
+import datetime
 
-from nagare import component, security
+from nagare import component, i18n, security
 
 from kansha import title
 from kansha import events
@@ -42,12 +42,13 @@ class Card(events.EventHandlerMixIn):
                            schema.Int('board_id'),
                            schema.Boolean('archived'))
 
-    def __init__(self, id_, card_extensions, action_log, services_service, data=None):
+    def __init__(self, id_, card_extensions, action_log, services_service, data=None, prefetched=None):
         """Initialization
 
         In:
             - ``id_`` -- the id of the card in the database
             - ``column`` -- father
+            - ``prefetched`` -- extensions summaries fetched in bulk (see ``CardExtensions.prefetch``)
         """
         self.db_id = id_
         self.id = 'card_' + str(self.db_id)
@@ -55,10 +56,14 @@ class Card(events.EventHandlerMixIn):
         self.action_log = action_log.for_card(self)
         self._services = services_service
         self._data = data
-        self.extensions = ()
-        self.refresh()
-
-    def add_to_index(self, search_engine, board_id, update=False):
+        self.prefetched = prefetched or {}
+        self._title = None
+        self._extensions = None
+        # opened in the card editor
+        self.opened = False
+
+    def to_document(self, board_id):
+        """Return the search document of the card"""
         data = {'docid': self.id,
                 'title': self.get_title(),
                 'board_id': board_id,
@@ -66,6 +71,10 @@ class Card(events.EventHandlerMixIn):
         document = self.schema(**data)
         for name, extension in self.extensions:
             extension().update_document(document)
+        return document
+
+    def add_to_index(self, search_engine, board_id, update=False):
+        document = self.to_document(board_id)
         if update:
             search_engine.update_document(document)
         else:
@@ -91,12 +100,34 @@ class Card(events.EventHandlerMixIn):
     def refresh(self):
         """Refresh the sub components
         """
-        self.title = component.Component(
-            title.EditableTitle(self.get_title)).on_answer(self.set_title)
-        self.extensions = [
-            (name, component.Component(extension))
-            for name, extension in self.card_extensions.instantiate_items(self, self.action_log, self._services)
-        ]
+        self._title = None
+        self._extensions = None
+
+    @property
+    def title(self):
+        """The title component, only instantiated when needed
+        """
+        if self._title is None:
+            self._title = component.Component(
+                title.EditableTitle(self.get_title)).on_answer(self.set_title)
+        return self._title
+
+    @property
+    def has_extensions(self):
+        return self._extensions is not None
+
+    @property
+    def extensions(self):
+        """The card extensions, only instantiated when needed
+        """
+        if self._extensions is None:
+            self._extensions = [
+                (name, component.Component(extension))
+                for name, extension in self.card_extensions.instantiate_items(self, self.action_log, self._services)
+            ]
+            # now owned by the extensions
+            self.prefetched = {}
+        return self._extensions
 
     @property
     def data(self):
@@ -108,8 +139,22 @@ class Card(events.EventHandlerMixIn):
 
     def __getstate__(self):
         self._data = None
+        self.prefetched = {}
+        if not self.opened:
+            # the summary of a closed card only needs its id, the sub
+            # components are rebuilt on demand
+            self._title = None
+            self._extensions = None
         return self.__dict__
 
+    def get_fragment_key(self, *names):
+        """Key of a summary fragment in the fragment cache
+
+        The key changes with the version of the card, the language and
+        the day, for the relative dates.
+        """
+        return (self.db_id, self.data.version, str(i18n.get_locale()), datetime.date.today()) + names
+
     @property
     def archived(self):
         return self.data.archived
@@ -148,16 +193,18 @@ class Card(events.EventHandlerMixIn):
         for __, extension in self.extensions:
             extension().delete()
 
-    def card_dropped(self, request, response):
+    def card_dropped(self, start):
         """
         Dropped on new date (calendar view).
         """
-        start = dateutil.parser.parse(request.GET['start']).date()
         for __, extension in self.extensions:
             extension().new_card_position(start)
 
     def emit_event(self, comp, kind, data=None):
-        if kind == events.PopinClosed:
+        if kind == events.CardClicked:
+            self.opened = True
+        elif kind == events.PopinClosed:
+            self.opened = False
             kind = events.CardEditorClosed
         return super(Card, self).emit_event(comp, kind, data)
 
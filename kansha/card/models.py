@@ -12,6 +12,10 @@ from elixir import using_options
 from elixir import ManyToMany, ManyToOne
 from elixir import Field, Integer, DateTime, UnicodeText
 from nagare.database import session
+from peak.rules import when
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import instance_state
 import datetime
 
 from kansha.models import Entity
@@ -25,6 +29,8 @@ class DataCard(Entity):
     index = Field(Integer)
     creation_date = Field(DateTime, default=datetime.datetime.utcnow)
     column = ManyToOne('DataColumn')
+    # increased when the summary of the card (title, headers, covers, badges) changes
+    version = Field(Integer, default=0, server_default='0')
 
     # feature data to move to card extensions
     members = ManyToMany('DataUser')
@@ -40,6 +46,75 @@ class DataCard(Entity):
         if datauser in self.members:
             self.members.remove(datauser)
 
+    @classmethod
+    def get_members_by_cards(cls, card_ids):
+        '''Return the members of many cards at once
+
+        In:
+            - ``card_ids`` -- list of card ids
+        Return:
+            - a dictionary {card id: [DataUser]}
+        '''
+        from kansha.user.models import DataUser
+        members = {}
+        q = session.query(cls.id, DataUser).select_from(cls).join(cls.members)
+        q = q.filter(cls.id.in_(card_ids))
+        for card_id, member in q:
+            members.setdefault(card_id, []).append(member)
+        return members
+
+    @classmethod
+    def get_cards_by_members(cls, members):
+        '''Return the cards of many users at once
+
+        In:
+            - ``members`` -- list of DataUser
+        Return:
+            - a dictionary {(username, source): set of card ids}
+        '''
+        from kansha.user.models import DataUser
+        cards = dict(((member.username, member.source), set()) for member in members)
+        if not cards:
+            return cards
+        q = session.query(DataUser.username, DataUser.source, cls.id).select_from(cls).join(cls.members)
+        q = q.filter(DataUser.username.in_(set(username for username, __ in cards)))
+        for username, source, card_id in q:
+            if (username, source) in cards:
+                cards[(username, source)].add(card_id)
+        return cards
+
+    def increase_version(self):
+        self.version = (self.version or 0) + 1
+        if self.version > 2147483600:
+            self.version = 1
+
     @property
     def archived(self):
         return self.column.archive
+
+
+def summary_cards(obj):
+    """Return the cards whose summary depends on a modified object
+
+    Base function to be augmented with peak.rules.
+    By default, the card of the objects having a ``card`` attribute.
+    """
+    card = getattr(obj, 'card', None)
+    return (card,) if isinstance(card, DataCard) else ()
+
+
+@when(summary_cards, (DataCard,))
+def summary_cards_card(card):
+    # moving a card doesn't change its summary
+    changes = set(instance_state(card).committed_state) - set(('index', 'column', 'column_id', 'version'))
+    return (card,) if changes else ()
+
+
+@event.listens_for(Session, 'before_flush')
+def _increase_versions(session, flush_context, instances):
+    cards = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        cards.update(summary_cards(obj))
+    for card in cards:
+        if card not in session.deleted:
+            card.increase_version()
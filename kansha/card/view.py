@@ -7,7 +7,6 @@
 # the file LICENSE.txt, which you should have received as part of
 # this distribution.
 # --
-import peak
 
 from nagare.i18n import _
 from nagare import ajax, presentation, security, var
@@ -35,11 +34,25 @@ def render_card_new(self, h, comp, *args):
     return h.root
 
 
+def render_summary(self, h, name, comp, model):
+    """Render a summary view of the card, from the fragment cache if possible
+
+    In:
+        - ``name`` -- name of the extension, or 'title'
+        - ``comp`` -- the extension or the title component
+        - ``model`` -- the view
+    """
+    fragment_cache = self._services.get('fragment_cache')
+    if fragment_cache is None or (name != 'title' and model not in comp().CACHED_VIEWS):
+        return comp.render(h, model)
+    return fragment_cache.render(h, self.get_fragment_key(name, model), lambda h: comp.render(h, model))
+
+
 @presentation.render_for(Card)
 def render(self, h, comp, *args):
     """Render the card"""
 
-    extensions = [extension.on_answer(self.handle_event, comp) for name, extension in self.extensions]
+    extensions = [(name, extension.on_answer(self.handle_event, comp)) for name, extension in self.extensions]
 
     card_id = h.generate_id()
 
@@ -47,13 +60,13 @@ def render(self, h, comp, *args):
     with h.div(id=self.id, class_='card'):
         with h.div(id=card_id, onclick=onclick):
             with h.div(class_='headers'):
-                h << [extension.render(h, 'header') for extension in extensions]
+                h << [render_summary(self, h, name, extension, 'header') for name, extension in extensions]
             with h.div(class_='covers'):
                 with h.div(class_='title'):
-                    h << self.title.render(h, 'readonly')
-                h << [extension.render(h, 'cover') for extension in extensions]
+                    h << render_summary(self, h, 'title', self.title, 'readonly')
+                h << [render_summary(self, h, name, extension, 'cover') for name, extension in extensions]
             with h.div(class_='badges'):
-                h << [extension.render(h, 'badge') for extension in extensions]
+                h << [render_summary(self, h, name, extension, 'badge') for name, extension in extensions]
 
     h << h.script(
         "YAHOO.kansha.reload_cards[%s]=function() {%s}""" % (
@@ -133,27 +146,7 @@ def render_card_delete(self, h, comp, model):
 
 @presentation.render_for(Card, 'calendar')
 def render(self, h, comp, *args):
-    card = ajax.py2js(self, h)
-    if card:
-        clicked_cb = h.a.action(
-            lambda: self.emit_event(comp, events.CardClicked, comp)
-        ).get('onclick')
-
-        dropped_cb = h.a.action(
-            ajax.Update(
-                action=self.card_dropped,
-                render=lambda render: '',
-                with_request=True
-            )
-        ).get('onclick')[:-2]
-
-        h << h.script(u"""YAHOO.kansha.app.add_event($('#calendar'), %(card)s,
-                         function() { %(clicked_cb)s},
-                         function(start) { %(dropped_cb)s&start="+start);} )""" % {
-            'card': card,
-            'clicked_cb': clicked_cb,
-            'dropped_cb': dropped_cb
-        })
+    """The card is an event fetched by the calendar, see ``Board.calendar_events``"""
     return h.root
 
 
@@ -177,7 +170,7 @@ def render_new_card(self, h, comp, *args):
     h << h.a(h.strong('+'), h.span(_('Add a card')),
              class_='link-small').action(comp.becomes, model='add')
     if self.needs_refresh:
-        h << h.script('increase_version();')
+        h << h.script('sync_board();')
         self.toggle_refresh()
     return h.root
 
@@ -204,15 +197,3 @@ def render_new_card_add(self, h, comp, *args):
     h << h.script("""document.getElementById(%s).focus(); """ % ajax.py2js(id_))
 
     return h.root
-
-
-# TODO should be in due_date extension
-@peak.rules.when(ajax.py2js, (Card,))
-def py2js(card, h):
-    due_date = dict(card.extensions)['due_date']().due_date
-    if not due_date:
-        return None
-    due_date = ajax.py2js(due_date, h)
-
-    return u'{title:%s, editable:true, allDay: true, start: %s}' % (
-            ajax.py2js(card.get_title(), h).decode('utf-8'), due_date)
@@ -199,14 +199,43 @@ class Checklist(object):
 class Checklists(CardExtension):
 
     LOAD_PRIORITY = 30
+    CACHED_VIEWS = ('badge',)
 
     def __init__(self, card, action_log, configurator):
         super(Checklists, self).__init__(card, action_log, configurator)
-        cklists = [(clist.id, Checklist(clist.id, self.action_log, clist)) for clist in self.data]
-        self.ck_cache = dict(cklists)
-        self.checklists = [component.Component(clist) for __, clist in cklists]
+        # loaded on first access, the badge only needs the prefetched counters
+        self._checklists = None
+        self._ck_cache = None
         self.comp_id = str(random.randint(10000, 100000))
 
+    @classmethod
+    def prefetch(cls, card_ids):
+        stats = DataChecklist.get_stats_by_cards(card_ids)
+        return dict((card_id, dict(zip(('count', 'done', 'total'), stats.get(card_id, (0, 0, 0)))))
+                    for card_id in card_ids)
+
+    def load_checklists(self):
+        cklists = [(clist.id, Checklist(clist.id, self.action_log, clist)) for clist in self.data]
+        self._ck_cache = dict(cklists)
+        self._checklists = [component.Component(clist) for __, clist in cklists]
+        self.prefetched = None
+
+    @property
+    def checklists(self):
+        if self._checklists is None:
+            self.load_checklists()
+        return self._checklists
+
+    @checklists.setter
+    def checklists(self, checklists):
+        self._checklists = checklists
+
+    @property
+    def ck_cache(self):
+        if self._ck_cache is None:
+            self.load_checklists()
+        return self._ck_cache
+
     @staticmethod
     def get_schema_def():
         return schema.Text(u'checklists')
@@ -214,6 +243,12 @@ class Checklists(CardExtension):
     def update_document(self, document):
         document.checklists = u'\n'.join(cl.to_indexable() for cl in self.data)
 
+    @classmethod
+    def update_documents(cls, documents):
+        checklists = DataChecklist.get_by_cards(documents.keys())
+        for card_id, document in documents.iteritems():
+            document.checklists = u'\n'.join(cl.to_indexable() for cl in checklists.get(card_id, ()))
+
     @property
     def data(self):
         return DataChecklist.get_by_card(self.card.data)
@@ -224,12 +259,22 @@ class Checklists(CardExtension):
             new_checklist = self.add_checklist()
             new_checklist.update(checklist)
 
+    @property
+    def nb_checklists(self):
+        if self._checklists is None and self.prefetched is not None:
+            return self.prefetched['count']
+        return len(self.checklists)
+
     @property
     def nb_items(self):
+        if self._checklists is None and self.prefetched is not None:
+            return self.prefetched['done']
         return sum([cl().nb_items for cl in self.checklists])
 
     @property
     def total_items(self):
+        if self._checklists is None and self.prefetched is not None:
+            return self.prefetched['total']
         return sum([cl().total_items for cl in self.checklists])
 
     def delete_checklist(self, index):
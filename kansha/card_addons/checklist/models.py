@@ -15,11 +15,15 @@ from elixir import ManyToOne
 from elixir import OneToMany
 from elixir import Unicode
 from elixir import using_options
+from peak.rules import when
+from sqlalchemy import case, distinct, func
+from sqlalchemy.orm import subqueryload
 from sqlalchemy.ext.orderinglist import ordering_list
 
 from nagare import database
 
 from kansha.models import Entity
+from kansha.card.models import summary_cards
 
 
 class DataChecklist(Entity):
@@ -39,6 +43,40 @@ class DataChecklist(Entity):
         q = q.order_by(cls.index)
         return q.all()
 
+    @classmethod
+    def get_by_cards(cls, card_ids):
+        '''Return the checklists of many cards at once, with their items
+
+        In:
+            - ``card_ids`` -- list of card ids
+        Return:
+            - a dictionary {card id: [DataChecklist]}
+        '''
+        checklists = {}
+        q = cls.query.options(subqueryload('items'))
+        q = q.filter(cls.card_id.in_(card_ids)).order_by(cls.card_id, cls.index)
+        for checklist in q:
+            checklists.setdefault(checklist.card_id, []).append(checklist)
+        return checklists
+
+    @classmethod
+    def get_stats_by_cards(cls, card_ids):
+        '''Return the checklists counters of many cards at once
+
+        In:
+            - ``card_ids`` -- list of card ids
+        Return:
+            - a dictionary {card id: (nb checklists, nb done items, nb items)}
+        '''
+        done = func.sum(case([(DataChecklistItem.done == True, 1)], else_=0))
+        q = database.session.query(cls.card_id,
+                                   func.count(distinct(cls.id)),
+                                   done,
+                                   func.count(DataChecklistItem.id))
+        q = q.outerjoin((DataChecklistItem, DataChecklistItem.checklist_id == cls.id))
+        q = q.filter(cls.card_id.in_(card_ids)).group_by(cls.card_id)
+        return dict((card_id, (nb, int(nb_done or 0), total)) for card_id, nb, nb_done, total in q)
+
     def update(self, other):
         self.title = other.title
         self.index = other.index
@@ -93,3 +131,9 @@ class DataChecklistItem(Entity):
         item = cls(title=text.strip())
         database.session.flush()
         return item
+
+
+@when(summary_cards, (DataChecklistItem,))
+def summary_cards_checklist_item(item):
+    checklist = item.checklist
+    return (checklist.card,) if checklist is not None and checklist.card is not None else ()
@@ -8,6 +8,8 @@
 # this distribution.
 #--
 
+from nagare import database
+
 from kansha.cardextension.tests import CardExtensionTestCase
 
 from .comp import Checklists
@@ -72,6 +74,15 @@ class ChecklistTest(CardExtensionTestCase):
         item.set_done()
         self.assertFalse(item.done)
 
+    def test_version(self):
+        ck = self.extension.add_checklist()
+        ck.add_item_from_str(u'test')
+        database.session.flush()
+        version = self.card.data.version
+        ck.items[0]().set_done()
+        database.session.flush()
+        self.assertEqual(self.card.data.version, version + 1)
+
     def test_copy(self):
         ck = self.extension.add_checklist()
         ck.set_title(u'test')
@@ -115,5 +126,16 @@ test item 2
 test list 2
 test item 3
 test item 4''')
+        batch_doc = self.card.schema(docid=None)
+        Checklists.update_documents({self.card.db_id: batch_doc})
+        self.assertEqual(batch_doc.checklists, doc.checklists)
 
-
+    def test_prefetch(self):
+        ck = self.extension.add_checklist()
+        ck.add_item_from_str(u'test')
+        ck.add_item_from_str(u'test2')
+        ck.items[0]().set_done()
+        other_card = self.column.create_card(u'other')
+        prefetched = Checklists.prefetch([self.card.db_id, other_card.db_id])
+        self.assertEqual(prefetched[self.card.db_id], {'count': 1, 'done': 1, 'total': 2})
+        self.assertEqual(prefetched[other_card.db_id], {'count': 0, 'done': 0, 'total': 0})
@@ -72,7 +72,7 @@ def render_Checklists(self, h, comp, model):
 
 @presentation.render_for(Checklists, 'badge')
 def render_Checklists_badge(self, h, comp, model):
-    if self.checklists:
+    if self.nb_checklists:
         with h.span(class_='badge'):
             h << h.span(h.i(class_='icon-list'), ' ', self.nb_items, ' / ', self.total_items, class_='label')
     return h.root
@@ -122,6 +122,7 @@ class Commentlabel(object):
 class Comments(CardExtension):
 
     LOAD_PRIORITY = 50
+    CACHED_VIEWS = ('badge',)
 
     """Comments component
     """
@@ -134,7 +135,29 @@ class Comments(CardExtension):
             - ``comments`` -- the comments of the card
         """
         super(Comments, self).__init__(card, action_log, configurator)
-        self.comments = [self._create_comment_component(data_comment) for data_comment in self.data]
+        # loaded on first access, the badge only needs the prefetched count
+        self._comments = None
+
+    @classmethod
+    def prefetch(cls, card_ids):
+        counts = DataComment.count_by_cards(card_ids)
+        return dict((card_id, {'count': counts.get(card_id, 0)}) for card_id in card_ids)
+
+    @property
+    def comments(self):
+        if self._comments is None:
+            self._comments = [self._create_comment_component(data_comment) for data_comment in self.data]
+            self.prefetched = None
+        return self._comments
+
+    @comments.setter
+    def comments(self, comments):
+        self._comments = comments
+
+    def count_comments(self):
+        if self._comments is None and self.prefetched is not None:
+            return self.prefetched['count']
+        return len(self.comments)
 
     @staticmethod
     def get_schema_def():
@@ -143,6 +166,12 @@ class Comments(CardExtension):
     def update_document(self, document):
         document.comments = u'\n'.join(comment().text for comment in self.comments)
 
+    @classmethod
+    def update_documents(cls, documents):
+        texts = DataComment.get_texts_by_cards(documents.keys())
+        for card_id, document in documents.iteritems():
+            document.comments = u'\n'.join(texts.get(card_id, ()))
+
     @property
     def data(self):
         return DataComment.get_by_card(self.card.data)
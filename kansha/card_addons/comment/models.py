@@ -11,6 +11,8 @@
 from elixir import using_options
 from elixir import ManyToOne
 from elixir import Field, UnicodeText, DateTime
+from sqlalchemy import func
+from nagare.database import session
 
 from kansha.models import Entity
 
@@ -31,3 +33,32 @@ class DataComment(Entity):
         q = q.filter_by(card=card)
         q = q.order_by(cls.creation_date.desc())
         return q.all()
+
+    @classmethod
+    def get_texts_by_cards(cls, card_ids):
+        '''Return the comments texts of many cards at once, newest first
+
+        In:
+            - ``card_ids`` -- list of card ids
+        Return:
+            - a dictionary {card id: [comment text]}
+        '''
+        texts = {}
+        q = session.query(cls.card_id, cls.comment)
+        q = q.filter(cls.card_id.in_(card_ids)).order_by(cls.card_id, cls.creation_date.desc())
+        for card_id, text in q:
+            texts.setdefault(card_id, []).append(text)
+        return texts
+
+    @classmethod
+    def count_by_cards(cls, card_ids):
+        '''Return the number of comments of many cards at once
+
+        In:
+            - ``card_ids`` -- list of card ids
+        Return:
+            - a dictionary {card id: number of comments}
+        '''
+        q = session.query(cls.card_id, func.count(cls.id))
+        q = q.filter(cls.card_id.in_(card_ids)).group_by(cls.card_id)
+        return dict(q)
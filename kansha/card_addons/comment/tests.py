@@ -47,4 +47,15 @@ class CommentsTest(CardExtensionTestCase):
         self.assertEqual(doc.comments, u'''Comment 3
 Comment 2
 Comment 1''')
+        batch_doc = self.card.schema(docid=None)
+        Comments.update_documents({self.card.db_id: batch_doc})
+        self.assertEqual(batch_doc.comments, doc.comments)
 
+
+    def test_prefetch(self):
+        self.extension.add(u'Comment 1')
+        self.extension.add(u'Comment 2')
+        other_card = self.column.create_card(u'other')
+        prefetched = Comments.prefetch([self.card.db_id, other_card.db_id])
+        self.assertEqual(prefetched[self.card.db_id], {'count': 2})
+        self.assertEqual(prefetched[other_card.db_id], {'count': 0})
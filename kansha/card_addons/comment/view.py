@@ -100,9 +100,10 @@ def render_comments_form(self, h, comp, *args):
 @presentation.render_for(Comments, model='badge')
 def render_comments_badge(self, h, *args):
     """Comment badge for the card"""
-    if self.comments:
+    nb_comments = self.count_comments()
+    if nb_comments:
         with h.span(class_='badge'):
-            h << h.span(h.i(class_='icon-comment'), ' ', len(self.comments), class_='label')
+            h << h.span(h.i(class_='icon-comment'), ' ', nb_comments, class_='label')
     return h.root
 
 
@@ -28,6 +28,7 @@ class CardDescription(CardExtension):
     """
 
     LOAD_PRIORITY = 20
+    CACHED_VIEWS = ('badge',)
 
     def __init__(self, card, action_log, configurator):
         """Initialization
@@ -45,8 +46,21 @@ class CardDescription(CardExtension):
         desc = self.text
         document.description = clean_text(desc) if desc else u''
 
+    @classmethod
+    def update_documents(cls, documents):
+        descriptions = DataCardDescription.get_descriptions(documents.keys())
+        for card_id, document in documents.iteritems():
+            desc = descriptions.get(card_id)
+            document.description = clean_text(desc) if desc else u''
+
+    @classmethod
+    def prefetch(cls, card_ids):
+        descriptions = DataCardDescription.get_descriptions(card_ids)
+        return dict((card_id, {'text': descriptions.get(card_id) or u''}) for card_id in card_ids)
+
     def update(self, other):
         self.data.update(other.data)
+        self.prefetched = None
 
     @property
     def data(self):
@@ -57,11 +71,14 @@ class CardDescription(CardExtension):
 
     @property
     def text(self):
+        if self.prefetched is not None:
+            return self.prefetched['text']
         return self.data.description
 
     @text.setter
     def text(self, text):
         self.data.description = text
+        self.prefetched = None
 
     def change_text(self, text):
         """Edit the description
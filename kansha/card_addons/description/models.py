@@ -31,3 +31,16 @@ class DataCardDescription(Entity):
         q = cls.query
         q = q.filter_by(card=card)
         return q.first()
+
+    @classmethod
+    def get_descriptions(cls, card_ids):
+        '''Return the descriptions of many cards at once
+
+        In:
+            - ``card_ids`` -- list of card ids
+        Return:
+            - a dictionary {card id: description}
+        '''
+        q = session.query(cls.card_id, cls.description)
+        q = q.filter(cls.card_id.in_(card_ids))
+        return dict(q)
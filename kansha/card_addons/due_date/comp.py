@@ -30,6 +30,7 @@ def has_permission_Card_due_date(self, user, perm, card):
 class DueDate(CardExtension):
 
     LOAD_PRIORITY = 60
+    CACHED_VIEWS = ('badge',)
 
     def __init__(self, card, action_log, configurator):
         """Initialization
@@ -49,13 +50,21 @@ class DueDate(CardExtension):
             data = DataCardDueDate(card=self.card.data)
         return data
 
+    @classmethod
+    def prefetch(cls, card_ids):
+        due_dates = DataCardDueDate.get_due_dates(card_ids)
+        return dict((card_id, {'due_date': due_dates.get(card_id)}) for card_id in card_ids)
+
     def get_value(self):
+        if self.prefetched is not None:
+            return self.prefetched['due_date']
         return self.data.due_date
 
     def set_value(self, value):
         '''Set the value to a new date (or None)'''
         self.data.due_date = value
         self.due_date = value
+        self.prefetched = None
 
     def new_card_position(self, value):
         self.set_value(value)
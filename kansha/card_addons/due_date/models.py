@@ -10,13 +10,16 @@
 
 from elixir import ManyToOne
 from elixir import Field, Date
-from elixir import using_options
+from elixir import using_options, using_table_options
+from nagare.database import session
+from sqlalchemy import Index
 
 from kansha.models import Entity
 
 
 class DataCardDueDate(Entity):
     using_options(tablename='card_due_date')
+    using_table_options(Index('ix_card_due_date_due_date', 'due_date'))
 
     due_date = Field(Date, default=None)
     card = ManyToOne('DataCard', ondelete='cascade')
@@ -26,3 +29,38 @@ class DataCardDueDate(Entity):
         q = cls.query
         q = q.filter_by(card=card)
         return q.first()
+
+    @classmethod
+    def get_due_dates(cls, card_ids):
+        '''Return the due dates of many cards at once
+
+        In:
+            - ``card_ids`` -- list of card ids
+        Return:
+            - a dictionary {card id: due date}
+        '''
+        q = session.query(cls.card_id, cls.due_date)
+        q = q.filter(cls.card_id.in_(card_ids))
+        return dict(q)
+
+    @classmethod
+    def get_board_due_dates(cls, board, start, end, archive=True):
+        '''Return the cards of a board due in a window, in one query
+
+        In:
+            - ``board`` -- DataBoard instance
+            - ``start`` -- first day of the window
+            - ``end`` -- day after the window
+            - ``archive`` -- include the cards of the archive column
+        Return:
+            - a query of (card id, card title, due date)
+        '''
+        from kansha.card.models import DataCard
+        from kansha.column.models import DataColumn
+        q = session.query(DataCard.id, DataCard.title, cls.due_date)
+        q = q.select_from(cls).join(cls.card).join(DataCard.column)
+        q = q.filter(DataColumn.board == board)
+        q = q.filter(cls.due_date >= start).filter(cls.due_date < end)
+        if not archive:
+            q = q.filter(DataColumn.archive == False)
+        return q.order_by(cls.due_date, DataCard.id)
@@ -47,3 +47,15 @@ class CardDueDateTest(CardExtensionTestCase):
         self.assertEqual(self.extension.get_class(), 'yesterday')
         self.extension.set_value(today - timedelta(days=10))
         self.assertEqual(self.extension.get_class(), 'past')
+
+    def test_calendar_events(self):
+        today = date.today()
+        self.extension.set_value(today)
+        events = self.board.calendar_events(today, today + timedelta(days=1))
+        self.assertEqual([event['id'] for event in events], [self.card.db_id])
+        self.assertEqual(events[0]['start'], today.isoformat())
+        self.assertEqual(self.board.calendar_events(today + timedelta(days=1), today + timedelta(days=30)), [])
+        # dropped on a new date
+        self.card.card_dropped(today + timedelta(days=2))
+        events = self.board.calendar_events(today + timedelta(days=1), today + timedelta(days=30))
+        self.assertEqual([event['id'] for event in events], [self.card.db_id])
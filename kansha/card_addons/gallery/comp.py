@@ -37,6 +37,7 @@ def render_event_card_add_file(action, data):
 class Gallery(CardExtension):
 
     LOAD_PRIORITY = 40
+    CACHED_VIEWS = ('cover', 'badge')
 
     def __init__(self, card, action_log, configurator, assets_manager_service):
         """Init method
@@ -46,16 +47,40 @@ class Gallery(CardExtension):
         """
         super(Gallery, self).__init__(card, action_log, configurator)
         self.assets_manager = assets_manager_service
-        self.assets = []
-        self.load_assets()
+        # loaded on first access, the badge and the cover only need the prefetched summary
+        self._assets = None
         self.comp_id = str(random.randint(10000, 100000))
         self.model = 'view'
         self.cropper = component.Component()
 
+    @classmethod
+    def prefetch(cls, card_ids):
+        counts = DataAsset.count_by_cards(card_ids)
+        covers = DataAsset.get_covers(card_ids)
+        return dict((card_id, {'count': counts.get(card_id, 0), 'cover': covers.get(card_id)})
+                    for card_id in card_ids)
+
+    @property
+    def assets(self):
+        if self._assets is None:
+            self.load_assets()
+        return self._assets
+
+    @assets.setter
+    def assets(self, assets):
+        self._assets = assets
+
     def load_assets(self):
+        self._assets = []
+        self.prefetched = None
         for asset_data in DataAsset.get_all(self.card.data):
             self.create_asset(asset_data)
 
+    def count_assets(self):
+        if self._assets is None and self.prefetched is not None:
+            return self.prefetched['count']
+        return len(self.assets)
+
     def delete_asset(self, asset):
         """Delete asset
 
@@ -82,7 +107,8 @@ class Gallery(CardExtension):
     def update(self, other):
         for asset_comp in other.assets:
             asset = asset_comp()
-            new_asset = self._add_asset(asset.file_info)
+            # the copy shares the stored file
+            new_asset = self._create_asset(self.assets_manager.copy(asset.filename), asset.metadata['filename'])
             if asset.is_cover:
                 cropper = asset.cropper_info
                 self.make_cover(new_asset, **cropper)
@@ -120,10 +146,13 @@ class Gallery(CardExtension):
         return self._add_asset(file_info)
 
     def _add_asset(self, file_info):
-        user = security.get_user()
         fileid = self.assets_manager.save(file_info['data'],
                                           metadata={'filename': file_info['filename'], 'content-type': file_info['content_type']})
-        data = {'file': file_info['filename'], 'card': self.card.get_title()}
+        return self._create_asset(fileid, file_info['filename'])
+
+    def _create_asset(self, fileid, filename):
+        user = security.get_user()
+        data = {'file': filename, 'card': self.card.get_title()}
         self.action_log.add_history(user, u'card_add_file', data)
         return self.create_asset(DataAsset.add(fileid, self.card.data, user.get_user_data()))
 
@@ -181,10 +210,11 @@ class Gallery(CardExtension):
         self.model = 'view'
 
     def get_cover(self):
-        if not DataAsset.has_cover(self.card.data):
-            return None
-
-        return Asset(DataAsset.get_cover(self.card.data), self.assets_manager)
+        if self.prefetched is not None:
+            cover = self.prefetched['cover']
+        else:
+            cover = DataAsset.get_cover(self.card.data)
+        return Asset(cover, self.assets_manager) if cover is not None else None
 
     def remove_cover(self, asset):
         """Don't use the asset as cover anymore
@@ -194,6 +224,7 @@ class Gallery(CardExtension):
         """
         DataAsset.remove_cover(self.card.data)
         asset.is_cover = False
+        self.prefetched = None
         self.model = 'view'
 
 
@@ -10,7 +10,10 @@
 
 import datetime
 from elixir import ManyToOne, Field, Unicode, DateTime, using_options
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload
 from nagare import security
+from nagare.database import session
 
 from kansha.models import Entity
 
@@ -75,6 +78,32 @@ class DataAsset(Entity):
         q = q.filter_by(cover=card)
         return q.first()
 
+    @classmethod
+    def count_by_cards(cls, card_ids):
+        '''Return the number of assets of many cards at once
+
+        In:
+            - ``card_ids`` -- list of card ids
+        Return:
+            - a dictionary {card id: number of assets}
+        '''
+        q = session.query(cls.card_id, func.count(cls.filename))
+        q = q.filter(cls.card_id.in_(card_ids)).group_by(cls.card_id)
+        return dict(q)
+
+    @classmethod
+    def get_covers(cls, card_ids):
+        '''Return the covers of many cards at once
+
+        In:
+            - ``card_ids`` -- list of card ids
+        Return:
+            - a dictionary {card id: DataAsset}
+        '''
+        q = cls.query.options(joinedload('author'))
+        q = q.filter(cls.cover_id.in_(card_ids))
+        return dict((asset.cover_id, asset) for asset in q)
+
     @classmethod
     def set_cover(cls, card, asset):
         cls.remove_cover(card)
@@ -64,7 +64,7 @@ def render_Gallery_crop(self, h, comp, model):
 def render_cover(self, h, comp, model):
     cover = self.get_cover()
     if cover:
-        h << h.p(component.Component(self.get_cover(), model='cover'), class_='cover')
+        h << h.p(component.Component(cover, model='cover'), class_='cover')
     return h.root
 
 
@@ -112,9 +112,10 @@ def render_download(self, h, comp, *args):
 @presentation.render_for(Gallery, model='badge')
 def render_gallery_badge(self, h, *args):
     """Gallery badge for the card"""
-    if self.assets:
+    nb_assets = self.count_assets()
+    if nb_assets:
         with h.span(class_='badge'):
-            h << h.span(h.i(class_='icon-file'), ' ', len(self.assets), class_='label')
+            h << h.span(h.i(class_='icon-file'), ' ', nb_assets, class_='label')
     return h.root
 
 
@@ -86,6 +86,7 @@ class CardLabels(CardExtension):
     """
 
     LOAD_PRIORITY = 10
+    CACHED_VIEWS = ('header',)
 
     def __init__(self, card, action_log, configurator):
         """Initialization
@@ -106,8 +107,21 @@ class CardLabels(CardExtension):
     def update_document(self, document):
         document.labels = u' '.join(label.get_title() for label in self.labels)
 
+    @classmethod
+    def update_documents(cls, documents):
+        labels = DataLabel.get_by_cards(documents.keys())
+        for card_id, document in documents.iteritems():
+            document.labels = u' '.join(label.title for label in labels.get(card_id, ()))
+
+    @classmethod
+    def prefetch(cls, card_ids):
+        labels = DataLabel.get_by_cards(card_ids)
+        return dict((card_id, {'labels': labels.get(card_id, [])}) for card_id in card_ids)
+
     @property
     def data(self):
+        if self.prefetched is not None:
+            return self.prefetched['labels']
         return DataLabel.get_by_card(self.card.data)
 
     def update(self, other):
@@ -145,7 +159,9 @@ class CardLabels(CardExtension):
             label.remove(self.card)
         else:
             label.add(self.card)
+        self.prefetched = None
 
     def delete(self):
         for label in self.labels:
             label.remove(self.card)
+        self.prefetched = None
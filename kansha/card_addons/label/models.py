@@ -11,8 +11,13 @@
 from elixir import using_options
 from elixir import ManyToOne, ManyToMany
 from elixir import Field, Unicode, Integer
+from peak.rules import when
+from sqlalchemy.orm.attributes import instance_state, get_history
+
+from nagare.database import session
 
 from kansha.models import Entity
+from kansha.card.models import summary_cards
 
 
 class DataLabel(Entity):
@@ -44,6 +49,23 @@ class DataLabel(Entity):
         q = q.filter(cls.cards.contains(card))
         return q.order_by(cls.id)
 
+    @classmethod
+    def get_by_cards(cls, card_ids):
+        '''Return the labels of many cards at once
+
+        In:
+            - ``card_ids`` -- list of card ids
+        Return:
+            - a dictionary {card id: [DataLabel]}
+        '''
+        from kansha.card.models import DataCard
+        labels = {}
+        q = session.query(DataCard.id, cls).select_from(cls).join(cls.cards)
+        q = q.filter(DataCard.id.in_(card_ids)).order_by(cls.id)
+        for card_id, label in q:
+            labels.setdefault(card_id, []).append(label)
+        return labels
+
     # @classmethod
     # def add_to_card(cls, card, id):
     #     label = cls.get(id)
@@ -55,3 +77,12 @@ class DataLabel(Entity):
     #     label = cls.get(id)
     #     if card in label.cards:
     #         label.cards.remove(card)
+
+
+@when(summary_cards, (DataLabel,))
+def summary_cards_label(label):
+    added, __, deleted = get_history(label, 'cards')
+    if label in session.deleted or set(instance_state(label).committed_state) - set(['cards']):
+        # deleted, renamed or recolored
+        return list(label.cards) + list(deleted)
+    return list(added) + list(deleted)
@@ -8,6 +8,8 @@
 # this distribution.
 #--
 
+from nagare import database
+
 from kansha.cardextension.tests import CardExtensionTestCase
 
 from .comp import CardLabels
@@ -27,6 +29,18 @@ class CardLabelsTest(CardExtensionTestCase):
         self.extension.activate(label)
         self.assertNotIn(label, self.extension.labels)
 
+    def test_version(self):
+        database.session.flush()
+        version = self.card.data.version
+        label = self.extension.get_available_labels()[0]
+        self.extension.activate(label)
+        database.session.flush()
+        self.assertEqual(self.card.data.version, version + 1)
+        # moving the card doesn't change its summary
+        self.card.data.index += 1
+        database.session.flush()
+        self.assertEqual(self.card.data.version, version + 1)
+
     def test_copy(self):
         labels = self.extension.get_available_labels()
         for label in labels:
@@ -44,3 +58,6 @@ class CardLabelsTest(CardExtensionTestCase):
         self.extension.activate(label)
         self.extension.update_document(doc)
         self.assertEqual(doc.labels, u'Green Red')
+        batch_doc = self.card.schema(docid=None)
+        CardLabels.update_documents({self.card.db_id: batch_doc})
+        self.assertEqual(batch_doc.labels, u'Green Red')
@@ -16,6 +16,7 @@ from kansha import exceptions
 from kansha.toolbox import overlay
 from kansha.user import usermanager
 from kansha.board.comp import Board
+from kansha.card.models import DataCard
 from kansha.cardextension import CardExtension
 from kansha.services.actionlog.messages import render_event
 
@@ -55,14 +56,20 @@ class CardMembers(CardExtension):
             overlay.Overlay(lambda r: (r.i(class_='ico-btn icon-user'), r.span(_(u'+'), class_='count')),
                             lambda r: component.Component(self).render(r, model='add_member_overlay'), dynamic=True, cls='card-overlay'))
         self.new_member = component.Component(usermanager.NewMember(self.autocomplete_method), model='add_members')
+        members = self.prefetched['members'] if self.prefetched is not None else card.members
         self.members = [component.Component(usermanager.UserManager.get_app_user(member.username, data=member))
-                        for member in card.members]
+                        for member in members]
 
         self.see_all_members = component.Component(
             overlay.Overlay(lambda r: component.Component(self).render(r, model='more_users'),
                             lambda r: component.Component(self).on_answer(self.remove_member).render(r, model='members_list_overlay'),
                             dynamic=False, cls='card-overlay'))
 
+    @classmethod
+    def prefetch(cls, card_ids):
+        members = DataCard.get_members_by_cards(card_ids)
+        return dict((card_id, {'members': members.get(card_id, [])}) for card_id in card_ids)
+
     def autocomplete_method(self, value):
         """ """
         available_user_ids = self.get_available_user_ids()
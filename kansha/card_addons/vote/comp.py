@@ -23,13 +23,21 @@ class Votes(CardExtension):
     '''Vote component'''
 
     LOAD_PRIORITY = 70
+    CACHED_VIEWS = ('badge',)
 
     @property
     def allowed(self):
         return self.configurator.votes_allowed
 
+    @classmethod
+    def prefetch(cls, card_ids):
+        counts = DataVote.count_votes_by_cards(card_ids)
+        return dict((card_id, {'count': counts.get(card_id, 0)}) for card_id in card_ids)
+
     def count_votes(self):
         '''Returns number of votes for a card'''
+        if self.prefetched is not None:
+            return self.prefetched['count']
         return DataVote.count_votes(self.card.data)
 
     def toggle(self):
@@ -43,6 +51,7 @@ class Votes(CardExtension):
             DataVote.get_vote(self.card.data, user.data).delete()
         else:
             DataVote(card=self.card.data, user=user.data)
+        self.prefetched = None
 
     def has_voted(self):
         '''Check if the current user already vote for this card'''
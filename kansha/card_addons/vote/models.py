@@ -10,6 +10,8 @@
 
 from elixir import using_options
 from elixir import ManyToOne
+from sqlalchemy import func
+from nagare.database import session
 
 from kansha.models import Entity
 
@@ -48,3 +50,16 @@ class DataVote(Entity):
         q = cls.query
         q = q.filter(cls.card == card)
         return q.count()
+
+    @classmethod
+    def count_votes_by_cards(cls, card_ids):
+        '''Return the number of votes of many cards at once
+
+        In:
+            - ``card_ids`` -- list of card ids
+        Return:
+            - a dictionary {card id: number of votes}
+        '''
+        q = session.query(cls.card_id, func.count(cls.id))
+        q = q.filter(cls.card_id.in_(card_ids)).group_by(cls.card_id)
+        return dict(q)
@@ -29,6 +29,7 @@ class CardWeightEditor(CardExtension):
     """
 
     LOAD_PRIORITY = 80
+    CACHED_VIEWS = ('badge',)
 
     # WEIGHTING TYPES
     WEIGHTING_OFF = 0
@@ -42,10 +43,16 @@ class CardWeightEditor(CardExtension):
         """
         CardExtension.__init__(self, card, action_log, configurator)
         self.card = card
-        self.weight = editor.Property(self.data.weight or u'')
+        weight = self.prefetched['weight'] if self.prefetched is not None else self.data.weight
+        self.weight = editor.Property(weight or u'')
         self.weight.validate(self.validate_weight)
         self.action_button = component.Component(self, 'action_button')
 
+    @classmethod
+    def prefetch(cls, card_ids):
+        weights = DataCardWeight.get_weights(card_ids)
+        return dict((card_id, {'weight': weights.get(card_id)}) for card_id in card_ids)
+
     def update(self, other):
         self.data.update(other.data)
         self.weight(self.data.weight or u'')
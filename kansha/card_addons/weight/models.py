@@ -31,4 +31,17 @@ class DataCardWeight(Entity):
     def get_by_card(cls, card):
         q = cls.query
         q = q.filter_by(card=card)
-        return q.first()
\ No newline at end of file
+        return q.first()
+
+    @classmethod
+    def get_weights(cls, card_ids):
+        '''Return the weights of many cards at once
+
+        In:
+            - ``card_ids`` -- list of card ids
+        Return:
+            - a dictionary {card id: weight}
+        '''
+        q = session.query(cls.card_id, cls.weight)
+        q = q.filter(cls.card_id.in_(card_ids))
+        return dict(q)
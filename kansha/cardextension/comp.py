@@ -14,11 +14,32 @@ from kansha.events import EventHandlerMixIn
 
 class CardExtension(plugin.Plugin, EventHandlerMixIn):
     CATEGORY = 'card-extension'
+    # summary views (header, cover, badge) whose HTML can be cached: they
+    # only depend on the card data (see ``kansha.card.models.summary_cards``)
+    # and register no action
+    CACHED_VIEWS = ()
 
     def __init__(self, card, action_log, configurator=None):
         self.card = card
         self.action_log = action_log
         self.configurator = configurator
+        # summary fetched in bulk for the whole board, see ``prefetch``
+        self.prefetched = card.prefetched.get(self.__class__)
+
+    def __getstate__(self):
+        self.prefetched = None
+        return self.__dict__
+
+    @classmethod
+    def prefetch(cls, card_ids):
+        '''Fetch in a few queries what the summary views (header, cover, badge)
+        of many cards need.
+
+        Return a dictionary {card id: summary}, the summary (a dictionary) is then available
+        as ``self.prefetched`` on the extension of the card, until the end of the request.
+        If not None, it must be given for every card id.
+        '''
+        return {}
 
     @staticmethod
     def get_excel_title():
@@ -39,6 +60,15 @@ class CardExtension(plugin.Plugin, EventHandlerMixIn):
         '''Add extension value to document that will be indexed'''
         pass
 
+    @classmethod
+    def update_documents(cls, documents):
+        '''Add extension values to many documents at once, without instantiating the extensions.
+
+        ``documents`` is a dictionary {card id: document}. Indexed extensions should
+        implement it in a few queries, as ``update_document`` would for each card.
+        '''
+        pass
+
     def delete(self):
         '''Happens when a card is deleted, use it to clean up files for example'''
         pass
@@ -25,12 +25,15 @@ class Column(events.EventHandlerMixIn):
     """Column component
     """
 
-    def __init__(self, id_, board, card_extensions, action_log, search_engine_service, services_service, data=None):
+    def __init__(self, id_, board, card_extensions, action_log, search_engine_service, services_service, data=None,
+                 prefetched=None):
         """Initialization
 
         In:
             - ``id_`` -- the id of the column
+            - ``prefetched`` -- extensions summaries of the cards, by card id (see ``CardExtensions.prefetch``)
         """
+        prefetched = prefetched or {}
         self.db_id = id_
         self._data = data
         self.id = 'list_' + str(self.db_id)
@@ -49,7 +52,8 @@ class Column(events.EventHandlerMixIn):
                 self._services(
                     comp.Card, c.id,
                     self.card_extensions,
-                    self.action_log, data=c))
+                    self.action_log, data=c,
+                    prefetched=prefetched.get(c.id)))
                       for c in self.data.cards]
         self.new_card = component.Component(
             comp.NewCard(self))
@@ -72,8 +76,11 @@ class Column(events.EventHandlerMixIn):
         self.index_cards(cards_to_index, update=True)
 
     def index_cards(self, cards, update=False):
-        for card in cards:
-            card.add_to_index(self.search_engine, self.board.id, update=update)
+        documents = [card.to_document(self.board.id) for card in cards]
+        if update:
+            self.search_engine.update_documents(documents)
+        else:
+            self.search_engine.add_documents(documents)
         self.search_engine.commit()
 
     def actions(self, action, comp):
@@ -268,6 +275,17 @@ class Column(events.EventHandlerMixIn):
         """
         self.data.index = new_index
 
+    def prefetch_summaries(self):
+        """Fetch in bulk what the summaries of the cards rebuilt on demand need
+        """
+        cards = [card_comp() for card_comp in self.cards]
+        cards = [card for card in cards
+                 if isinstance(card, comp.Card) and not card.has_extensions and not card.prefetched]
+        if cards:
+            prefetched = self.card_extensions.prefetch([card.db_id for card in cards])
+            for card in cards:
+                card.prefetched = prefetched[card.db_id]
+
     def refresh(self):
         self.cards = [component.Component(
             self._services(comp.Card, data_card.id, self.card_extensions, self.action_log, data=data_card)
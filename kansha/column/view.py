@@ -45,7 +45,8 @@ def render(self, h, comp, *args):
 
 @presentation.render_for(Column, 'calendar')
 def render(self, h, comp, *args):
-    return [card.render(h, 'calendar') for card in self.cards]
+    # the cards are events fetched by the calendar, only the opened ones are rendered
+    return [card.render(h, 'calendar') for card in self.cards if isinstance(card(), popin.Popin)]
 
 
 @presentation.render_for(Column, 'new')
@@ -128,6 +129,7 @@ def render_column_dnd(self, h, comp, *args):
 def render_column_body(self, h, comp, *args):
     model = 'dnd' if security.has_permissions('edit', self) else "no_dnd"
     id_ = h.generate_id()
+    self.prefetch_summaries()
     with h.div(class_='list-body', id=id_):
         h << [card.on_answer(self.handle_event, comp).render(h, model=model) for card in self.cards]
         h << h.script("YAHOO.kansha.dnd.initTargetCard(%s)" % ajax.py2js(id_))
@@ -140,6 +142,12 @@ def render_column_body(self, h, comp, *args):
                 h << h.div(self.new_card.on_answer(self.ui_create_card, comp))
 
     h << h.script("YAHOO.kansha.app.countCards(%s)" % ajax.py2js(self.id))
+    h << h.script(
+        "YAHOO.kansha.reload_lists[%s]=function() {%s}" % (
+            ajax.py2js(self.id),
+            h.a.action(ajax.Update()).get('onclick')
+        )
+    )
     return h.root
 
 
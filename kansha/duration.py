@@ -10,9 +10,14 @@
 
 from __future__ import absolute_import
 
+import heapq
 import functools
+import threading
 import time
 
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
 from nagare import log
 
 
@@ -52,11 +57,91 @@ def log_duration(msg=None, log_msg=None):
     return decorator
 
 
+class QueryStats(object):
+
+    """SQL statements executed during a request"""
+
+    def __init__(self, nb_slowest=5):
+        self.nb_slowest = nb_slowest
+        self.count = 0
+        self.duration = 0.0
+        self._slowest = []  # min-heap of (duration, statement)
+
+    def add(self, statement, duration):
+        self.count += 1
+        self.duration += duration
+        if len(self._slowest) < self.nb_slowest:
+            heapq.heappush(self._slowest, (duration, statement))
+        elif self._slowest and duration > self._slowest[0][0]:
+            heapq.heappushpop(self._slowest, (duration, statement))
+
+    @property
+    def slowest(self):
+        """The slowest statements, slowest first: list of (duration, statement)"""
+        return sorted(self._slowest, reverse=True)
+
+
+# stats of the request being processed by the current thread, if any
+_current = threading.local()
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if getattr(_current, 'stats', None) is not None:
+        conn.info.setdefault('kansha_query_start', []).append(time.time())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = getattr(_current, 'stats', None)
+    starts = conn.info.get('kansha_query_start')
+    if stats is not None and starts:
+        stats.add(statement, time.time() - starts.pop())
+
+
 class DurationWSGIMiddleware:
 
-    def __init__(self, app):
+    """Log the duration and the SQL statements of each request
+
+    Requests taking more than ``slow_request`` seconds or executing more than
+    ``max_queries`` statements are logged as warnings, with their ``nb_slowest``
+    slowest statements. Statements taking more than ``slow_query`` seconds are
+    always part of the warning. If ``headers`` is true, the numbers are also sent
+    as ``X-Kansha-*`` response headers.
+    """
+
+    def __init__(self, app, slow_request=1.0, max_queries=200, slow_query=0.1, nb_slowest=5, headers=False):
         self._app = app
+        self.slow_request = slow_request
+        self.max_queries = max_queries
+        self.slow_query = slow_query
+        self.nb_slowest = nb_slowest
+        self.headers = headers
 
-    @log_duration('request took %0.3f')
     def __call__(self, environ, start_response):
-        return self._app(environ, start_response)
+        stats = _current.stats = QueryStats(self.nb_slowest)
+        start = time.time()
+
+        def _start_response(status, headers, exc_info=None):
+            if self.headers:
+                headers = list(headers) + [
+                    ('X-Kansha-Duration', '%0.3f' % (time.time() - start)),
+                    ('X-Kansha-Queries', str(stats.count)),
+                    ('X-Kansha-Queries-Duration', '%0.3f' % stats.duration)
+                ]
+            return start_response(status, headers, exc_info) if exc_info else start_response(status, headers)
+
+        try:
+            return self._app(environ, _start_response)
+        finally:
+            _current.stats = None
+            self.log(environ, time.time() - start, stats)
+
+    def log(self, environ, duration, stats):
+        log.debug('request took %0.3f, %d queries in %0.3f', duration, stats.count, stats.duration)
+        slow_queries = [(d, statement) for d, statement in stats.slowest if d > self.slow_query]
+        if duration > self.slow_request or stats.count > self.max_queries or slow_queries:
+            msg = ['%s %s took %0.3f, %d queries in %0.3f' % (environ.get('REQUEST_METHOD'), environ.get('PATH_INFO'),
+                                                               duration, stats.count, stats.duration)]
+            msg.extend('  %0.3f %s' % (d, ' '.join(statement.split())) for d, statement in stats.slowest)
+            log.warning('\n'.join(msg))
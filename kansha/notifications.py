@@ -12,11 +12,13 @@ from __future__ import absolute_import
 
 import urlparse
 import sqlalchemy as sa
+from sqlalchemy.orm import joinedload
 
 from nagare import database
 from nagare.i18n import _, _L
 from nagare.namespaces import xhtml
 
+from kansha.card.models import DataCard
 from kansha.user.models import DataBoardMember
 
 
@@ -56,25 +58,89 @@ def notifications_allowed(user, board):
     return get_board_member(user, board).notify
 
 
-def get_subscribers():
+def get_subscribers(board_ids=None):
     q = database.session.query(DataBoardMember)
     q = q.filter(sa.or_(DataBoardMember.notify == NOTIFY_ALL,
                         DataBoardMember.notify == NOTIFY_MINE))
+    if board_ids is not None:
+        q = q.filter(DataBoardMember.board_id.in_(board_ids))
+    q = q.options(joinedload('board'), joinedload('member'))
     return q
 
 
-def filter_events(events, subscriber):
+def get_subscribed_boards():
+    '''Ids of the boards with subscribers, sorted'''
+    q = database.session.query(DataBoardMember.board_id).distinct()
+    q = q.filter(sa.or_(DataBoardMember.notify == NOTIFY_ALL,
+                        DataBoardMember.notify == NOTIFY_MINE))
+    q = q.order_by(DataBoardMember.board_id)
+    return [board_id for board_id, in q]
+
+
+def advance_watermarks(subscribers, last_id):
+    '''Record that the events up to ``last_id`` were processed for the subscribers
+
+    In:
+      - ``subscribers`` -- list of (board id, username, source)
+      - ``last_id`` -- id of the last processed event
+    '''
+    if not subscribers or last_id is None:
+        return
+    table = DataBoardMember.table
+    q = table.update().where(sa.and_(table.c.board_id == sa.bindparam('b_board_id'),
+                                     table.c.user_username == sa.bindparam('b_username'),
+                                     table.c.user_source == sa.bindparam('b_source')))
+    q = q.values(last_notified_event=last_id)
+    database.session.execute(q, [{'b_board_id': board_id, 'b_username': username, 'b_source': source}
+                                 for board_id, username, source in subscribers])
+
+
+def get_subscribers_cards(subscribers):
+    '''Return the cards of the ``NOTIFY_MINE`` subscribers, in one query
+
+    In:
+      - ``subscribers`` -- list of DataBoardMember
+    Return:
+      - dictionary {(username, source): set of card ids}
+    '''
+    members = [subscriber.member for subscriber in subscribers if subscriber.notify == NOTIFY_MINE]
+    return DataCard.get_cards_by_members(members)
+
+
+def filter_events(events, subscriber, user_cards=None):
+    '''Events the subscriber is notified of
+
+    In:
+      - ``events`` -- list of DataHistory
+      - ``subscriber`` -- DataBoardMember
+      - ``user_cards`` -- ids of the cards of the subscriber, if already known
+    '''
     if subscriber.notify == NOTIFY_ALL:
         return [event for event in events]
     elif subscriber.notify == NOTIFY_MINE:
-        user_cards = set([card.id for card in subscriber.member.cards])
+        if user_cards is None:
+            user_cards = set([card.id for card in subscriber.member.cards])
         return [event for event in events if event.card_id in user_cards]
     return []
 
 
 # renders
 
-def generate_email(app_title, board, user, hours, url, events):
+def generate_email(app_title, board, user, hours, url, events, rendered=None):
+    '''Subject, text and HTML of a notification email
+
+    ``rendered`` caches the events rendered in the current locale, as a
+    dictionary {event id: string}: share it between the recipients with the
+    same locale.
+    '''
+    if rendered is None:
+        rendered = {}
+
+    def to_string(event):
+        if event.id not in rendered:
+            rendered[event.id] = event.to_string()
+        return rendered[event.id]
+
     ret = []
     data = {'board': board.title, 'hours': hours, 'url': urlparse.urljoin(
         url, board.url), 'count': len(events), 'app': app_title}
@@ -107,20 +173,20 @@ def generate_email(app_title, board, user, hours, url, events):
                     _(GROUP_MESSAGES[group]), style='text-decoration: underline; font-weight: bold;'))
                 with h.ul:
                     for event in events:
-                        if event.card:
+                        if event.card_id:
                             # IDs are interpreted as anchors since HTML4. So don't use the ID of
                             # the card as a URL fragment, because the browser
                             # jumps to it.
-                            event = h.a(event.to_string(), href='%s#id_card_%s' % (
-                                data['url'], event.card.id), style='text-decoration: none;')
+                            event = h.a(to_string(event), href='%s#id_card_%s' % (
+                                data['url'], event.card_id), style='text-decoration: none;')
                         else:
-                            event = event.to_string()
+                            event = to_string(event)
                         root.append(h.li(event))
 
             ret.append(_(GROUP_MESSAGES[group]))
             ret.append('')
             for event in events:
-                ret.append(u'- ' + event.to_string())
+                ret.append(u'- ' + to_string(event))
             ret.append(u'')
 
     ret.append(
@@ -9,7 +9,10 @@
 
 from __future__ import absolute_import
 
+import types
 import pickle
+from cStringIO import StringIO
+from collections import defaultdict
 
 from nagare import database
 
@@ -31,3 +34,56 @@ class UnpicklableMixin(object):
         raise pickle.PicklingError(
             'This object is not picklable: {!r}'.format(self)
         )
+
+
+class SizePickler(pickle.Pickler):
+
+    """Pickler measuring the bytes taken by each type of object
+
+    The size of an object excludes the objects it references, measured
+    with their own type. The objects pickled more than once only count
+    for a reference.
+
+    The closures are only picklable with Stackless Python: elsewhere they,
+    and the other unpicklable objects, are counted in ``unpicklable``.
+    """
+
+    def __init__(self, protocol=pickle.HIGHEST_PROTOCOL):
+        self.output = StringIO()
+        pickle.Pickler.__init__(self, self.output, protocol)
+        self.sizes = defaultdict(lambda: [0, 0])  # {type name: [number, bytes]}
+        self.unpicklable = defaultdict(int)  # {type name: number}
+        self._nested = [0]
+
+    def save(self, obj):
+        start = self.output.tell()
+        depth = len(self._nested)
+        self._nested.append(0)
+        try:
+            pickle.Pickler.save(self, obj)
+        except (pickle.PicklingError, TypeError):
+            # the nested objects whose pickling was interrupted
+            del self._nested[depth + 1:]
+            if not isinstance(obj, (types.FunctionType, types.MethodType, types.BuiltinMethodType)):
+                raise
+            self.unpicklable[self.type_name(obj)] += 1
+            pickle.Pickler.save(self, None)
+        size = self.output.tell() - start
+        sizes = self.sizes[self.type_name(obj)]
+        sizes[0] += 1
+        sizes[1] += size - self._nested.pop()
+        self._nested[-1] += size
+
+    @staticmethod
+    def type_name(obj):
+        cls = getattr(obj, '__class__', type(obj))
+        return '%s.%s' % (cls.__module__, cls.__name__)
+
+    def measure(self, obj):
+        """Pickle ``obj``
+
+        Return:
+          - the total size in bytes
+        """
+        self.dump(obj)
+        return self.output.tell()
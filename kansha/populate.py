@@ -8,13 +8,82 @@
 # this distribution.
 #--
 
+import os
+import json
+import time
+from glob import glob
+from datetime import date, datetime
+
+from nagare import database
+
+from .card.models import DataCard
+from .board.models import DataBoard
+from .column.models import DataColumn
+from .card_addons.label import DataLabel
+from .card_addons.comment import DataComment
 from .board.models import create_template_empty, create_template_todo
 from .user import usermanager
 
 
+TEMPLATE_LABELS = (
+    (u'Vert', u'#22C328'),
+    (u'Rouge', u'#CC3333'),
+    (u'Bleu', u'#3366CC'),
+    (u'Jaune', u'#D7D742'),
+    (u'Orange', u'#DD9A3C'),
+    (u'Violet', u'#8C28BD')
+)
+
+
 def populate():
     """Populate database
     """
     create_template_empty()
     create_template_todo()
     usermanager.UserManager().populate()
+
+
+def create_boards_from_templates(user, folder):
+    """Create a board for each board template file of a folder
+
+    In:
+      - ``user`` -- the DataUser managing the new boards
+      - ``folder`` -- the folder of the ``*.btpl`` JSON files
+    """
+    for template_filename in glob(os.path.join(folder, '*.btpl')):
+        template = json.loads(open(template_filename).read())
+        board = DataBoard(title=template['title'])
+        labels_def = template.get('tags', TEMPLATE_LABELS)
+        for i, (title, color) in enumerate(labels_def):
+            __ = DataLabel(title=title,
+                           color=color,
+                           index=i,
+                           board=board)
+        database.session.flush()
+        for i, col in enumerate(template.get('columns', [])):
+            cards = col.pop('cards', [])
+            col = DataColumn(title=col['title'],
+                             index=i,
+                             board=board)
+            for j, card in enumerate(cards):
+                comments = card.pop('comments', [])
+                labels = card.pop('tags', [])
+                due_date = card.pop('due_date', None)
+                if due_date:
+                    due_date = time.strptime(due_date, '%Y-%m-%d')
+                    due_date = date(*due_date[:3])
+                card = DataCard(title=card['title'],
+                                description=card.get('description', u''),
+                                due_date=due_date,
+                                creation_date=datetime.utcnow(),
+                                column=col,
+                                index=j,
+                                labels=[board.labels[i] for i in labels])
+                for comment in comments:
+                    DataComment(comment=comment,
+                                author=user,
+                                creation_date=datetime.utcnow(),
+                                card=card)
+        board.members.append(user)
+        board.managers.append(user)
+        database.session.flush()
@@ -0,0 +1,242 @@
+# -*- coding:utf-8 -*-
+#--
+# Copyright (c) 2012-2014 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+#--
+"""
+Push of the board changes to the browsers.
+
+A channel per board, named after the board URI. The only message of a
+channel is the sequence number of the last change of the board (see
+``DataBoardChange``): the browsers then fetch the changes themselves,
+through the synchronisation of the board.
+
+The browsers subscribe with Server-Sent Events or long-polling, on a WSGI
+endpoint served outside of the nagare sessions. The processes share the
+sequence numbers through an optional SQLite file.
+"""
+
+from __future__ import absolute_import
+
+import json
+import time
+import sqlite3
+import threading
+from contextlib import closing
+
+from webob import Request, Response
+
+from nagare import log
+
+
+class Broker(object):
+
+    """In-process publish/subscribe of the last sequence number of each channel"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last = {}
+        self._conditions = {}
+
+    def _condition(self, channel):
+        # called with the lock held
+        condition = self._conditions.get(channel)
+        if condition is None:
+            condition = self._conditions[channel] = threading.Condition(self._lock)
+        return condition
+
+    def publish(self, channel, seq):
+        """A channel reached a sequence number
+
+        Older sequence numbers, received late, are ignored.
+        """
+        with self._lock:
+            if seq > self._last.get(channel, 0):
+                self._last[channel] = seq
+                self._condition(channel).notify_all()
+
+    def wait(self, channel, seq, timeout):
+        """Wait for a sequence number greater than ``seq``
+
+        In:
+          - ``channel`` -- the channel
+          - ``seq`` -- last sequence number known by the subscriber
+          - ``timeout`` -- maximum waiting time, in seconds
+        Return:
+          - the new sequence number, None on timeout
+        """
+        deadline = time.time() + timeout
+        with self._lock:
+            condition = self._condition(channel)
+            while self._last.get(channel, 0) <= seq:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return None
+                condition.wait(remaining)
+            return self._last[channel]
+
+
+class SQLiteFanout(object):
+
+    """Share the published sequence numbers between processes, through a SQLite file
+
+    Each process appends what it publishes and a thread polls what the
+    other processes published.
+    """
+
+    # number of rows kept in the file
+    MAX_ROWS = 10000
+
+    def __init__(self, path, broker, interval=0.5):
+        self.path = path
+        self.broker = broker
+        self.interval = interval
+        with closing(self._connect()) as connection:
+            connection.execute('PRAGMA journal_mode = WAL')
+            connection.execute('''create table if not exists push (
+                                    id integer primary key autoincrement,
+                                    channel text,
+                                    seq integer
+                                  )''')
+            connection.commit()
+            self._last_id = connection.execute('select max(id) from push').fetchone()[0] or 0
+        self._thread = threading.Thread(target=self._poll)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _connect(self):
+        # sqlite connections can't be shared between threads, one per operation
+        return sqlite3.connect(self.path, timeout=30)
+
+    def publish(self, channel, seq):
+        with closing(self._connect()) as connection:
+            cursor = connection.execute('insert into push(channel, seq) values (?, ?)', (channel, seq))
+            if cursor.lastrowid % 1000 == 0:
+                connection.execute('delete from push where id <= ?', (cursor.lastrowid - self.MAX_ROWS,))
+            connection.commit()
+
+    def poll(self):
+        """Publish locally what was published since the last poll
+
+        Return:
+          - number of rows read
+        """
+        with closing(self._connect()) as connection:
+            rows = connection.execute('select id, channel, seq from push where id > ? order by id',
+                                      (self._last_id,)).fetchall()
+        for id_, channel, seq in rows:
+            self.broker.publish(channel, seq)
+            self._last_id = id_
+        return len(rows)
+
+    def _poll(self):
+        while True:
+            try:
+                self.poll()
+            except Exception:
+                log.exception('Polling of the push file %s failed', self.path)
+            time.sleep(self.interval)
+
+
+# the broker and the fan-out of the process
+broker = Broker()
+_fanout = None
+# URL prefix of the push endpoint, None when the push is not activated
+_url = None
+
+
+def configure(url, fanout=None, interval=0.5):
+    """Activate the push in this process
+
+    In:
+      - ``url`` -- URL prefix of the endpoint, relative to the application
+      - ``fanout`` -- path of the SQLite file shared with the other processes
+      - ``interval`` -- seconds between two polls of the SQLite file
+    """
+    global _url, _fanout
+    _url = url.rstrip('/')
+    if fanout and _fanout is None:
+        _fanout = SQLiteFanout(fanout, broker, interval)
+
+
+def activated():
+    return _url is not None
+
+
+def get_url(application_url, channel):
+    """URL of the endpoint for a channel, None when the push is not activated"""
+    return None if _url is None else '%s%s/%s' % (application_url, _url, channel)
+
+
+def publish(channel, seq):
+    """Publish the sequence number of a channel to the subscribers of every process"""
+    if _url is None:
+        return
+    broker.publish(channel, seq)
+    if _fanout is not None:
+        try:
+            _fanout.publish(channel, seq)
+        except sqlite3.Error:
+            log.exception('Publication in the push file %s failed', _fanout.path)
+
+
+class PushWSGIMiddleware(object):
+
+    """Serve the subscriptions to the channels
+
+    ``GET <url>/<channel>`` streams the new sequence numbers of the channel
+    as Server-Sent Events when the client accepts ``text/event-stream``.
+    Else, it waits for a sequence number greater than the ``last`` parameter
+    and returns it in JSON, ``{"last": null}`` after ``timeout`` seconds.
+
+    Each subscriber holds a thread of the server for up to ``timeout`` seconds,
+    then reconnects.
+    """
+
+    def __init__(self, app, url='/push', timeout=30, keepalive=15, broker=broker):
+        self._app = app
+        self.url = url.rstrip('/') + '/'
+        self.timeout = timeout
+        self.keepalive = keepalive
+        self.broker = broker
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        if not path.startswith(self.url):
+            return self._app(environ, start_response)
+
+        request = Request(environ)
+        channel = path[len(self.url):]
+        if request.method != 'GET' or not channel or '/' in channel:
+            return Response(status=404)(environ, start_response)
+        try:
+            last = int(request.headers.get('Last-Event-ID') or request.GET.get('last') or 0)
+        except ValueError:
+            return Response(status=400)(environ, start_response)
+
+        if 'text/event-stream' in request.headers.get('Accept', ''):
+            response = Response(content_type='text/event-stream', cache_control='no-cache')
+            response.app_iter = self.stream(channel, last)
+        else:
+            response = Response(content_type='application/json', cache_control='no-cache')
+            response.body = json.dumps({'last': self.broker.wait(channel, last, self.timeout)})
+        return response(environ, start_response)
+
+    def stream(self, channel, last):
+        """The events of a channel, until ``timeout``"""
+        yield 'retry: 1000\n\n'
+        deadline = time.time() + self.timeout
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            seq = self.broker.wait(channel, last, min(self.keepalive, remaining))
+            if seq is None:
+                yield ':\n\n'
+            else:
+                last = seq
+                yield 'id: %d\ndata: %d\n\n' % (seq, seq)
@@ -17,6 +17,7 @@ from nagare.security import form_auth, common
 
 from .card import Card  # Do not remove
 from .board import Board  # Do not remove
+from .board.boardsmanager import BoardMembership  # Do not remove
 from .user.usermanager import UserManager
 from .column import CardsCounter, Column  # Do not remove
 from .board import COMMENTS_PUBLIC, COMMENTS_MEMBERS
@@ -96,6 +97,16 @@ class Rules(common.Rules):
         """Test if users is one of the board's members"""
         return board.has_member(user)
 
+    @when(common.Rules.has_permission, "user and perm == 'manage' and isinstance(subject, BoardMembership)")
+    def _(self, user, perm, membership):
+        """Test if users is one of the board's managers, from prefetched roles"""
+        return membership.has_manager(user)
+
+    @when(common.Rules.has_permission, "user and (perm == 'edit') and isinstance(subject, BoardMembership)")
+    def _(self, user, perm, membership):
+        """Test if users is one of the board's members, from prefetched roles"""
+        return membership.has_member(user)
+
     @when(common.Rules.has_permission, "user and (perm == 'edit') and isinstance(subject, Column)")
     def _(self, user, perm, column):
         return security.has_permissions('edit', column.board)
@@ -15,6 +15,9 @@ from .models import DataHistory
 
 class ActionLog(object):
 
+    # number of events loaded at once by the viewer
+    PAGE_SIZE = 50
+
     def __init__(self, board, card=None):
         self._board = board
         self._card = card
@@ -54,10 +57,33 @@ class ActionLog(object):
     def get_events_for_data(data_board, hours=None):
         return DataHistory.get_events(data_board, hours)
 
+    @staticmethod
+    def get_last_event_id():
+        return DataHistory.get_last_id()
+
+    @staticmethod
+    def get_new_events_for_data(board_ids, after_id, until_id, hours=None):
+        return DataHistory.get_new_events(board_ids, after_id, until_id, hours)
+
+    @staticmethod
+    def get_last_activities_for_data(board_ids):
+        return DataHistory.get_last_activities(board_ids)
+
     # view API
-    def get_history(self):
-        'internal'
-        return DataHistory.get_history(self.board.data, cardid=self.card_id(), username=self.user_id())
+    def get_history(self, before=None):
+        """Return a page of events, matching the filters
+
+        In:
+          - ``before`` -- (when, id) of the last event of the previous page
+        Return:
+          - (events, (when, id) of the next page or None if no more events)
+        """
+        events = DataHistory.get_history(self.board.data, cardid=self.card_id(), username=self.user_id(),
+                                         before=before, limit=self.PAGE_SIZE + 1)
+        if len(events) <= self.PAGE_SIZE:
+            return events, None
+        events = events[:self.PAGE_SIZE]
+        return events, (events[-1].when, events[-1].id)
 
 
 class DummyActionLog(ActionLog):
@@ -71,5 +97,5 @@ class DummyActionLog(ActionLog):
     def get_last_activity(self):
         return []
 
-    def get_history(self):
-        return []
+    def get_history(self, before=None):
+        return [], None
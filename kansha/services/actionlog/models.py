@@ -9,13 +9,17 @@
 # --
 
 import json
+import zlib
+import weakref
 from datetime import datetime, timedelta
 
-from sqlalchemy.types import TypeDecorator
+from sqlalchemy import and_, or_, func, select, event, Index
+from sqlalchemy.orm import joinedload, Session
+from sqlalchemy.types import TypeDecorator, LargeBinary
 
 from elixir import ManyToOne
-from elixir import using_options
-from elixir import Field, Unicode, UnicodeText, DateTime
+from elixir import using_options, using_table_options
+from elixir import Field, Integer, Unicode, UnicodeText, DateTime
 
 from nagare import database
 
@@ -24,6 +28,12 @@ from kansha.models import Entity
 from .messages import render_event
 
 
+# events waiting for the flush of their session: {session: [event]}
+_pending_events = weakref.WeakKeyDictionary()
+# maximum number of rows of a single insert
+HISTORY_INSERT_SIZE = 100
+
+
 # Models
 
 
@@ -43,6 +53,9 @@ class JSONType(TypeDecorator):
 
 class DataHistory(Entity):
     using_options(tablename='history', order_by='-when')
+    # the events of a board, by date
+    using_table_options(Index('ix_history_board_when', 'board_id', 'when'),
+                        Index('ix_history_when', 'when'))
 
     when = Field(DateTime)
     action = Field(Unicode(255))
@@ -59,11 +72,38 @@ class DataHistory(Entity):
 
     @classmethod
     def add_history(cls, board, card, user, action, data):
+        """Log an event
+
+        The event is buffered and written with the other events of the unit
+        of work, in one insert, when the session is flushed or committed.
+        """
         data.update(action=action)
         when = datetime.utcnow()
-        data = cls(
-            when=when, action=action, board=board, card=card, user=user, data=data)
-        database.session.flush()
+        _pending_events.setdefault(database.session(), []).append((when, action, data, board, card, user))
+        if board is not None:
+            board.last_activity = when
+
+    @classmethod
+    def write_events(cls, session, deleted=()):
+        """Insert the buffered events of the session
+
+        In:
+          - ``session`` -- the SQLAlchemy session
+          - ``deleted`` -- objects being deleted, their events are dropped as
+            the database would cascade their deletion
+        """
+        events = _pending_events.pop(session, None)
+        if not events:
+            return
+        rows = [
+            {'when': when, 'action': action, 'data': data,
+             'board_id': board and board.id, 'card_id': card and card.id,
+             'user_username': user.username, 'user_source': user.source}
+            for when, action, data, board, card, user in events
+            if board not in deleted and card not in deleted
+        ]
+        for i in xrange(0, len(rows), HISTORY_INSERT_SIZE):
+            session.execute(cls.table.insert().values(rows[i:i + HISTORY_INSERT_SIZE]))
 
     @classmethod
     def get_events(cls, board, hours=None):
@@ -77,14 +117,113 @@ class DataHistory(Entity):
         return q.all()
 
     @classmethod
-    def get_history(cls, board, cardid=None, username=None):
-        q = cls.query
-        q = q.filter_by(board=board)
+    def get_last_id(cls):
+        '''Id of the last event, None if there is none'''
+        return database.session.query(func.max(cls.id)).scalar()
+
+    @classmethod
+    def get_new_events(cls, board_ids, after_id, until_id, hours=None):
+        '''Events of several boards in one query, by id range
+
+        In:
+          - ``board_ids`` -- ids of the boards
+          - ``after_id`` -- the events after this one
+          - ``until_id`` -- only the events up to this one, included
+          - ``hours`` -- the events of the last ``hours`` hours
+        With both ``after_id`` and ``hours``, the events after ``after_id``
+        or of the last ``hours`` hours. With none, no lower bound.
+        Return:
+          - dictionary {board id: [events ordered by action and id]}
+        '''
+        if not board_ids or until_id is None:
+            return {}
+        q = cls.query.filter(cls.board_id.in_(board_ids))
+        lower_bounds = []
+        if after_id is not None:
+            lower_bounds.append(cls.id > after_id)
+        if hours is not None:
+            lower_bounds.append(cls.when >= datetime.utcnow() - timedelta(hours=hours))
+        if lower_bounds:
+            q = q.filter(or_(*lower_bounds))
+        q = q.filter(cls.id <= until_id)
+        q = q.order_by(cls.board_id, cls.action, cls.id)
+        # authors are needed to render the events
+        q = q.options(joinedload('user'))
+        events = {}
+        for event in q:
+            events.setdefault(event.board_id, []).append(event)
+        return events
+
+    @classmethod
+    def archive(cls, before, chunk_size=1000):
+        '''Move the oldest events to the archive, a chunk at a time
+
+        In:
+          - ``before`` -- only the events older than this date
+          - ``chunk_size`` -- maximum number of events moved
+        Return:
+          - number of events moved, 0 when there are no more
+        '''
+        table = cls.table
+        q = select([table]).where(table.c.when < before).order_by(table.c.when).limit(chunk_size)
+        rows = database.session.execute(q).fetchall()
+        if not rows:
+            return 0
+        database.session.execute(DataHistoryArchive.table.insert(),
+                                 [DataHistoryArchive.from_row(row) for row in rows])
+        cls.delete_events([row[table.c.id] for row in rows])
+        return len(rows)
+
+    @classmethod
+    def delete_events(cls, ids):
+        table = cls.table
+        database.session.execute(table.delete().where(table.c.id.in_(ids)))
+
+    @classmethod
+    def prune(cls, before, chunk_size=1000):
+        '''Delete the oldest events, a chunk at a time
+
+        In:
+          - ``before`` -- only the events older than this date
+          - ``chunk_size`` -- maximum number of events deleted
+        Return:
+          - number of events deleted, 0 when there are no more
+        '''
+        q = database.session.query(cls.id).filter(cls.when < before).order_by(cls.when).limit(chunk_size)
+        ids = [id_ for id_, in q]
+        if ids:
+            cls.delete_events(ids)
+        return len(ids)
+
+    @classmethod
+    def get_history(cls, board, cardid=None, username=None, before=None, limit=None):
+        """Return the events of a board, newest first
+
+        The events are paginated on (when, id), so that a page costs the
+        same whatever the age of the board.
+
+        In:
+          - ``board`` -- DataBoard instance
+          - ``cardid`` -- only the events of this card
+          - ``username`` -- only the events of this user
+          - ``before`` -- (when, id) of the last event of the previous page
+          - ``limit`` -- maximum number of events
+        Return:
+          - list of events, with their author and card loaded
+        """
+        q = cls.query.options(joinedload('user'), joinedload('card'))
+        q = q.filter(cls.board_id == board.id)
         if cardid:
-            q = q.filter(cls.card.has(id=cardid))
+            q = q.filter(cls.card_id == cardid)
         if username:
-            q = q.filter(cls.user.has(username=username))
-        return q
+            q = q.filter(cls.user_username == username)
+        if before is not None:
+            when, id_ = before
+            q = q.filter(or_(cls.when < when, and_(cls.when == when, cls.id < id_)))
+        q = q.order_by(None).order_by(cls.when.desc(), cls.id.desc())
+        if limit is not None:
+            q = q.limit(limit)
+        return q.all()
 
     @classmethod
     def get_last_activity(cls, board):
@@ -93,3 +232,69 @@ class DataHistory(Entity):
         q = q.order_by(cls.when.desc())
         q = q.limit(1)
         return q.scalar()
+
+    @classmethod
+    def get_last_activities(cls, board_ids):
+        '''Return a dictionary {board id: date of the last event} in one query'''
+        if not board_ids:
+            return {}
+        q = database.session.query(cls.board_id, func.max(cls.when))
+        q = q.filter(cls.board_id.in_(board_ids))
+        q = q.group_by(cls.board_id)
+        return dict(q)
+
+
+@event.listens_for(Session, 'after_flush')
+def _write_events_after_flush(session, flush_context):
+    # the new boards and cards now have an id
+    DataHistory.write_events(session, set(session.deleted))
+
+
+@event.listens_for(Session, 'before_commit')
+def _write_events_before_commit(session):
+    if session in _pending_events:
+        # a flush of a clean session doesn't trigger the 'after_flush' event
+        session.flush()
+        DataHistory.write_events(session)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _drop_events(session):
+    _pending_events.pop(session, None)
+
+
+class DataHistoryArchive(Entity):
+    '''Events past the retention delay, compact: only the board and the date are indexed,
+    the rest is compressed'''
+    using_options(tablename='history_archive')
+    using_table_options(Index('ix_history_archive_board_when', 'board_id', 'when'))
+
+    # same id as the original event
+    id = Field(Integer, primary_key=True, autoincrement=False)
+    board_id = Field(Integer)
+    when = Field(DateTime)
+    content = Field(LargeBinary)
+
+    @staticmethod
+    def from_row(row):
+        '''Values of the archive row of a ``history`` row'''
+        content = {'action': row['action'], 'data': row['data'], 'card_id': row['card_id'],
+                   'user': [row['user_username'], row['user_source']]}
+        return {'id': row['id'], 'board_id': row['board_id'], 'when': row['when'],
+                'content': zlib.compress(json.dumps(content))}
+
+    def to_dict(self):
+        '''The archived event'''
+        event = json.loads(zlib.decompress(self.content))
+        event.update(id=self.id, board_id=self.board_id, when=self.when)
+        return event
+
+    @classmethod
+    def get_events(cls, board_id):
+        '''Archived events of a board, the most recent first'''
+        q = cls.query.filter_by(board_id=board_id).order_by(cls.when.desc())
+        return [event.to_dict() for event in q]
+
+    @classmethod
+    def delete_board(cls, board_id):
+        database.session.execute(cls.table.delete().where(cls.table.c.board_id == board_id))
@@ -37,10 +37,27 @@ def render_ActionLog_history(self, h, *_args):
                         h << h.option(card.title, value=card.id).selected(
                             self.card_id())
         with h.div(class_='history'):
-            with h.table(class_='table table-striped table-hover'):
-                with h.body:
-                    for event in self.get_history():
-                        with h.tr:
-                            h << h.th(format_datetime(event.when, 'short'))
-                            h << h.td(event.to_string())
+            h << render_history_page(self, h)
     return h.root
+
+
+def render_history_page(self, h, before=None):
+    """Render a page of events, followed by the loader of the older ones
+
+    In:
+      - ``before`` -- (when, id) of the last event of the previous page
+    """
+    events, next_page = self.get_history(before)
+    rows = [h.tr(h.th(format_datetime(event.when, 'short')), h.td(event.to_string())) for event in events]
+    page = h.div(h.table(h.tbody(rows), class_='table table-striped table-hover'))
+    if next_page is not None:
+        # replaced by the next page
+        loader_id = h.generate_id('history')
+        page.append(h.div(
+            h.a(_(u'Older events')).action(
+                ajax.Update(render=lambda r: render_history_page(self, r, next_page),
+                            component_to_update=loader_id)
+            ),
+            id=loader_id, class_='older-events'
+        ))
+    return page
@@ -7,6 +7,8 @@
 # the file LICENSE.txt, which you should have received as part of
 # this distribution.
 #--
+import os
+
 from paste import fileapp
 from webob.exc import WSGIHTTPException
 
@@ -28,11 +30,12 @@ class AssetsManager(Service):
     MEDIUM_WIDTH = 425
     COVER_SIZE = (MEDIUM_WIDTH, 250)
 
-    def copy(self, file_id):
+    def copy(self, file_id, new_file_id=None):
         '''Copy a file from its file_id
 
         In:
             - ``file_id`` -- file id of the source file
+            - ``new_file_id`` -- file id of the copy, if None create a random id
         Return:
             - copied file id'''
 
@@ -79,6 +82,17 @@ class AssetsManager(Service):
         """
         pass
 
+    def get_placeholder(self, file_id, size):
+        """Return the image served while a size of the file is generated
+
+        In:
+            - ``file_id`` -- file identifier
+            - ``size`` -- the missing size
+        Return:
+            - (filename, content type) or None
+        """
+        return None
+
     def data_for_src(self, file_id):
         """Return data for attribute src of img tag
 
@@ -101,9 +115,15 @@ def init_assets(self, url, comp, http_method, request):
     content_type = metadata.get('content-type')
     headers = {'content-type': content_type} if content_type else {}
 
-    raise FileResponse(self._get_filename(url[0],
-                                          url[1] if len(url) > 1 else None),
-                       **headers)
+    size = url[1] if len(url) > 1 else None
+    filename = self._get_filename(url[0], size)
+    if not os.path.exists(filename):
+        placeholder = self.get_placeholder(url[0], size)
+        if placeholder is not None:
+            filename, content_type = placeholder
+            headers = {'content-type': content_type}
+
+    raise FileResponse(filename, **headers)
 
 
 class FileResponse(WSGIHTTPException):
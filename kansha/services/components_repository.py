@@ -15,6 +15,7 @@ class CardExtensions(plugins.Plugins):
     ENTRY_POINTS = 'kansha.card.extensions'
     CONFIG_SECTION = 'card_extensions'
     CONFIGURATORS = {}
+    PREFETCH_CHUNK = 500  # keep under the bound parameters limit of SQLite
 
     def set_configurators(self, configurators):
         """
@@ -34,3 +35,24 @@ class CardExtensions(plugins.Plugins):
             (name, services_service(klass, card, action_log, self.CONFIGURATORS.get(name)))
             for name, klass in self.items()
         ]
+
+    def update_documents(self, documents):
+        '''Add the values of all the extensions to the documents {card id: document}'''
+        card_ids = documents.keys()
+        for i in xrange(0, len(card_ids), self.PREFETCH_CHUNK):
+            chunk = dict((card_id, documents[card_id]) for card_id in card_ids[i:i + self.PREFETCH_CHUNK])
+            for __, klass in self.items():
+                klass.update_documents(chunk)
+
+    def prefetch(self, card_ids):
+        """
+        Return the summaries of all the extensions for the given cards,
+        as a dictionary {card id: {extension class: summary}}.
+        """
+        prefetched = dict((card_id, {}) for card_id in card_ids)
+        for i in xrange(0, len(card_ids), self.PREFETCH_CHUNK):
+            chunk = card_ids[i:i + self.PREFETCH_CHUNK]
+            for __, klass in self.items():
+                for card_id, summary in klass.prefetch(chunk).iteritems():
+                    prefetched[card_id][klass] = summary
+        return prefetched
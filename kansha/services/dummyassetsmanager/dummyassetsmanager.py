@@ -24,6 +24,10 @@ class DummyAssetsManager(AssetsManager):
         log.debug("%s" % metadata)
         return 'mock_id'
 
+    def copy(self, file_id, new_file_id=None):
+        log.debug("Copy Image")
+        return new_file_id or 'mock_id'
+
     def load(self, file_id):
         log.debug("Load Image")
         package = pkg_resources.Requirement.parse('kansha')
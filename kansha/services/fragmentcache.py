@@ -0,0 +1,124 @@
+# -*- coding:utf-8 -*-
+#--
+# Copyright (c) 2012-2014 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+#--
+"""
+Cache of rendered HTML fragments, shared by the sessions of a process.
+
+The keys must change with the content: a fragment is never invalidated,
+only evicted, the least recently used first, when the cache exceeds its
+memory budget.
+"""
+
+import cgi
+import threading
+from collections import OrderedDict
+
+from .services_repository import Service
+
+
+class LRUCache(object):
+    '''Strings by key, up to ``max_size`` bytes'''
+
+    def __init__(self):
+        self.items = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            value = self.items.pop(key, None)
+            if value is not None:
+                # most recently used
+                self.items[key] = value
+            return value
+
+    def set(self, key, value, max_size):
+        if len(value) > max_size:
+            return
+        with self.lock:
+            previous = self.items.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous)
+            self.items[key] = value
+            self.size += len(value)
+            while self.size > max_size:
+                __, evicted = self.items.popitem(last=False)
+                self.size -= len(evicted)
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+            self.size = 0
+
+    def __len__(self):
+        return len(self.items)
+
+
+# the fragments of the process, not pickled with the sessions
+_fragments = LRUCache()
+
+
+def to_html(fragment):
+    """Serialize a rendered fragment: a tag, a list of tags or a text"""
+    if not fragment:
+        return ''
+    if isinstance(fragment, (list, tuple)):
+        return ''.join(to_html(item) for item in fragment)
+    if isinstance(fragment, basestring):
+        return cgi.escape(fragment).encode('utf-8')
+    return fragment.write_htmlstring()
+
+
+class FragmentCache(Service):
+    LOAD_PRIORITY = 10
+    CONFIG_SPEC = {
+        'max_size': 'integer(default=16384)'   # Memory budget in kilobytes, 0 to disable the cache
+    }
+
+    def __init__(self, config_filename, error, max_size=16384):
+        super(FragmentCache, self).__init__(config_filename, error)
+        self.max_size = max_size * 1024
+
+    def get(self, key):
+        """Return a fragment
+
+        In:
+         - ``key`` -- hashable identifier of the fragment and its version
+        Return:
+         - the HTML fragment or None
+        """
+        return _fragments.get(key) if self.max_size else None
+
+    def set(self, key, html):
+        """Keep a fragment, evicting the least recently used ones if needed
+
+        In:
+         - ``key`` -- hashable identifier of the fragment and its version
+         - ``html`` -- the HTML fragment
+        """
+        if self.max_size:
+            _fragments.set(key, html, self.max_size)
+
+    def render(self, h, key, render):
+        """Render a fragment, or reuse it from the cache
+
+        In:
+         - ``h`` -- the renderer
+         - ``key`` -- hashable identifier of the fragment and its version
+         - ``render`` -- function rendering the fragment with ``h``, it must register no action
+        Return:
+         - the fragment
+        """
+        if not self.max_size:
+            return render(h)
+        html = self.get(key)
+        if html is None:
+            html = to_html(render(h))
+            self.set(key, html)
+        return h.parse_htmlstring(html, fragment=True) if html else ''
@@ -8,22 +8,72 @@
 # this distribution.
 #--
 
+import os
+import json
+import time
+import uuid
+import socket
 import smtplib
+import threading
+from contextlib import contextmanager
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.Utils import COMMASPACE, formatdate
 
 from nagare import log
 
+from .mailqueue import MailQueue
 from .services_repository import Service
 
 
+# background workers draining the mail queues, by queue path
+_workers = {}
+_workers_lock = threading.Lock()
+
+
+class SMTPState(threading.local):
+    '''SMTP connection of the current thread'''
+    smtp = None
+    # messages sent on the connection
+    nb_sent = 0
+    # nesting level of ``MailSender.batch``
+    batch = 0
+
+
+class RateLimiter(object):
+    '''Spread calls over time, at most ``rate`` per second (no limit if 0)'''
+
+    def __init__(self, rate=0):
+        self.interval = 1.0 / rate if rate else 0
+        self.next_call = 0
+
+    def wait(self):
+        if not self.interval:
+            return
+        now = time.time()
+        if self.next_call > now:
+            time.sleep(self.next_call - now)
+            now = self.next_call
+        self.next_call = now + self.interval
+
+
 class MailSender(Service):
     '''
     Mail sender service.
 
     API.
-    A mail sender service must provide a send method:
+    A mail sender service must provide a send method.
+
+    Within a ``batch`` block, or with ``send_many``, the SMTP connection
+    stays open between the messages. Messages that can't be sent because
+    of a connection failure or a transient error go to the spool folder,
+    if configured, and are sent again by ``send_spooled``. Else, they are
+    logged and lost, unless ``send`` is called with ``raise_errors``.
+
+    With a ``queue``, messages are only stored in a durable queue, so that
+    requests never wait for the SMTP server. The queue is drained by
+    ``process_queue``, called by a background thread if ``worker`` is on,
+    or by the ``send-mails`` command.
     '''
 
     LOAD_PRIORITY = 10
@@ -31,36 +81,228 @@ class MailSender(Service):
         'activated': 'boolean(default=True)',
         'host': 'string(default="127.0.0.1")',
         'port': 'integer(default=25)',
-        'default_sender': 'string(default="noreply@email.com")'
+        'default_sender': 'string(default="noreply@email.com")',
+        'max_per_connection': 'integer(default=100)',
+        'spool': 'string(default="")',
+        'queue': 'string(default="")',
+        'worker': 'boolean(default=False)',
+        'worker_interval': 'integer(default=10)'
     }
 
-    def __init__(self, config_filename, error, host, port, default_sender, activated):
+    def __init__(self, config_filename, error, host, port, default_sender, activated,
+                 max_per_connection=100, spool='', queue='', worker=False, worker_interval=10):
         super(MailSender, self).__init__(config_filename, error)
         self.host = host
         self.port = port
         self.default_sender = default_sender
         self.activated = activated
+        self.max_per_connection = max_per_connection
+        self.spool = spool
+        self._state = SMTPState()
+        self.queue = None
         if self.activated:
             log.debug(
                 'The mail service will connect to %s on port %s' %
                 (self.host, self.port)
             )
+            if self.spool and not os.path.isdir(self.spool):
+                os.makedirs(self.spool)
+            if queue:
+                self.queue = MailQueue(queue)
+                if worker:
+                    self.start_worker(worker_interval)
         else:
             log.warning('The mail service will drop all messages!')
 
-    def _smtp_send(self, from_, to, contents):
-        smtp = smtplib.SMTP(self.host, self.port)
+    # be persistence friendly
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_state']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._state = SMTPState()
+
+    def _connect(self):
+        state = self._state
+        if state.smtp is not None and state.nb_sent >= self.max_per_connection:
+            self._disconnect()
+        if state.smtp is None:
+            state.smtp = smtplib.SMTP(self.host, self.port)
+            state.nb_sent = 0
+        return state.smtp
+
+    def _disconnect(self):
+        smtp, self._state.smtp = self._state.smtp, None
+        if smtp is not None:
+            try:
+                smtp.quit()
+            except (smtplib.SMTPException, socket.error):
+                smtp.close()
+
+    def _sendmail(self, from_, to, contents):
+        self._connect().sendmail(from_, to, contents)
+        self._state.nb_sent += 1
+
+    def _deliver(self, from_, to, contents):
+        try:
+            self._sendmail(from_, to, contents)
+        except (smtplib.SMTPServerDisconnected, socket.error):
+            # the server may have closed an idle connection: retry once on a new one
+            self._disconnect()
+            self._sendmail(from_, to, contents)
+
+    @staticmethod
+    def _is_transient(error):
+        '''May sending again succeed?'''
+        if isinstance(error, smtplib.SMTPRecipientsRefused):
+            return False
+        if isinstance(error, smtplib.SMTPResponseException):
+            return error.smtp_code < 500
+        return True
+
+    def _smtp_send(self, from_, to, contents, raise_errors=False):
         try:
-            smtp.sendmail(from_, to, contents)
+            self._deliver(from_, to, contents)
         except Exception as e:
             log.exception(e)
+            if self._is_transient(e):
+                self._disconnect()
+                if self._spool_message(from_, to, contents):
+                    return
+            if raise_errors:
+                raise
+            log.error('Mail to %s lost', to)
         finally:
-            smtp.close()
+            if not self._state.batch:
+                self._disconnect()
+
+    def _post(self, from_, to, contents, raise_errors=False):
+        if self.queue is not None:
+            self.queue.put(from_, to, contents)
+        else:
+            self._smtp_send(from_, to, contents, raise_errors)
+
+    def _spool_message(self, from_, to, contents):
+        """Keep a message to send it again later
+
+        Return:
+         - was the message spooled?
+        """
+        if not self.spool:
+            return False
+        name = os.path.join(self.spool, '%.6f-%s' % (time.time(), uuid.uuid4().hex))
+        with open(name + '.tmp', 'w') as spooled:
+            json.dump({'from': from_, 'to': to, 'message': contents}, spooled)
+        # atomic, never send a partially written message
+        os.rename(name + '.tmp', name + '.json')
+        log.warning('Mail to %s spooled in %s.json', to, name)
+        return True
+
+    @contextmanager
+    def batch(self):
+        """Keep the SMTP connection open for all the messages sent in the block
+
+        The connection is renewed every ``max_per_connection`` messages.
+        """
+        self._state.batch += 1
+        try:
+            yield self
+        finally:
+            self._state.batch -= 1
+            if not self._state.batch:
+                self._disconnect()
+
+    def send_many(self, messages):
+        """Sends many emails on the same SMTP connection
+
+        In:
+         - ``messages`` -- iterable of dictionaries of ``send`` keyword arguments
+        """
+        with self.batch():
+            for message in messages:
+                self.send(**message)
+
+    def send_spooled(self):
+        """Sends again the emails of the spool
+
+        The ones that fail again are spooled again.
+
+        Return:
+         - number of emails taken from the spool
+        """
+        if not (self.activated and self.spool and os.path.isdir(self.spool)):
+            return 0
+        names = sorted(name for name in os.listdir(self.spool) if name.endswith('.json'))
+        with self.batch():
+            for name in names:
+                path = os.path.join(self.spool, name)
+                with open(path) as spooled:
+                    message = json.load(spooled)
+                os.remove(path)
+                self._smtp_send(message['from'], message['to'], message['message'].encode('utf-8'))
+        return len(names)
+
+    def process_queue(self, limit=100):
+        """Sends the queued emails that are due
+
+        The ones that fail with a transient error are retried later,
+        with an exponential backoff.
+
+        In:
+         - ``limit`` -- maximum number of emails
+        Return:
+         - number of emails taken from the queue
+        """
+        if self.queue is None:
+            return 0
+        messages = self.queue.claim(limit)
+        with self.batch():
+            for id_, from_, to, contents, attempts in messages:
+                try:
+                    self._deliver(from_, to, contents)
+                except Exception as e:
+                    log.exception(e)
+                    if self._is_transient(e):
+                        self._disconnect()
+                        if self.queue.retry(id_, attempts, e):
+                            log.error('Mail to %s abandoned after %d attempts, see send-mails --dead-letters',
+                                      to, attempts + 1)
+                        continue
+                self.queue.remove(id_)
+        return len(messages)
+
+    def start_worker(self, interval):
+        """Drains the queue in a background thread, once per process
+
+        In:
+         - ``interval`` -- seconds between two polls of an empty queue
+        """
+        with _workers_lock:
+            if self.queue.path in _workers:
+                return
+            worker = threading.Thread(target=self._work, args=(interval,), name='kansha-mail-queue')
+            worker.daemon = True
+            _workers[self.queue.path] = worker
+            worker.start()
+
+    def _work(self, interval):
+        while True:
+            try:
+                if self.process_queue():
+                    continue
+            except Exception as e:
+                log.exception(e)
+            time.sleep(interval)
 
     def send(self, subject, to, content, html_content=None, from_='', cc=[], bcc=[],
-             type='plain', mpart_type='alternative'):
+             type='plain', mpart_type='alternative', raise_errors=False):
         """Sends an email
 
+        An email that can't be sent, nor spooled, is logged and lost,
+        unless ``raise_errors``.
+
         In:
          - ``subject`` -- email subject
          - ``to`` -- list of recipients' emails
@@ -70,6 +312,7 @@ class MailSender(Service):
          - ``bcc`` -- list of BCC emails
          - ``type`` --  email type ('plain' or 'html')
          - ``mpart_type`` -- email part type
+         - ``raise_errors`` -- raise the errors of the emails neither sent nor spooled
 
         """
         from_ = from_ if from_ else self.default_sender
@@ -97,9 +340,9 @@ class MailSender(Service):
                  'sending' if self.activated else 'ignoring', subject, from_, to, cc, bcc)
         log.debug('Mail content:\n' + content)
 
-        # post the email to the SMTP server
+        # post the email to the SMTP server, or to the queue
         if self.activated:
-            self._smtp_send(from_, to + cc + bcc, msg.as_string())
+            self._post(from_, to + cc + bcc, msg.as_string(), raise_errors)
 
 
 class DummyMailSender(MailSender):
@@ -0,0 +1,136 @@
+# -*- coding:utf-8 -*-
+#--
+# Copyright (c) 2012-2014 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+#--
+"""
+Durable queue of outgoing emails, in a SQLite file.
+
+Several processes can put messages in the queue and drain it: a message is
+claimed for a while before being sent, so that it is sent only once.
+"""
+
+import json
+import time
+import sqlite3
+from contextlib import closing
+
+
+class MailQueue(object):
+
+    # seconds a claimed message is reserved for its sender
+    LEASE = 300
+    # delay before the first retry, doubled at each attempt, up to MAX_DELAY
+    RETRY_DELAY = 60
+    MAX_DELAY = 6 * 3600
+    # then the message is abandoned
+    MAX_ATTEMPTS = 10
+
+    def __init__(self, path):
+        self.path = path
+        with closing(self._connect()) as connection:
+            connection.execute('PRAGMA journal_mode = WAL')
+            connection.execute('''create table if not exists mail (
+                                    id integer primary key,
+                                    sender text,
+                                    recipients text,
+                                    message text,
+                                    attempts integer not null default 0,
+                                    next_try real not null,
+                                    last_error text
+                                  )''')
+            connection.execute('create index if not exists mail_next_try on mail(next_try)')
+            connection.commit()
+
+    def _connect(self):
+        # sqlite connections can't be shared between threads, one per operation
+        return sqlite3.connect(self.path, timeout=30)
+
+    def put(self, from_, to, contents):
+        """Add a message to the queue
+
+        In:
+         - ``from_`` -- sender address
+         - ``to`` -- list of recipients
+         - ``contents`` -- the whole message, as a string
+        """
+        if not isinstance(contents, unicode):
+            contents = contents.decode('utf-8')
+        with closing(self._connect()) as connection:
+            connection.execute('insert into mail(sender, recipients, message, next_try) values (?, ?, ?, ?)',
+                               (from_, json.dumps(to), contents, time.time()))
+            connection.commit()
+
+    def claim(self, limit=100):
+        """Reserve the messages that are due
+
+        In:
+         - ``limit`` -- maximum number of messages
+        Return:
+         - list of (id, sender, recipients, contents, attempts)
+        """
+        now = time.time()
+        claimed = []
+        with closing(self._connect()) as connection:
+            rows = connection.execute('select id, sender, recipients, message, attempts, next_try from mail '
+                                      'where next_try <= ? and attempts < ? order by next_try limit ?',
+                                      (now, self.MAX_ATTEMPTS, limit)).fetchall()
+            for id_, from_, to, contents, attempts, next_try in rows:
+                # another sender may have claimed it in the meantime
+                cursor = connection.execute('update mail set next_try = ? where id = ? and next_try = ?',
+                                            (now + self.LEASE, id_, next_try))
+                if cursor.rowcount == 1:
+                    claimed.append((id_, from_, json.loads(to), contents.encode('utf-8'), attempts))
+            connection.commit()
+        return claimed
+
+    def remove(self, id_):
+        """The message was sent, or will never be"""
+        with closing(self._connect()) as connection:
+            connection.execute('delete from mail where id = ?', (id_,))
+            connection.commit()
+
+    def retry(self, id_, attempts, error):
+        """Try again later, with an exponential backoff
+
+        Return:
+         - is the message abandoned, after ``MAX_ATTEMPTS`` attempts?
+        """
+        delay = min(self.RETRY_DELAY * 2 ** attempts, self.MAX_DELAY)
+        with closing(self._connect()) as connection:
+            connection.execute('update mail set attempts = ?, next_try = ?, last_error = ? where id = ?',
+                               (attempts + 1, time.time() + delay, repr(error), id_))
+            connection.commit()
+        return attempts + 1 >= self.MAX_ATTEMPTS
+
+    def dead_letters(self):
+        """The messages abandoned after ``MAX_ATTEMPTS`` attempts
+
+        Return:
+         - list of (id, sender, recipients, last error)
+        """
+        with closing(self._connect()) as connection:
+            rows = connection.execute('select id, sender, recipients, last_error from mail '
+                                      'where attempts >= ? order by id', (self.MAX_ATTEMPTS,)).fetchall()
+        return [(id_, from_, json.loads(to), error) for id_, from_, to, error in rows]
+
+    def purge(self):
+        """Delete the abandoned messages
+
+        Return:
+         - number of messages deleted
+        """
+        with closing(self._connect()) as connection:
+            cursor = connection.execute('delete from mail where attempts >= ?', (self.MAX_ATTEMPTS,))
+            connection.commit()
+        return cursor.rowcount
+
+    def __len__(self):
+        """Number of messages still to send"""
+        with closing(self._connect()) as connection:
+            return connection.execute('select count(*) from mail where attempts < ?',
+                                      (self.MAX_ATTEMPTS,)).fetchone()[0]
@@ -43,6 +43,19 @@ class DummySearchEngine(object):
         '''Update document'''
         pass
 
+    def add_documents(self, documents, bulk=False):
+        '''
+        Add many documents at once, see ``add_document``.
+        Engines should make it cheaper than adding the documents one by one.
+        With ``bulk``, for a rebuild of the whole index, engines may
+        trade durability for speed.
+        '''
+        pass
+
+    def update_documents(self, documents, bulk=False):
+        '''Update many documents at once, see ``add_documents``'''
+        pass
+
     def commit(self, sync=False):
         '''
         Validate add/upgrade/delete operations since last commit.
@@ -56,6 +69,12 @@ class DummySearchEngine(object):
         Forget documents added since last commit'''
         pass
 
+    def optimize(self):
+        '''
+        Compact the index, typically after a full reindexation.
+        '''
+        pass
+
     def search(self, query, size=20):
         '''
         Search the database.
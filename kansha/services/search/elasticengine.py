@@ -210,6 +210,9 @@ class ElasticSearchEngine(object):
     # make it compatible with services
     LOAD_PRIORITY = 30
 
+    # number of operations per bulk request
+    BULK_CHUNK_SIZE = 500
+
     def __init__(self, index, host=None, port=None):
         '''Only one host for now.'''
         if not es_installed:
@@ -267,12 +270,22 @@ class ElasticSearchEngine(object):
         '''Update document (partial update from delta document)'''
         self._index(document, True)
 
+    def add_documents(self, documents, bulk=False):
+        '''Add many documents at once, sent in chunks on commit'''
+        for document in documents:
+            self._index(document)
+
+    def update_documents(self, documents, bulk=False):
+        '''Update many documents at once, sent in chunks on commit'''
+        for document in documents:
+            self._index(document, True)
+
     def commit(self, sync=False):
         '''
         If ``sync``, index synchronously, else let Elasticsearch
         manage its index.
         '''
-        helpers.bulk(self.es, self._queue)
+        helpers.bulk(self.es, self._queue, chunk_size=self.BULK_CHUNK_SIZE)
         if sync:
             self.idx_manager.refresh(self.index)
         self._queue = []
@@ -282,6 +295,12 @@ class ElasticSearchEngine(object):
         Forget operation scheduled since last commit'''
         self._queue = []
 
+    def optimize(self):
+        '''
+        Merge the segments of the index, after a full reindexation.
+        '''
+        self.idx_manager.forcemerge(index=self.index, max_num_segments=1)
+
     def search(self, query, size=20):
         '''
         Search the database.
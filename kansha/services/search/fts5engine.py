@@ -0,0 +1,225 @@
+#-*- coding:utf-8 -*-
+#--
+# Copyright (c) 2012-2014 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+#--
+"""
+SQLite FTS5 based search engine plugin.
+Zero dependency, needs a sqlite3 library compiled with FTS5.
+
+Each schema is stored in two tables:
+  - ``<schema>_content``, a normal table holding every field once, keyed on the
+    document id. Indexed non full text fields (``board_id``, ``archived``...) get
+    a regular index there, so that filters on them are resolved by SQLite indexes;
+  - ``<schema>``, an external content FTS5 table that only indexes the full text
+    fields and stores nothing but the index itself. Triggers keep it in sync.
+
+For usage, look at the unit tests.
+"""
+
+import sqlite3
+
+from .sqliteengine import tokenize, FTSClause, SQLiteFTSQueryMapper, IndexCursor, SQLiteFTSEngine
+
+
+CONTENT = '%s_content'
+
+COLUMN_TYPES = {
+    'Int': 'integer',
+    'Boolean': 'integer',
+    'Float': 'real',
+    'Datetime': 'timestamp'
+}
+
+FULLTEXT_TYPES = ('Text', 'Keyword')
+
+
+class FTS5Clause(FTSClause):
+    """Compiled query, on the content table joined to the FTS5 table"""
+
+    subselect = 'c.rowid in (select rowid from %(table)s where %(table)s match ?)'
+
+
+class SQLiteFTS5QueryMapper(SQLiteFTSQueryMapper):
+    """Compile queries into FTS5Clause
+
+    Full text criteria go into the FTS5 MATCH expression, the other criteria
+    are filters on the content table, resolved by its indexes.
+    """
+
+    clause_class = FTS5Clause
+
+    @staticmethod
+    def _match_terms(value, column=None):
+        # quoted, so that tokens are never taken for operators (AND, OR, NOT...)
+        tokens = [u'"%s"' % token for token in tokenize(value)]
+        if tokens:
+            tokens[-1] += u'*'
+        prefix = column + u':' if column else u''
+        return [prefix + token for token in tokens]
+
+    @staticmethod
+    def _column(field):
+        return 'c.' + field.name
+
+    def eq(self, field, value):
+        return self._filter(field, '=', value)
+
+
+class SQLiteFTS5SchemaMapper(object):
+
+    # the prefix lengths that get their own index: short prefixes match many terms
+    PREFIXES = '2 3'
+
+    # number of segments of the same level merged together, see SQLite documentation
+    AUTOMERGE = 8
+
+    def __init__(self, db_cursor):
+        self.db_cursor = db_cursor
+        self.mappings = {}
+
+    # Schema API
+
+    def define(self, schema_name):
+        self.mappings[schema_name] = {
+            'columns': [],
+            'fulltext': [],
+            'indexes': []
+        }
+
+    def define_field(self, schema_name, field_type, name, indexed, stored):
+        # everything is stored once in the content table, ignoring stored.
+        mapping = self.mappings[schema_name]
+        mapping['columns'].append('%s %s' % (name, COLUMN_TYPES.get(field_type, 'text')))
+        if not indexed:
+            return
+        if field_type in FULLTEXT_TYPES:
+            mapping['fulltext'].append(name)
+        if field_type != 'Text':
+            mapping['indexes'].append(name)
+
+    # specific API
+
+    def create(self):
+        for schema_name, mapping in self.mappings.iteritems():
+            content = CONTENT % schema_name
+            # the triggers go with the content table
+            self.db_cursor.execute('drop table if exists %s' % schema_name)
+            self.db_cursor.execute('drop table if exists %s' % content)
+            self.db_cursor.execute(
+                'create table %s (rowid integer primary key, id unique not null, %s)' %
+                (content, ', '.join(mapping['columns']))
+            )
+            for name in mapping['indexes']:
+                self.db_cursor.execute('create index %s_%s on %s(%s)' % (content, name, content, name))
+
+            fields = mapping['fulltext']
+            if not fields:
+                continue
+            self.db_cursor.execute(
+                '''CREATE VIRTUAL TABLE %s USING fts5(%s, content=%s, content_rowid=rowid, prefix='%s');''' %
+                (schema_name, ', '.join(fields), content, self.PREFIXES)
+            )
+            self.db_cursor.execute('insert into %s(%s, rank) values (?, ?)' % (schema_name, schema_name),
+                                   ('automerge', self.AUTOMERGE))
+
+            values = dict(
+                table=schema_name, content=content, fields=', '.join(fields),
+                new=', '.join('new.' + name for name in fields),
+                old=', '.join('old.' + name for name in fields)
+            )
+            self.db_cursor.execute(
+                '''CREATE TRIGGER %(content)s_ai AFTER INSERT ON %(content)s BEGIN
+                     INSERT INTO %(table)s(rowid, %(fields)s) VALUES (new.rowid, %(new)s);
+                   END;''' % values
+            )
+            self.db_cursor.execute(
+                '''CREATE TRIGGER %(content)s_ad AFTER DELETE ON %(content)s BEGIN
+                     INSERT INTO %(table)s(%(table)s, rowid, %(fields)s) VALUES ('delete', old.rowid, %(old)s);
+                   END;''' % values
+            )
+            # only when the full text changes, not when a card is moved or archived
+            self.db_cursor.execute(
+                '''CREATE TRIGGER %(content)s_au AFTER UPDATE OF %(fields)s ON %(content)s BEGIN
+                     INSERT INTO %(table)s(%(table)s, rowid, %(fields)s) VALUES ('delete', old.rowid, %(old)s);
+                     INSERT INTO %(table)s(rowid, %(fields)s) VALUES (new.rowid, %(new)s);
+                   END;''' % values
+            )
+
+
+class FTS5IndexCursor(IndexCursor):
+
+    # Document API
+
+    def insert(self, schema_name, docid, **fields):
+        # integer ids are used as rowids, the documents are then keyed on them
+        rowid = docid if isinstance(docid, (int, long)) else None
+        # neither schema nor fields keys are user inputs, so this is safe
+        self.query = (
+            'insert into %s(rowid,id,%s) values (%s)' %
+            (
+                CONTENT % schema_name,
+                ','.join(fields.keys()),
+                ','.join(('?',) * (len(fields) + 2))
+            )
+        )
+        self.params = [rowid, docid] + [value for value in fields.itervalues()]
+
+    def update(self, schema_name, docid, **fields):
+        super(FTS5IndexCursor, self).update(CONTENT % schema_name, docid, **fields)
+
+    # Query API
+
+    def search(self, schema_name, fields_to_load, mapped_query, limit):
+        """
+        ``fields_to_load`` is  a list of field names.
+        ``mapped_query`` is a FTS5Clause.
+        """
+        filters = list(mapped_query.filters)
+        params = list(mapped_query.params)
+        columns = ['c.id as docid'] + ['c.' + name for name in fields_to_load]
+        tables = '%s c' % (CONTENT % schema_name)
+        order = ''
+        if mapped_query.terms:
+            tables = '%s join %s on c.rowid = %s.rowid' % (schema_name, tables, schema_name)
+            filters.insert(0, '%s match ?' % schema_name)
+            params.insert(0, mapped_query.match)
+            # FTS5 bm25 is negative, the lower the better
+            columns.append('-%s.rank as _score' % schema_name)
+            order = ' order by %s.rank' % schema_name
+        self.query = 'select %s from %s where %s%s limit %s' % (
+            ', '.join(columns), tables, ' and '.join(filters) or '1', order, limit
+        )
+        self.params = params
+
+
+class SQLiteFTS5Engine(SQLiteFTSEngine):
+
+    '''
+    SQLite FTS5 search engine: a smaller index and faster prefix
+    queries than the FTS4 engine, for large instances.
+    '''
+
+    extension = '.fts5'
+    cursor_class = FTS5IndexCursor
+    query_mapper_class = SQLiteFTS5QueryMapper
+    schema_mapper_class = SQLiteFTS5SchemaMapper
+
+    def __init__(self, index, index_folder):
+        super(SQLiteFTS5Engine, self).__init__(index, index_folder)
+        try:
+            self.connection.execute('create virtual table temp.fts5_check using fts5(content)')
+            self.connection.execute('drop table temp.fts5_check')
+        except sqlite3.OperationalError:
+            raise ImportError('Your sqlite3 library has no FTS5 support, please use the sqlite engine instead.')
+
+    def delete_document(self, schema, docid):
+        '''
+        Remove document from index and storage.
+        '''
+        c = self._get_cursor()
+        c.execute('delete from %s where id=?' % (CONTENT % schema.type_name), (docid,))
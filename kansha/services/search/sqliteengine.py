@@ -13,61 +13,145 @@ Zero dependency.
 For usage, look at the unit tests.
 """
 
+import re
+import math
+import struct
 import sqlite3
 import os.path
-import re
+from collections import OrderedDict
 
 unialpha = re.compile('[\W_]+', re.UNICODE)
 
 
+def tokenize(value):
+    # sqlite does not analyse, do it ourselves
+    return unialpha.sub(u' ', value).split()
+
+
+def bm25(raw_matchinfo, k1=1.2, b=0.75):
+    """Okapi BM25 score of a row, from its FTS4 ``matchinfo(table, 'pcnalx')``"""
+    info = struct.unpack('@%dI' % (len(raw_matchinfo) // 4), str(raw_matchinfo))
+    nb_phrases, nb_columns, nb_rows = info[:3]
+    avg_lengths = info[3:3 + nb_columns]
+    lengths = info[3 + nb_columns:3 + 2 * nb_columns]
+    hits = info[3 + 2 * nb_columns:]
+    score = 0.0
+    for phrase in xrange(nb_phrases):
+        for column in xrange(nb_columns):
+            index = 3 * (phrase * nb_columns + column)
+            term_freq, rows_with_hits = hits[index], hits[index + 2]
+            if not term_freq:
+                continue
+            idf = max(math.log((nb_rows - rows_with_hits + 0.5) / (rows_with_hits + 0.5)), 1e-6)
+            length_ratio = float(lengths[column]) / avg_lengths[column] if avg_lengths[column] else 0.
+            score += idf * term_freq * (k1 + 1) / (term_freq + k1 * (1 - b + b * length_ratio))
+    return score
+
+
+class FTSClause(object):
+    """Compiled query: the terms of one FTS MATCH expression and residual SQL filters, all ANDed"""
+
+    # the rows matching the terms, as a filter on the searched rows
+    subselect = 'rowid in (select rowid from %(table)s where %(table)s match ?)'
+
+    def __init__(self, table, terms=(), filters=(), params=()):
+        self.table = table
+        self.terms = list(terms)
+        self.filters = list(filters)
+        self.params = list(params)
+
+    def __and__(self, other):
+        return self.__class__(self.table, self.terms + other.terms,
+                         self.filters + other.filters, self.params + other.params)
+
+    def __or__(self, other):
+        # a MATCH expression can't be reliably ORed with anything: the standard query
+        # syntax gives OR precedence over the implicit AND. Use sub-selects instead.
+        left, left_params = self.to_filter()
+        right, right_params = other.to_filter()
+        return self.__class__(self.table, filters=['(%s or %s)' % (left, right)],
+                              params=left_params + right_params)
+
+    @property
+    def match(self):
+        return u' '.join(self.terms)
+
+    def to_filter(self):
+        """The whole clause as a plain SQL filter"""
+        filters = list(self.filters)
+        params = list(self.params)
+        if self.terms:
+            filters.insert(0, self.subselect % {'table': self.table})
+            params.insert(0, self.match)
+        return ('(%s)' % ' and '.join(filters) if filters else '1', params)
+
+
 class SQLiteFTSQueryMapper(object):
+    """Compile queries into FTSClause
+
+    Full text criteria and equality on indexed integers (``board_id``, ``archived``...)
+    go into the FTS MATCH expression, so that they are resolved by the index.
+    """
+
+    clause_class = FTSClause
+
+    @staticmethod
+    def _match_terms(value, column=None):
+        tokens = tokenize(value)
+        if tokens:
+            tokens[-1] += u'*'
+        prefix = column + u':' if column else u''
+        return [prefix + token for token in tokens]
+
+    @staticmethod
+    def _column(field):
+        return field.name
+
+    def _filter(self, field, op, value):
+        return self.clause_class(field.schema.type_name, filters=['%s %s ?' % (self._column(field), op)],
+                                 params=[value])
 
     def match(self, field, value):
-        query = '%s match ?' % field.name
-        # sqlite does not analyse, do it ourselves
-        return (query, (unialpha.sub(u' ', value) + u'*',))
+        terms = self._match_terms(value, field.name)
+        if not terms:
+            return self.clause_class(field.schema.type_name, filters=['0'])
+        return self.clause_class(field.schema.type_name, terms=terms)
 
     def matchany(self, schema, value):
-        query = '%s match ?' % schema.type_name
-        return (query, (unialpha.sub(u' ', value) + u'*',))
+        terms = self._match_terms(value)
+        if not terms:
+            return self.clause_class(schema.type_name, filters=['0'])
+        return self.clause_class(schema.type_name, terms=terms)
 
     def eq(self, field, value):
-        query = '%s = ?' % field.name
-        return (query, (value,))
+        if field.indexed and isinstance(value, (int, long, bool)) and value >= 0:
+            # a single token, exactly
+            return self.clause_class(field.schema.type_name, terms=[u'%s:%d' % (field.name, value)])
+        return self._filter(field, '=', value)
 
     def gt(self, field, value):
-        query = '%s > ?' % field.name
-        return (query, (value,))
+        return self._filter(field, '>', value)
 
     def gte(self, field, value):
-        query = '%s >= ?' % field.name
-        return (query, (value,))
+        return self._filter(field, '>=', value)
 
     def lt(self, field, value):
-        query = '%s < ?' % field.name
-        return (query, (value,))
+        return self._filter(field, '<', value)
 
     def lte(self, field, value):
-        query = '%s <= ?' % field.name
-        return (query, (value,))
+        return self._filter(field, '<=', value)
 
     def in_(self, field, value):
-        query = '%s in (%s)' % (field.name,
-                                ','.join(('?',) * len(value)))
-        return (query, value)
-
-# FTS does not behave like normal SQL for match operations.
-# TODO: rewrite accordingly
+        value = list(value)
+        return self.clause_class(field.schema.type_name,
+                                 filters=['%s in (%s)' % (self._column(field), ','.join(('?',) * len(value)))],
+                                 params=value)
 
     def and_(self, exp1, exp2):
-        query = '(%s and %s)' % (exp1[0], exp2[0])
-        params = exp1[1] + exp2[1]
-        return (query, params)
+        return exp1 & exp2
 
     def or_(self, exp1, exp2):
-        query = '(%s or %s)' % (exp1[0], exp2[0])
-        params = exp1[1] + exp2[1]
-        return (query, params)
+        return exp1 | exp2
 
 
 class SQLiteFTSSchemaMapper(object):
@@ -151,20 +235,31 @@ class IndexCursor(object):
     def search(self, schema_name, fields_to_load, mapped_query, limit):
         """
         ``fields_to_load`` is  a list of field names.
+        ``mapped_query`` is a FTSClause.
         """
-        where, params = mapped_query
-        self.query = 'select id as docid, %s from %s where %s limit %s' % (
-            ', '.join(field for field in fields_to_load),
-            schema_name, where, limit
+        filters = list(mapped_query.filters)
+        params = list(mapped_query.params)
+        columns = ['id as docid'] + list(fields_to_load)
+        order = ''
+        if mapped_query.terms:
+            filters.insert(0, '%s match ?' % schema_name)
+            params.insert(0, mapped_query.match)
+            columns.append("bm25(matchinfo(%s, 'pcnalx')) as _score" % schema_name)
+            order = ' order by _score desc'
+        self.query = 'select %s from %s where %s%s limit %s' % (
+            ', '.join(columns), schema_name, ' and '.join(filters) or '1', order, limit
         )
         self.params = params
 
     def get_results(self, result_factory):
         self.execute()
         fields = [d[0].lower() for d in self.db_cursor.description]
-        # no score function in sqlite, so every result is given weight 1
-        scored_results = [(1, result_factory(**dict(zip(fields, row))))
-             for row in self.db_cursor.fetchall()]
+        scored_results = []
+        for row in self.db_cursor.fetchall():
+            values = dict(zip(fields, row))
+            # without full text criterion, every result is given weight 1
+            score = values.pop('_score', 1)
+            scored_results.append((score, result_factory(**values)))
         return scored_results
 
     # Specific API
@@ -183,6 +278,18 @@ class SQLiteFTSEngine(object):
     # make it compatible with services
     LOAD_PRIORITY = 30
 
+    BULK_PRAGMAS = (
+        'PRAGMA journal_mode = MEMORY',
+        'PRAGMA synchronous = OFF',
+        'PRAGMA cache_size = -65536'  # 64MB
+    )
+
+    # implementation of the index, overridden by variants
+    extension = '.fts'
+    cursor_class = IndexCursor
+    query_mapper_class = SQLiteFTSQueryMapper
+    schema_mapper_class = SQLiteFTSSchemaMapper
+
     def __init__(self, index, index_folder):
         assert(index.isalnum())
         self.init_state(index, index_folder)
@@ -191,9 +298,11 @@ class SQLiteFTSEngine(object):
         self.collection = collection
         self.index_folder = index_folder
         self.connection = sqlite3.connect(
-            os.path.join(index_folder, collection + '.fts'))
+            os.path.join(index_folder, collection + self.extension))
+        self.connection.create_function('bm25', 1, bm25)
         self._cursor = None
-        self.mapper = SQLiteFTSQueryMapper()
+        self._bulk = False
+        self.mapper = self.query_mapper_class()
 
     # be persistence friendly
     def __getstate__(self):
@@ -212,7 +321,7 @@ class SQLiteFTSEngine(object):
             self.connection.close()
             self.connection = None
             self._cursor = None
-        db = os.path.join(self.index_folder, self.collection + '.fts')
+        db = os.path.join(self.index_folder, self.collection + self.extension)
         os.unlink(db)
 
     def add_document(self, document):
@@ -221,7 +330,7 @@ class SQLiteFTSEngine(object):
         `collection`, under the document type (a.k.a. schema) `schema`.
 
         '''
-        index_cursor = IndexCursor(self._get_cursor())
+        index_cursor = self.cursor_class(self._get_cursor())
         document.save(index_cursor)
         index_cursor.execute()
 
@@ -234,10 +343,48 @@ class SQLiteFTSEngine(object):
 
     def update_document(self, document):
         '''Update document'''
-        index_cursor = IndexCursor(self._get_cursor())
+        index_cursor = self.cursor_class(self._get_cursor())
         document.save(index_cursor, update=True)
         index_cursor.execute()
 
+    def _save_documents(self, documents, update=False, bulk=False):
+        # one executemany per distinct statement, in a single transaction
+        statements = OrderedDict()
+        for document in documents:
+            index_cursor = self.cursor_class(None)
+            document.save(index_cursor, update)
+            statements.setdefault(index_cursor.query, []).append(index_cursor.params)
+        if not statements:
+            return
+        if bulk and not self._bulk:
+            self._set_bulk_pragmas()
+        c = self._get_cursor()
+        for query, params in statements.iteritems():
+            c.executemany(query, params)
+
+    def _set_bulk_pragmas(self):
+        '''Tune the connection for bulk loads.
+
+        Only for a rebuild of the whole index, in its own process: the index
+        can always be rebuilt, so durability is traded for speed until the
+        connection is closed. Must happen outside of a transaction.
+        '''
+        if self._cursor is not None:
+            # operations in progress, don't commit them behind the caller's back
+            return
+        c = self._get_cursor()
+        for pragma in self.BULK_PRAGMAS:
+            c.execute(pragma)
+        self._bulk = True
+
+    def add_documents(self, documents, bulk=False):
+        '''Add many documents at once'''
+        self._save_documents(documents, bulk=bulk)
+
+    def update_documents(self, documents, bulk=False):
+        '''Update many documents at once'''
+        self._save_documents(documents, update=True, bulk=bulk)
+
     def commit(self, sync=False):
         '''``sync`` option is ignored by this engine'''
         if not self._cursor:
@@ -254,11 +401,24 @@ class SQLiteFTSEngine(object):
             self._cursor.close()
             self._cursor = None
 
+    def optimize(self):
+        '''
+        Merge the segments of the full text indexes into one,
+        for faster queries. Worth it after a full reindexation.
+        '''
+        self.commit()
+        c = self._get_cursor()
+        c.execute("select name from sqlite_master where type='table' "
+                  "and sql like 'CREATE VIRTUAL TABLE % USING fts%'")
+        for (table,) in c.fetchall():
+            c.execute('insert into %s(%s) values (?)' % (table, table), ('optimize',))
+        self.commit()
+
     def search(self, query, size=20):
         '''
         Search the database.
         '''
-        index_cursor = IndexCursor(self._get_cursor())
+        index_cursor = self.cursor_class(self._get_cursor())
         return query.search(index_cursor, self.mapper, size)
 
     def delete_collection(self):
@@ -271,7 +431,7 @@ class SQLiteFTSEngine(object):
         `schemas` is a list of Document classes or Schema instances.
         '''
         c = self._get_cursor()
-        mapper = SQLiteFTSSchemaMapper(c)
+        mapper = self.schema_mapper_class(c)
         for schema in schemas:
             schema.map(mapper)
         mapper.create()
@@ -8,9 +8,17 @@
 # this distribution.
 #--
 
-import json
 import os
+import json
+import math
 import uuid
+import Queue
+import fcntl
+import shutil
+import hashlib
+import threading
+import pkg_resources
+from contextlib import contextmanager
 
 from PIL import Image
 from PIL import ImageOps
@@ -20,13 +28,92 @@ from nagare import log
 from ..assetsmanager import AssetsManager
 
 
+# generation of the derived images, by a pool of threads per process
+_jobs = Queue.Queue()
+# keys of the jobs queued or running
+_pending = set()
+_pending_lock = threading.Lock()
+_threads = []
+
+
+def _work():
+    while True:
+        key, func, args = _jobs.get()
+        try:
+            func(*args)
+        except Exception:
+            log.error('Could not generate %r', key, exc_info=True)
+        finally:
+            with _pending_lock:
+                _pending.discard(key)
+            _jobs.task_done()
+
+
 class SimpleAssetsManager(AssetsManager):
+    """Assets stored on disk, by content
+
+    The bytes of identical files are stored once, in the ``blobs`` folder,
+    with their thumbnail and medium sizes. Each file id is a reference to a
+    blob, with its own metadata and cover:
+
+      - ``<file_id>.metadata`` -- metadata of the file
+      - ``<file_id>.ref`` -- the blob of the file and the name of its thumbnail
+      - ``<file_id>.cover`` -- cover of the file
+      - ``blobs/<xx>/<hash>`` -- the bytes, ``<hash>.medium`` and ``<hash>.thumb``
+        the derived images
+      - ``blobs/<xx>/<hash>.refs`` -- the file ids referencing the blob
 
-    def __init__(self, config_filename,  error, basedir, baseurl, max_size):
+    The files stored before are still served, until ``migrate`` is called.
+
+    The derived images are generated out of the requests, by ``workers``
+    threads, a placeholder being served in the meantime.
+    """
+    CONFIG_SPEC = dict(AssetsManager.CONFIG_SPEC, workers='integer(default=2)')
+
+    def __init__(self, config_filename,  error, basedir, baseurl, max_size, workers=2):
         super(SimpleAssetsManager, self).__init__(config_filename, error)
         self.basedir = basedir
         self.baseurl = baseurl
         self.max_size = max_size
+        self.workers = workers
+
+    def _submit(self, key, func, *args):
+        """Run a job in the background, if not already queued
+
+        In:
+            - ``key`` -- identifier of the job
+            - ``func`` -- the job
+            - ``args`` -- its arguments
+        """
+        if not self.workers:
+            func(*args)
+            return
+        with _pending_lock:
+            if key in _pending:
+                return
+            _pending.add(key)
+            while len(_threads) < self.workers:
+                thread = threading.Thread(target=_work, name='kansha-assets-%d' % len(_threads))
+                thread.daemon = True
+                _threads.append(thread)
+                thread.start()
+        _jobs.put((key, func, args))
+
+    def get_placeholder(self, file_id, size):
+        """Return the image served while a derived image is generated
+
+        In:
+            - ``file_id`` -- file identifier
+            - ``size`` -- the missing size
+        Return:
+            - (filename, content type) or None
+        """
+        if size not in ('thumb', 'medium', 'cover'):
+            return None
+        if not self.get_metadata(file_id).get('content-type', '').startswith('image/'):
+            return None
+        package = pkg_resources.Requirement.parse('kansha')
+        return pkg_resources.resource_filename(package, 'static/img/ajax-loader.gif'), 'image/gif'
 
     def copy_cover(self, file_id, new_file_id):
         try:
@@ -37,48 +124,207 @@ class SimpleAssetsManager(AssetsManager):
             # Cover not existing
             pass
 
+    def copy(self, file_id, new_file_id=None):
+        """Reference the blob of a file from a new file id, without copying it
+
+        In:
+            - ``file_id`` -- file id of the source file
+            - ``new_file_id`` -- file id of the copy, if None create a random id
+        Return:
+            - copied file id
+        """
+        ref = self._get_ref(file_id)
+        if ref is None:
+            # not migrated yet
+            data, metadata = self.load(file_id)
+            new_file_id = self.save(data, new_file_id, metadata)
+        else:
+            if new_file_id is None:
+                new_file_id = unicode(uuid.uuid4())
+            self._add_reference(ref['blob'], new_file_id)
+            self._write_json(self._get_ref_filename(new_file_id), ref)
+            self._write_json(self._get_metadata_filename(new_file_id), self.get_metadata(file_id))
+        self.copy_cover(file_id, new_file_id)
+        return new_file_id
+
     def _get_filename(self, file_id, size=None):
-        filename = os.path.join(self.basedir, file_id)
+        # the covers are not shared
+        ref = self._get_ref(file_id) if size in (None, 'large', 'medium', 'thumb') else None
+        if ref is None:
+            filename = os.path.join(self.basedir, file_id)
+            if size and size != 'large':
+                filename += '.' + size
+            return filename
+        if size == 'thumb':
+            size = ref['thumb']
+        return self._get_blob_filename(ref['blob'], size)
+
+    def _get_metadata_filename(self, file_id):
+        return os.path.join(self.basedir, '%s.metadata' % file_id)
+
+    def _get_ref_filename(self, file_id):
+        return os.path.join(self.basedir, '%s.ref' % file_id)
+
+    def _get_blob_filename(self, blob, size=None):
+        filename = os.path.join(self.basedir, 'blobs', blob[:2], blob)
         if size and size != 'large':
             filename += '.' + size
         return filename
 
-    def _get_metadata_filename(self, file_id):
-        return os.path.join(self.basedir, '%s.metadata' % file_id)
+    def _get_ref(self, file_id):
+        """Return the reference of a file, or None if the file is stored as before"""
+        try:
+            with open(self._get_ref_filename(file_id), "r") as f:
+                return json.loads(f.read())
+        except IOError:
+            return None
 
-    def save(self, data, file_id=None, metadata={}, THUMB_SIZE=()):
-        if file_id is None:
-            file_id = unicode(uuid.uuid4())
-        with open(self._get_filename(file_id), "w") as f:
-            f.write(data)
-        # Store metadata
-        with open(self._get_metadata_filename(file_id), "w") as f:
-            f.write(json.dumps(metadata))
+    @staticmethod
+    def _write_json(filename, data):
+        # atomic, for the concurrent readers
+        with open(filename + '.tmp', "w") as f:
+            f.write(json.dumps(data))
+        os.rename(filename + '.tmp', filename)
 
-        img = None
+    @contextmanager
+    def _lock(self):
+        """Serialize the updates of the references, between threads and processes"""
+        blobs = os.path.join(self.basedir, 'blobs')
+        if not os.path.isdir(blobs):
+            os.makedirs(blobs)
+        with open(os.path.join(blobs, '.lock'), "w") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _get_references(self, blob):
         try:
-            img = Image.open(self._get_filename(file_id))
+            with open(self._get_blob_filename(blob, 'refs'), "r") as f:
+                return json.loads(f.read())
+        except IOError:
+            return []
+
+    def _add_reference(self, blob, file_id, data=None):
+        """Reference a blob, storing its bytes if it's a new one
+
+        In:
+            - ``blob`` -- hash of the bytes
+            - ``file_id`` -- the referencing file id
+            - ``data`` -- the bytes
+        """
+        with self._lock():
+            refs = self._get_references(blob)
+            if data is not None and not os.path.exists(self._get_blob_filename(blob)):
+                folder = os.path.dirname(self._get_blob_filename(blob))
+                if not os.path.isdir(folder):
+                    os.makedirs(folder)
+                with open(self._get_blob_filename(blob, 'tmp'), "w") as f:
+                    f.write(data)
+                os.rename(self._get_blob_filename(blob, 'tmp'), self._get_blob_filename(blob))
+            if file_id not in refs:
+                refs.append(file_id)
+            self._write_json(self._get_blob_filename(blob, 'refs'), refs)
+
+    def _remove_reference(self, blob, file_id):
+        """Remove the blob with its derived images when its last reference goes"""
+        with self._lock():
+            refs = [ref for ref in self._get_references(blob) if ref != file_id]
+            if refs:
+                self._write_json(self._get_blob_filename(blob, 'refs'), refs)
+                return
+            folder = os.path.dirname(self._get_blob_filename(blob))
+            for filename in os.listdir(folder):
+                if filename.split('.')[0] == blob:
+                    os.remove(os.path.join(folder, filename))
+
+    @staticmethod
+    def _open(filename, size=None):
+        """Open an image, to be reduced to at least ``size``
+
+        A JPEG image is then decoded at 1/2, 1/4 or 1/8 of its resolution,
+        the smallest one still larger than ``size``.
+
+        In:
+            - ``filename`` -- the image file
+            - ``size`` -- (width, height) needed after the reduction
+        Return:
+            - the image and its original size
+        """
+        img = Image.open(filename)
+        orig_size = img.size
+        if size:
+            img.draft(img.mode, (int(math.ceil(size[0])), int(math.ceil(size[1]))))
+        return img, orig_size
+
+    def _create_derived(self, blob, thumb, THUMB_SIZE=()):
+        """Create the medium and thumbnail images, if not already there"""
+        filename = self._get_blob_filename(blob)
+        medium_filename = self._get_blob_filename(blob, 'medium')
+        thumb_filename = self._get_blob_filename(blob, thumb)
+        if os.path.exists(medium_filename) and os.path.exists(thumb_filename):
+            return
+
+        try:
+            orig_width, orig_height = Image.open(filename).size
         except IOError:
             log.info('Not an image file, skipping medium & thumbnail generation')
-        else:
-            # Store thumbnail & medium
+            return
+
+        if not os.path.exists(medium_filename):
+            medium_size = self.MEDIUM_WIDTH, int(float(self.MEDIUM_WIDTH) * orig_height / orig_width)
+            medium, __ = self._open(filename, medium_size)
             kw = {}
-            if 'transparency' in img.info:
-                kw['transparency'] = img.info["transparency"]
+            if 'transparency' in medium.info:
+                kw['transparency'] = medium.info["transparency"]
+            img_format = medium.format
+            medium.thumbnail(medium_size, Image.ANTIALIAS)
+            medium.save(medium_filename + '.tmp', img_format, quality=75, **kw)  # 'JPEG')
+            os.rename(medium_filename + '.tmp', medium_filename)
 
-            orig_width, orig_height = img.size
+        if not os.path.exists(thumb_filename):
+            thumb_size = THUMB_SIZE if THUMB_SIZE else self.THUMB_SIZE
+            # the thumbnail is cropped to fill its size
+            ratio = max(float(thumb_size[0]) / orig_width, float(thumb_size[1]) / orig_height)
+            thumb_img, __ = self._open(filename, (orig_width * ratio, orig_height * ratio))
+            kw = {}
+            if 'transparency' in thumb_img.info:
+                kw['transparency'] = thumb_img.info["transparency"]
+            img_format = thumb_img.format
+            thumb_img = ImageOps.fit(thumb_img, thumb_size, Image.ANTIALIAS)
+            thumb_img.save(thumb_filename + '.tmp', img_format, quality=75, **kw)  # 'JPEG')
+            os.rename(thumb_filename + '.tmp', thumb_filename)
 
-            medium_size = self.MEDIUM_WIDTH, int(float(self.MEDIUM_WIDTH) * orig_height / orig_width)
-            medium = img.copy()
+    def save(self, data, file_id=None, metadata={}, THUMB_SIZE=()):
+        if file_id is None:
+            file_id = unicode(uuid.uuid4())
+        else:
+            # replace the previous version
+            self.delete(file_id)
+        blob = hashlib.sha1(data).hexdigest()
+        # the thumbnails of other sizes are stored side by side
+        thumb = 'thumb-%dx%d' % tuple(THUMB_SIZE) if THUMB_SIZE and tuple(THUMB_SIZE) != self.THUMB_SIZE else 'thumb'
 
-            medium.thumbnail(medium_size, Image.ANTIALIAS)
-            medium.save(self._get_filename(file_id, 'medium'), img.format, quality=75, **kw)  # 'JPEG')
+        self._add_reference(blob, file_id, data)
+        self._write_json(self._get_ref_filename(file_id), {'blob': blob, 'thumb': thumb})
+        # Store metadata
+        with open(self._get_metadata_filename(file_id), "w") as f:
+            f.write(json.dumps(metadata))
 
-            thumb = ImageOps.fit(img, THUMB_SIZE if THUMB_SIZE else self.THUMB_SIZE, Image.ANTIALIAS)
-            thumb.save(self._get_filename(file_id, 'thumb'), img.format, quality=75, **kw)  # 'JPEG')
+        self._submit(('derived', self.basedir, blob, thumb), self._create_derived, blob, thumb, THUMB_SIZE)
         return file_id
 
+    def _release(self, file_id):
+        """Remove the reference of a file to its blob"""
+        ref = self._get_ref(file_id)
+        if ref is not None:
+            os.remove(self._get_ref_filename(file_id))
+            self._remove_reference(ref['blob'], file_id)
+
     def delete(self, file_id):
+        self._release(file_id)
+        # the per file id files, and the files stored before
         files = [self._get_filename(file_id),
                  self._get_filename(file_id, 'thumb'),
                  self._get_filename(file_id, 'medium'),
@@ -91,6 +337,50 @@ class SimpleAssetsManager(AssetsManager):
             except OSError:  # File does not exist
                 pass
 
+    def migrate(self, file_id):
+        """Move a file stored before into the blobs
+
+        In:
+            - ``file_id`` -- file identifier
+        Return:
+            - True if the content was already stored
+        """
+        filename = self._get_filename(file_id)
+        with open(filename, "r") as f:
+            data = f.read()
+        blob = hashlib.sha1(data).hexdigest()
+        shared = os.path.exists(self._get_blob_filename(blob))
+        self._add_reference(blob, file_id, data)
+
+        thumb = 'thumb'
+        thumb_filename = self._get_filename(file_id, 'thumb')
+        if os.path.exists(thumb_filename):
+            size = Image.open(thumb_filename).size
+            if size != self.THUMB_SIZE:
+                thumb = 'thumb-%dx%d' % size
+        for size, blob_size in (('medium', 'medium'), ('thumb', thumb)):
+            derived = self._get_filename(file_id, size)
+            if os.path.exists(derived):
+                if not os.path.exists(self._get_blob_filename(blob, blob_size)):
+                    shutil.move(derived, self._get_blob_filename(blob, blob_size))
+                else:
+                    os.remove(derived)
+        self._write_json(self._get_ref_filename(file_id), {'blob': blob, 'thumb': thumb})
+        os.remove(filename)
+        return shared
+
+    def migrate_all(self):
+        """Move all the files stored before into the blobs
+
+        Return:
+            - iterator on (file id, True if the content was already stored)
+        """
+        for filename in sorted(os.listdir(self.basedir)):
+            if filename.endswith('.metadata'):
+                file_id = filename[:-len('.metadata')]
+                if self._get_ref(file_id) is None and os.path.exists(self._get_filename(file_id)):
+                    yield file_id, self.migrate(file_id)
+
     def load(self, file_id, size=None):
         filename = self._get_filename(file_id, size)
         with open(filename, "r") as f:
@@ -98,8 +388,7 @@ class SimpleAssetsManager(AssetsManager):
         return data, self.get_metadata(file_id)
 
     def update_metadata(self, file_id, metadata):
-        with open(self._get_metadata_filename(file_id), "w") as f:
-            metadata = f.write(json.dumps(metadata))
+        self._write_json(self._get_metadata_filename(file_id), metadata)
 
     def get_metadata(self, file_id):
         with open(self._get_metadata_filename(file_id), "r") as f:
@@ -139,7 +428,7 @@ class SimpleAssetsManager(AssetsManager):
         return '/'.join(url)
 
     def create_cover(self, file_id, left, top, width, height):
-        """Create the cover version for a file
+        """Create the cover version for a file, in the background
 
         In :
           - ``file_id`` -- The asset to make as cover
@@ -148,22 +437,40 @@ class SimpleAssetsManager(AssetsManager):
           - ``width`` -- Crop width
           - ``height`` -- Crop height
         """
+        try:
+            # the placeholder is served until the new cover is ready
+            os.remove(self._get_filename(file_id, 'cover'))
+        except OSError:
+            pass
+        self._submit(('cover', self.basedir, file_id, left, top, width, height),
+                     self._create_cover, file_id, left, top, width, height)
 
+    def _create_cover(self, file_id, left, top, width, height):
         # The crop dimensions are given for the medium version.
         # Calculate them for the large version
+        large_w, large_h = Image.open(self._get_filename(file_id)).size
+        if os.path.exists(self._get_filename(file_id, 'medium')):
+            medium_w, medium_h = Image.open(self._get_filename(file_id, 'medium')).size
+        else:
+            # still being generated
+            medium_w = min(self.MEDIUM_WIDTH, large_w)
+            medium_h = int(float(medium_w) * large_h / large_w)
+        left, width = float(left) * large_w / medium_w, float(width) * large_w / medium_w
+        top, height = float(top) * large_h / medium_h, float(height) * large_h / medium_h
 
-        medium_img = Image.open(self._get_filename(file_id, 'medium'))
-        medium_w, medium_h = medium_img.size
-
-        large_img = Image.open(self._get_filename(file_id))
-        large_w, large_h = large_img.size
+        # no need to decode more than the cover size
+        ratio = min(float(self.COVER_SIZE[0]) / width, float(self.COVER_SIZE[1]) / height, 1)
+        large_img, __ = self._open(self._get_filename(file_id), (large_w * ratio, large_h * ratio))
         kw = {}
         if 'transparency' in large_img.info:
             kw['transparency'] = large_img.info["transparency"]
-
-        left, width = int(float(left) * large_w / medium_w), int(float(width) * large_w / medium_w)
-        top, height = int(float(top) * large_h / medium_h), int(float(height) * large_h / medium_h)
+        img_format = large_img.format
+        # the decoded image may be smaller
+        scale = float(large_img.size[0]) / large_w
+        left, top, width, height = [int(x * scale) for x in (left, top, width, height)]
 
         n_img = large_img.crop((left, top, left + width, top + height))
         n_img.thumbnail(self.COVER_SIZE, Image.ANTIALIAS)
-        n_img.save(self._get_filename(file_id, 'cover'), large_img.format, quality=75, **kw)
+        cover_filename = self._get_filename(file_id, 'cover')
+        n_img.save(cover_filename + '.tmp', img_format, quality=75, **kw)
+        os.rename(cover_filename + '.tmp', cover_filename)
@@ -15,9 +15,9 @@ import string
 
 from elixir import Unicode, Integer, Field, DateTime
 from elixir import ManyToOne, ManyToMany, OneToOne, OneToMany
-from elixir import using_options
+from elixir import using_options, using_table_options
 
-from sqlalchemy import and_, func
+from sqlalchemy import Index, and_, func
 from sqlalchemy.orm import aliased
 from sqlalchemy.dialects.mysql import VARCHAR
 from sqlalchemy.ext.associationproxy import AssociationProxy
@@ -54,14 +54,18 @@ class DataToken(Entity):
 
 class DataBoardMember(Entity):
     using_options(tablename='user_boards__board_members')
+    using_table_options(Index('ix_board_members_user', 'user_username', 'user_source'))
     board = ManyToOne('DataBoard', primary_key=True, ondelete='CASCADE')
     member = ManyToOne('DataUser', primary_key=True, ondelete='CASCADE', colname=[
                        'user_username', 'user_source'])
     notify = Field(Integer, default=lambda: 1)
+    # id of the last history event processed by the notifications batch
+    last_notified_event = Field(Integer, nullable=True)
 
 
 class DataBoardManager(Entity):
     using_options(tablename='user_managed_boards__board_managers')
+    using_table_options(Index('ix_board_managers_user', 'user_username', 'user_source'))
     board = ManyToOne('DataBoard', primary_key=True, ondelete='CASCADE')
     member = ManyToOne('DataUser', primary_key=True, ondelete='CASCADE', colname=[
                        'user_username', 'user_source'])
@@ -8,9 +8,39 @@
 # this distribution.
 #--
 
-from kansha import duration
+from kansha import duration, push
 
 
-def create_pipe(app, *args, **kw):
-    app = duration.DurationWSGIMiddleware(app)
+TRUE = (True, 'on', 'true', 'yes', '1')
+
+
+def create_pipe(app, options=None, config_filename=None, config=None, *args, **kw):
+    """Wrap the application into the WSGI middlewares
+
+    The ``[duration]`` section of the application configuration sets the
+    thresholds of the request logging. Response headers are only sent in debug mode.
+    The ``[push]`` section activates the push of the board changes.
+    """
+    config = config or {}
+    conf = config.get('duration', {})
+    debug = config.get('application', {}).get('debug') in TRUE
+    app = duration.DurationWSGIMiddleware(
+        app,
+        slow_request=float(conf.get('slow_request', 1.0)),
+        max_queries=int(conf.get('max_queries', 200)),
+        slow_query=float(conf.get('slow_query', 0.1)),
+        nb_slowest=int(conf.get('nb_slowest', 5)),
+        headers=debug and conf.get('headers', 'off') in TRUE
+    )
+    conf = config.get('push', {})
+    if conf.get('activated', 'off') in TRUE:
+        url = conf.get('url', '/push')
+        push.configure(url, conf.get('fanout') or None, float(conf.get('interval', 0.5)))
+        # outside of the request monitoring, the subscriptions are long by design
+        app = push.PushWSGIMiddleware(
+            app,
+            url=url,
+            timeout=float(conf.get('timeout', 30)),
+            keepalive=float(conf.get('keepalive', 15))
+        )
     return app
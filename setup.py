@@ -70,13 +70,20 @@ setup(
       alembic-revision = kansha.alembic.admin:AlembicRevisionCommand
       alembic-stamp = kansha.alembic.admin:AlembicStampCommand
       alembic-upgrade = kansha.alembic.admin:AlembicUpgradeCommand
+      benchmark = kansha.batch.benchmark:BenchmarkCommand
       create-index = kansha.batch.create_index:ReIndex
+      migrate-assets = kansha.batch.migrate_assets:MigrateAssets
+      prune-history = kansha.batch.prune_history:PruneHistory
       save-config = kansha.batch.save_config:SaveConfig
+      session-size = kansha.batch.session_size:SessionSize
+      send-mails = kansha.batch.send_mails:SendMails
+      send-notifications = kansha.batch.notifications:SendNotifications
 
       [kansha.services]
       authentication = kansha.services.authentication_repository:AuthenticationsRepository
       mail_sender = kansha.services.mail:MailSender
       assets_manager = kansha.services.simpleassetsmanager.simpleassetsmanager:SimpleAssetsManager
+      fragment_cache = kansha.services.fragmentcache:FragmentCache
 
       [kansha.authentication]
       dblogin = kansha.authentication.database.forms:Login
@@ -100,6 +107,7 @@ setup(
       [search.engines]
       dummy = kansha.services.search.dummyengine:DummySearchEngine
       sqlite = kansha.services.search.sqliteengine:SQLiteFTSEngine
+      sqlite5 = kansha.services.search.fts5engine:SQLiteFTS5Engine
       elastic = kansha.services.search.elasticengine:ElasticSearchEngine
       """
 )
@@ -18,6 +18,8 @@
         NS = YAHOO.namespace('kansha');
     // methods to refresh cards
     NS.reload_cards = {};
+    // methods to refresh the cards of a list
+    NS.reload_lists = {};
 
     NS.app = {
         panel: undefined,
@@ -342,7 +344,7 @@
                 parent = dndCard.parentNode;
             parent.removeChild(dndCard);
             NS.app.countCards(column_id);
-            increase_version();
+            sync_board();
         },
 
         archiveCard: function (deleteFunction) {
@@ -358,7 +360,7 @@
                 NS.app.show('application', true);
             }
 
-            increase_version();
+            sync_board();
         },
 
         /**
@@ -546,6 +548,60 @@
             Dom.batch(Selector.query('#lists .list'), this.countCards);
         },
 
+        /**
+         * Synchronize the board on the notifications of the push endpoint,
+         * with Server-Sent Events or else long-polling
+         */
+        subscribeBoard: function (url, last) {
+            var subscription = {};
+            if (NS.app.boardSubscription) {
+                NS.app.boardSubscription.closed = true;
+                if (NS.app.boardSubscription.source) {
+                    NS.app.boardSubscription.source.close();
+                }
+            }
+            NS.app.boardSubscription = subscription;
+            if (window.EventSource) {
+                subscription.source = new EventSource(url + '?last=' + last);
+                subscription.source.onmessage = function () {
+                    sync_board();
+                };
+            } else {
+                var poll = function () {
+                    if (subscription.closed) {
+                        return;
+                    }
+                    $.getJSON(url, {last: last}).done(function (data) {
+                        if (data.last) {
+                            last = data.last;
+                            sync_board();
+                        }
+                        poll();
+                    }).fail(function () {
+                        setTimeout(poll, 5000);
+                    });
+                };
+                poll();
+            }
+        },
+
+        /**
+         * Render again the lists and the cards changed by the other users
+         */
+        syncBoard: function (lists, cards) {
+            var i;
+            for (i = 0; i < lists.length; i++) {
+                if (NS.reload_lists[lists[i]]) {
+                    NS.reload_lists[lists[i]]();
+                }
+            }
+            for (i = 0; i < cards.length; i++) {
+                if (NS.reload_cards[cards[i]]) {
+                    NS.reload_cards[cards[i]]();
+                }
+            }
+        },
+
         saveLimit: function (column, limit) {
             localStorage[Dom.get(column).id] = limit;
         },
@@ -580,15 +636,18 @@
             Dom.setAttribute(boardNode, 'className', 'board ' + position);
         },
 
-        create_board_calendar: function (calendar, displayWeekNumbers) {
+        create_board_calendar: function (calendar, displayWeekNumbers, feedUrl, clickedUrl, droppedUrl) {
             calendar.fullCalendar(
                 {
                     aspectRatio: 2,
+                    // only the cards due in the displayed window are fetched
+                    events: feedUrl,
                     eventClick: function (calEvent, jsEvent, view) {
-                        calEvent.clicked_cb();
+                        nagare_getAndEval(clickedUrl + calEvent.id);
                     },
                     eventDrop: function(calEvent, delta, revertFunc) {
-                        calEvent.dropped_cb(calEvent.start.format());
+                        nagare_getAndEval(droppedUrl + YAHOO.lang.JSON.stringify(
+                            {card: calEvent.id, start: calEvent.start.format()}));
                     },
                     weekNumbers: displayWeekNumbers,
                     weekNumberCalculation: "ISO",
@@ -596,13 +655,6 @@
                 });
         },
 
-        add_event: function (calendar, event, clicked_cb, dropped_cb) {
-            var myEvent = event;
-            myEvent.clicked_cb = clicked_cb;
-            myEvent.dropped_cb = dropped_cb;
-            calendar.fullCalendar('renderEvent', myEvent, true);
-        },
-
         init_ckeditor: function(id, language) {
             var editor,
                 element = Dom.get(id);
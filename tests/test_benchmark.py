@@ -0,0 +1,85 @@
+# -*- coding:utf-8 -*-
+#--
+# Copyright (c) 2012-2015 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+#--
+
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+from nagare import database
+from elixir import metadata as __metadata__
+
+from kansha import helpers
+from kansha.card.models import DataCard
+from kansha.board.models import DataBoard
+from kansha.card_addons.comment import DataComment
+from kansha.batch.benchmark import generate_data, StatementCounter
+
+
+database.set_metadata(__metadata__, 'sqlite:///:memory:', False, {})
+
+
+class BenchmarkTest(unittest.TestCase):
+
+    def setUp(self):
+        helpers.setup_db(__metadata__)
+        helpers.set_dummy_context()
+        self.counter = None
+
+    def tearDown(self):
+        if self.counter is not None:
+            self.counter.close()
+        helpers.teardown_db(__metadata__)
+
+    def test_generate_data(self):
+        manager = generate_data(nb_boards=2, nb_columns=3, nb_cards=4, nb_comments=2,
+                                nb_checklists=1, nb_items=2, nb_labels=1, nb_members=3, nb_events=1)
+        boards = DataBoard.query.filter_by(is_template=False).all()
+        self.assertEqual(len(boards), 2)
+        for board in boards:
+            self.assertEqual(len(board.columns), 4)
+            self.assertEqual(len(board.members), 3)
+            self.assertEqual(board.managers, [manager])
+        self.assertEqual(DataCard.query.count(), 2 * 3 * 4)
+        self.assertEqual(DataComment.query.count(), 2 * 3 * 4 * 2)
+
+    def test_generate_data_labels(self):
+        generate_data(nb_boards=1, nb_columns=1, nb_cards=1, nb_comments=0, nb_checklists=0,
+                      nb_items=0, nb_labels=1, nb_members=1, nb_events=0)
+        board = DataBoard.query.filter_by(is_template=False).one()
+        template = DataBoard.query.filter_by(title=u'Empty board', is_template=True).one()
+        self.assertEqual([(label.title, label.color) for label in board.labels],
+                         [(label.title, label.color) for label in template.labels])
+
+    def test_generate_data_templates(self):
+        folder = tempfile.mkdtemp()
+        try:
+            with open(os.path.join(folder, 'imported.btpl'), 'w') as template:
+                json.dump({'title': u'Imported',
+                           'columns': [{'title': u'To do',
+                                        'cards': [{'title': u'Card', 'tags': [0], 'comments': [u'Comment']}]}]},
+                          template)
+            manager = generate_data(nb_boards=1, nb_columns=1, nb_cards=1, nb_comments=0, nb_checklists=0,
+                                    nb_items=0, nb_labels=0, nb_members=1, nb_events=0, templates=folder)
+        finally:
+            shutil.rmtree(folder)
+        board = DataBoard.query.filter_by(title=u'Imported').one()
+        self.assertEqual(board.managers, [manager])
+        self.assertEqual(len(board.columns[0].cards), 1)
+        self.assertEqual(DataComment.query.count(), 1)
+
+    def test_statement_counter(self):
+        self.counter = StatementCounter(__metadata__.bind)
+        DataBoard.query.all()
+        self.assertEqual(self.counter.count, 1)
+        self.counter.close()
+        DataBoard.query.all()
+        self.assertEqual(self.counter.count, 1)
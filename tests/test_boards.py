@@ -9,14 +9,18 @@
 #--
 
 import unittest
+from datetime import datetime, timedelta
 
 from nagare import database
 from elixir import metadata as __metadata__
 
-from kansha import helpers
+from kansha import events, helpers
 from kansha.board import boardsmanager
-from kansha.board.models import DataBoard
+from kansha.card.models import DataCard
+from kansha.board.models import DataBoard, DataBoardChange
+from kansha.board.snapshot import BoardSnapshot
 from kansha.board import comp as board_module
+from kansha.services.actionlog.models import DataHistory, DataHistoryArchive
 
 
 database.set_metadata(__metadata__, 'sqlite:///:memory:', False, {})
@@ -278,6 +282,7 @@ class BoardTest(unittest.TestCase):
 
         column = board.create_column(1, u'test')
         column.create_card(u'test')
+        self.assertIsNotNone(board.data.last_activity)
         boards_manager.load_user_boards()
         self.assertIn(board.id, boards_manager.last_modified_boards)
 
@@ -285,6 +290,197 @@ class BoardTest(unittest.TestCase):
         boards_manager.load_user_boards()
         self.assertIn(board.id, boards_manager.archived_boards)
 
+    def test_get_user_boards(self):
+        '''Test boards selection through memberships'''
+        helpers.set_dummy_context()
+        board = helpers.create_board()
+        helpers.create_board()
+        user = helpers.create_user()
+        user2 = helpers.create_user('bis')
+        board.add_member(user2, 'member')
+
+        boards = DataBoard.get_user_boards(user2.username, user2.source).all()
+        self.assertEqual(len(boards), 1)
+        data, member_id, manager_id = boards[0]
+        self.assertEqual(data.id, board.id)
+        self.assertEqual(member_id, board.id)
+        self.assertIsNone(manager_id)
+
+        boards = DataBoard.get_user_boards(user.username, user.source).all()
+        self.assertEqual(len(boards), 2)
+        self.assertTrue(all(manager_id is not None for __, __, manager_id in boards))
+
+    def test_snapshot(self):
+        '''Test the board snapshot loader'''
+        helpers.set_dummy_context()
+        board = helpers.create_board()
+        column = board.columns[0]()
+        card = column.create_card(u'test')
+        snapshot = BoardSnapshot(board.data, board.card_extensions)
+        self.assertEqual([c.id for c in snapshot.columns], [c.id for c in board.data.columns])
+        self.assertIn(card.db_id, [c.id for c in snapshot.cards])
+        self.assertIn(card.db_id, snapshot.prefetched)
+        self.assertEqual(len(board.data.managers), 1)
+
+    def test_new_events(self):
+        '''Test the events fetched by id range for the notifications'''
+        helpers.set_dummy_context()
+        board = helpers.create_board()
+        user = helpers.create_user('bis')
+        card = board.columns[0]().cards[0]().data
+        DataHistory.add_history(board.data, card, user.data, u'card_title', {'card': card.title})
+        first_id = DataHistory.get_last_id()
+        DataHistory.add_history(board.data, card, user.data, u'card_weight', {'card': card.title})
+        DataHistory.add_history(board.data, card, user.data, u'card_create', {'card': card.title})
+        last_id = DataHistory.get_last_id()
+        DataHistory.add_history(board.data, card, user.data, u'card_delete', {'card': card.title})
+
+        events = DataHistory.get_new_events([board.data.id], first_id, last_id)
+        self.assertEqual(events.keys(), [board.data.id])
+        self.assertEqual([event.action for event in events[board.data.id]], [u'card_create', u'card_weight'])
+        self.assertEqual(len(DataHistory.get_new_events([board.data.id], first_id - 1, last_id)[board.data.id]), 3)
+        self.assertEqual(DataHistory.get_new_events([board.data.id], last_id, last_id), {})
+        # with hours, the recent events too
+        self.assertEqual(len(DataHistory.get_new_events([board.data.id], last_id, last_id, 24)[board.data.id]), 3)
+        self.assertEqual(DataHistory.get_new_events([], None, last_id), {})
+
+    def test_archive_history(self):
+        '''Test the archive of the old events, by chunks'''
+        helpers.set_dummy_context()
+        board = helpers.create_board()
+        user = helpers.create_user('bis')
+        card = board.columns[0]().cards[0]().data
+        old = datetime.utcnow() - timedelta(days=400)
+        for i in range(3):
+            DataHistory(when=old + timedelta(minutes=i), action=u'card_title', board=board.data, card=card,
+                        user=user.data, data={'from': u'a', 'to': u'b'})
+        DataHistory.add_history(board.data, card, user.data, u'card_weight', {'card': card.title})
+        database.session.flush()
+        before = datetime.utcnow() - timedelta(days=365)
+        self.assertEqual(DataHistory.archive(before, 2), 2)
+        self.assertEqual(DataHistory.archive(before, 2), 1)
+        self.assertEqual(DataHistory.archive(before, 2), 0)
+        self.assertEqual(DataHistory.query.filter(DataHistory.when < before).count(), 0)
+        archived = DataHistoryArchive.get_events(board.data.id)
+        self.assertEqual(len(archived), 3)
+        self.assertEqual(archived[0]['action'], u'card_title')
+        self.assertEqual(archived[0]['data'], {'from': u'a', 'to': u'b'})
+        self.assertEqual(archived[0]['user'], [user.username, user.source])
+
+    def test_history_pages(self):
+        '''Test the keyset pagination of the action log'''
+        helpers.set_dummy_context()
+        board = helpers.create_board()
+        user = helpers.create_user('bis')
+        card = board.columns[0]().cards[0]().data
+        when = datetime.utcnow() - timedelta(days=1)
+        for i in range(5):
+            # two events at the same date
+            DataHistory(when=when + timedelta(minutes=i // 2), action=u'card_weight', board=board.data, card=card,
+                        user=user.data, data={'card': card.title, 'from': i, 'to': i + 1})
+        database.session.flush()
+        events = DataHistory.get_history(board.data, username=user.username, limit=2)
+        while True:
+            last = events[-1]
+            page = DataHistory.get_history(board.data, username=user.username, before=(last.when, last.id), limit=2)
+            if not page:
+                break
+            events.extend(page)
+        self.assertEqual([event.data['from'] for event in events], [4, 3, 2, 1, 0])
+        self.assertEqual(len(DataHistory.get_history(board.data, cardid=card.id, username=user.username)), 5)
+        self.assertEqual(DataHistory.get_history(board.data, username=u'nobody'), [])
+
+    def test_buffered_history(self):
+        '''Test the events written together at flush time'''
+        helpers.set_dummy_context()
+        board = helpers.create_board()
+        user = helpers.create_user('bis')
+        card, deleted = [card().data for card in board.columns[0]().cards[:2]]
+        database.session.flush()
+        for i in range(3):
+            DataHistory.add_history(board.data, card, user.data, u'card_weight', {'card': card.title, 'from': i, 'to': i + 1})
+        DataHistory.add_history(board.data, deleted, user.data, u'card_delete', {'card': deleted.title})
+        database.session.delete(deleted)
+        database.session.flush()
+        events = DataHistory.get_history(board.data, username=user.username)
+        self.assertEqual([event.action for event in events], [u'card_weight'] * 3)
+        self.assertEqual(events[0].card, card)
+
+    def test_sync(self):
+        '''Test the synchronisation of a board with the changes of the other sessions'''
+        helpers.set_dummy_context()
+        DataBoardChange.set_origin(u'me')
+        board = helpers.create_board()
+        database.session.flush()
+        other = self.boards_manager.get_by_id(board.id)
+        self.assertIsNone(other.sync())
+
+        # a card updated
+        card = board.columns[0]().cards[0]()
+        card.set_title(u'New title')
+        database.session.flush()
+        self.assertIsNone(board.sync())
+        DataBoardChange.set_origin(u'other')
+        columns, cards = other.sync()
+        self.assertEqual(columns, [])
+        self.assertEqual([c().db_id for c in cards], [card.db_id])
+        self.assertIsNone(other.sync())
+
+        # a card moved
+        DataBoardChange.set_origin(u'me')
+        orig, dest = board.columns[0]().data, board.columns[1]().data
+        orig.remove_card(card.data)
+        dest.insert_card(0, card.data)
+        database.session.flush()
+        DataBoardChange.set_origin(u'other')
+        columns, cards = other.sync()
+        self.assertEqual(sorted(col().db_id for col in columns), sorted((orig.id, dest.id)))
+        self.assertEqual(cards, [])
+        self.assertEqual(other.columns[1]().cards[0]().db_id, card.db_id)
+
+        # a column added
+        DataBoardChange.set_origin(u'me')
+        board.create_column(0, u'New column')
+        database.session.flush()
+        DataBoardChange.set_origin(u'other')
+        self.assertIs(other.sync(), True)
+        self.assertEqual(other.count_columns(), board.count_columns())
+        self.assertIsNone(other.sync())
+
+    def test_card_state(self):
+        '''Test the sub components of the closed cards are not kept in the session'''
+        helpers.set_dummy_context()
+        board = helpers.create_board()
+        closed, opened = board.columns[0]().cards[:2]
+        closed().extensions
+        closed().title
+        opened.on_answer(lambda event: None)
+        opened().emit_event(opened, events.CardClicked)
+        opened().extensions
+        closed().__getstate__()
+        opened().__getstate__()
+        self.assertFalse(closed().has_extensions)
+        self.assertIsNone(closed()._title)
+        self.assertTrue(opened().has_extensions)
+        # rebuilt on demand
+        self.assertIsNotNone(closed().title)
+        self.assertIsNotNone(closed()._title)
+
+    def test_cards_by_members(self):
+        '''Test the cards of the notified users, loaded in one query'''
+        helpers.set_dummy_context()
+        board = helpers.create_board()
+        user = helpers.create_user('bis')
+        other = helpers.create_user('ter')
+        cards = [card().data for card in board.columns[0]().cards[:2]]
+        for card in cards:
+            card.members.append(user.data)
+        database.session.flush()
+        cards_by_members = DataCard.get_cards_by_members([user.data, other.data])
+        self.assertEqual(cards_by_members[(user.username, user.source)], set(card.id for card in cards))
+        self.assertEqual(cards_by_members[(other.username, other.source)], set())
+        self.assertEqual(DataCard.get_cards_by_members([]), {})
+
     def test_get_by(self):
         '''Test get_by_uri and get_by_id methods'''
         helpers.set_dummy_context()
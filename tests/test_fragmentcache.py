@@ -0,0 +1,51 @@
+# -*- coding:utf-8 -*-
+#--
+# Copyright (c) 2012-2014 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+#--
+
+import unittest
+
+from kansha.services import fragmentcache
+
+
+class FragmentCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        fragmentcache._fragments.clear()
+        # 1 kilobyte
+        self.cache = fragmentcache.FragmentCache('', None, max_size=1)
+
+    def tearDown(self):
+        fragmentcache._fragments.clear()
+
+    def test_get_set(self):
+        self.assertIsNone(self.cache.get((1, 0, 'badge')))
+        self.cache.set((1, 0, 'badge'), '<span>1</span>')
+        self.assertEqual(self.cache.get((1, 0, 'badge')), '<span>1</span>')
+        # another version
+        self.assertIsNone(self.cache.get((1, 1, 'badge')))
+
+    def test_lru(self):
+        '''The least recently used fragments are evicted first, within the budget'''
+        fragment = 'x' * 300
+        for i in range(3):
+            self.cache.set(i, fragment)
+        self.cache.get(0)
+        self.cache.set(3, fragment)
+        self.assertEqual(len(fragmentcache._fragments), 3)
+        self.assertIsNone(self.cache.get(1))
+        self.assertEqual(self.cache.get(0), fragment)
+        self.assertTrue(fragmentcache._fragments.size <= 1024)
+        # too large to be kept
+        self.cache.set(4, 'x' * 2000)
+        self.assertIsNone(self.cache.get(4))
+
+    def test_disabled(self):
+        cache = fragmentcache.FragmentCache('', None, max_size=0)
+        cache.set(1, '<span>1</span>')
+        self.assertIsNone(cache.get(1))
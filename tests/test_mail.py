@@ -0,0 +1,278 @@
+# -*- coding:utf-8 -*-
+#--
+# Copyright (c) 2012-2014 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+#--
+
+import os
+import time
+import smtpd
+import shutil
+import socket
+import asyncore
+import tempfile
+import threading
+import unittest
+from datetime import datetime, timedelta
+
+from nagare import database
+from elixir import metadata as __metadata__
+
+from kansha import helpers, notifications
+from kansha.app import comp as app_module
+from kansha.user.models import DataBoardMember
+from kansha.services.services_repository import ServicesRepository
+from kansha.services.mail import MailSender, RateLimiter
+from kansha.services.actionlog.models import DataHistory
+
+
+class SMTPServer(smtpd.SMTPServer):
+    '''Local SMTP server keeping the messages it receives'''
+
+    def __init__(self):
+        smtpd.SMTPServer.__init__(self, ('127.0.0.1', 0), None)
+        self.port = self.socket.getsockname()[1]
+        self.connections = 0
+        self.messages = []
+        # recipients refused with a permanent error
+        self.refused = set()
+
+    def handle_accept(self):
+        self.connections += 1
+        smtpd.SMTPServer.handle_accept(self)
+
+    def process_message(self, peer, mailfrom, rcpttos, data):
+        if self.refused.intersection(rcpttos):
+            return '550 Recipient refused'
+        self.messages.append((mailfrom, rcpttos, data))
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.serve)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def serve(self):
+        while self.running:
+            asyncore.loop(timeout=0.05, count=1)
+
+    def stop(self):
+        self.running = False
+        self.thread.join()
+        asyncore.close_all()
+
+
+def free_port():
+    s = socket.socket()
+    s.bind(('127.0.0.1', 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+
+class MailSenderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.spool = tempfile.mkdtemp()
+        self.server = None
+
+    def tearDown(self):
+        if self.server is not None:
+            self.server.stop()
+        shutil.rmtree(self.spool)
+
+    def start_server(self):
+        self.server = SMTPServer()
+        self.server.start()
+        return self.server.port
+
+    def create_sender(self, port, max_per_connection=100, queue=''):
+        return MailSender('', None, '127.0.0.1', port, 'noreply@test.test', True, max_per_connection, self.spool,
+                          queue)
+
+    def messages(self, nb):
+        return [{'subject': u'Test %d' % i, 'to': [u'user%d@test.test' % i], 'content': u'Content %d' % i}
+                for i in xrange(nb)]
+
+    def test_send_many(self):
+        '''Messages are sent on the same connection, renewed every max_per_connection messages'''
+        sender = self.create_sender(self.start_server(), max_per_connection=2)
+        sender.send_many(self.messages(5))
+        self.assertEqual(len(self.server.messages), 5)
+        self.assertEqual(self.server.connections, 3)
+        self.assertEqual(self.server.messages[0][1], [u'user0@test.test'])
+
+    def test_send(self):
+        '''Out of a batch, a connection per message'''
+        sender = self.create_sender(self.start_server())
+        for message in self.messages(2):
+            sender.send(**message)
+        self.assertEqual(len(self.server.messages), 2)
+        self.assertEqual(self.server.connections, 2)
+
+    def test_spool(self):
+        '''Messages that could not be sent are spooled, then sent again'''
+        port = free_port()
+        sender = self.create_sender(port)
+        sender.send_many(self.messages(3))
+        self.assertEqual(len(os.listdir(self.spool)), 3)
+
+        sender.port = self.start_server()
+        self.assertEqual(sender.send_spooled(), 3)
+        self.assertEqual(os.listdir(self.spool), [])
+        self.assertEqual(sorted(rcpttos for __, rcpttos, __ in self.server.messages),
+                         [[u'user0@test.test'], [u'user1@test.test'], [u'user2@test.test']])
+
+    def test_lost(self):
+        '''Without spool, the errors are only raised on demand'''
+        sender = MailSender('', None, '127.0.0.1', free_port(), 'noreply@test.test', True)
+        message = self.messages(1)[0]
+        sender.send(**message)
+        self.assertRaises(socket.error, sender.send, raise_errors=True, **message)
+
+    def test_queue(self):
+        '''Queued messages are sent by process_queue'''
+        sender = self.create_sender(self.start_server(), queue=os.path.join(self.spool, 'queue.db'))
+        sender.send_many(self.messages(3))
+        self.assertEqual(self.server.messages, [])
+        self.assertEqual(len(sender.queue), 3)
+        self.assertEqual(sender.process_queue(), 3)
+        self.assertEqual(len(self.server.messages), 3)
+        self.assertEqual(len(sender.queue), 0)
+
+    def test_queue_retry(self):
+        '''Messages that could not be sent stay in the queue, for later'''
+        sender = self.create_sender(free_port(), queue=os.path.join(self.spool, 'queue.db'))
+        sender.send_many(self.messages(2))
+        self.assertEqual(sender.process_queue(), 2)
+        self.assertEqual(len(sender.queue), 2)
+        # not due yet
+        self.assertEqual(sender.process_queue(), 0)
+
+    def test_queue_dead_letters(self):
+        '''Messages abandoned after MAX_ATTEMPTS attempts are listed, then purged'''
+        sender = self.create_sender(free_port(), queue=os.path.join(self.spool, 'queue.db'))
+        sender.send_many(self.messages(2))
+        queue = sender.queue
+        queue.RETRY_DELAY = 0
+        for __ in xrange(queue.MAX_ATTEMPTS):
+            self.assertEqual(sender.process_queue(), 2)
+        self.assertEqual(sender.process_queue(), 0)
+        self.assertEqual(len(queue), 0)
+        self.assertEqual(sorted(to for __, __, to, __ in queue.dead_letters()),
+                         [[u'user0@test.test'], [u'user1@test.test']])
+        self.assertEqual(queue.purge(), 2)
+        self.assertEqual(queue.dead_letters(), [])
+
+    def test_rate_limiter(self):
+        '''At most rate calls per second'''
+        limiter = RateLimiter(100)
+        start = time.time()
+        for __ in xrange(11):
+            limiter.wait()
+        self.assertTrue(time.time() - start >= 0.1)
+
+
+class MailDatabaseTestCase(unittest.TestCase):
+
+    def setUp(self):
+        database.set_metadata(__metadata__, 'sqlite:///:memory:', False, {})
+        helpers.setup_db(__metadata__)
+        self.server = None
+
+    def tearDown(self):
+        if self.server is not None:
+            self.server.stop()
+        helpers.teardown_db(__metadata__)
+
+    def start_server(self):
+        self.server = SMTPServer()
+        self.server.start()
+        return self.server.port
+
+
+class InvitationTest(MailDatabaseTestCase):
+
+    def test_refused_invitation(self):
+        '''A refused recipient doesn't prevent the other invitations'''
+        helpers.set_context(helpers.create_user())
+        board = helpers.create_board()
+        board.mail_sender = MailSender('', None, '127.0.0.1', self.start_server(), 'noreply@test.test', True)
+        self.server.refused.add(u'refused@test.test')
+        board.invite_members([u'refused@test.test', u'invited@test.test'], 'http://localhost')
+        self.assertEqual([rcpttos for __, rcpttos, __ in self.server.messages], [[u'invited@test.test']])
+        self.assertEqual(sorted(token.username for token in board.data.pending),
+                         [u'invited@test.test', u'refused@test.test'])
+
+
+class NotificationsTest(MailDatabaseTestCase):
+
+    def create_app(self, port, render=False):
+        app = app_module.WSGIApp(lambda *args: None)
+        app._services = ServicesRepository()
+        app._services.register('mail_sender', MailSender('', None, '127.0.0.1', port, 'noreply@test.test', True))
+        app.app_title = u'Kansha'
+        app.activity_monitor = ''
+        if not render:
+            # the rendering of the emails is not under test
+            app.render_notifications = lambda board_ids, last_id, hours, url: [
+                (board_id, 0, [(self.key, self.user.data.email, u'Subject', u'Content', None)], [])
+                for board_id in board_ids
+            ]
+        return app
+
+    def create_subscriber(self, suffixe):
+        user = helpers.create_user(suffixe)
+        self.board.data.members.append(user.data)
+        database.session.flush()
+        member = DataBoardMember.get_by(board=self.board.data, member=user.data)
+        member.notify = notifications.NOTIFY_ALL
+        return user, member
+
+    def get_watermark(self):
+        q = database.session.query(DataBoardMember.last_notified_event)
+        return q.filter_by(board_id=self.board.id, user_username=self.user.username).scalar()
+
+    def add_event(self, action):
+        card = self.board.columns[0]().cards[0]().data
+        DataHistory.add_history(self.board.data, card, self.user.data, action, {'card': card.title})
+        database.session.flush()
+        return DataHistory.get_last_id()
+
+    def test_failed_notification(self):
+        '''The watermark of a notification that could not be sent, nor spooled, is kept'''
+        helpers.set_dummy_context()
+        self.board = helpers.create_board()
+        self.user, __ = self.create_subscriber('bis')
+        self.key = (self.board.id, self.user.username, self.user.source)
+        self.add_event(u'card_title')
+
+        self.create_app(free_port()).send_notifications(24, 'http://localhost/')
+        self.assertIsNone(self.get_watermark())
+
+        self.create_app(self.start_server()).send_notifications(24, 'http://localhost/')
+        self.assertEqual(len(self.server.messages), 1)
+        self.assertEqual(self.get_watermark(), DataHistory.get_last_id())
+
+    def test_missed_runs(self):
+        '''The events older than the timespan are sent to the subscribers already notified'''
+        helpers.set_context(helpers.create_user())
+        self.board = helpers.create_board()
+        self.user, member = self.create_subscriber('bis')
+        self.create_subscriber('ter')
+        member.last_notified_event = self.add_event(u'card_title')
+        last_id = self.add_event(u'card_weight')
+        # the batch didn't run for two days
+        table = DataHistory.table
+        database.session.execute(table.update().where(table.c.id == last_id)
+                                 .values(when=datetime.utcnow() - timedelta(hours=48)))
+        database.session.expire_all()
+
+        self.create_app(self.start_server(), render=True).send_notifications(24, 'http://localhost/')
+        # the new subscriber only gets the events of the last 24 hours
+        self.assertEqual([rcpttos for __, rcpttos, __ in self.server.messages], [[self.user.data.email]])
+        self.assertEqual(self.get_watermark(), last_id)
@@ -0,0 +1,39 @@
+# -*- coding:utf-8 -*-
+#--
+# Copyright (c) 2012-2015 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+#--
+
+import sys
+import unittest
+
+from kansha.pickle import SizePickler
+
+
+class Node(object):
+
+    def __init__(self, children=()):
+        self.children = list(children)
+        self.callback = lambda: None
+
+
+class SizePicklerTest(unittest.TestCase):
+
+    def test_sizes(self):
+        '''The sizes by type add up to the pickle size'''
+        pickler = SizePickler()
+        total = pickler.measure(Node([Node(), Node()]))
+        self.assertEqual(pickler.sizes['%s.Node' % __name__][0], 3)
+        # the protocol header and the STOP opcode aren't part of any object
+        self.assertEqual(sum(size for __, size in pickler.sizes.itervalues()), total - 3)
+
+    def test_unpicklable(self):
+        '''Closures are counted apart, outside of Stackless Python'''
+        pickler = SizePickler()
+        pickler.measure(Node())
+        expected = {} if 'stackless' in sys.modules else {'__builtin__.function': 1}
+        self.assertEqual(dict(pickler.unpicklable), expected)
@@ -0,0 +1,97 @@
+# -*- coding:utf-8 -*-
+#--
+# Copyright (c) 2012-2014 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+#--
+
+import json
+import time
+import shutil
+import os.path
+import tempfile
+import threading
+import unittest
+
+from webob import Request
+
+from kansha.push import Broker, SQLiteFanout, PushWSGIMiddleware
+
+
+def application(environ, start_response):
+    start_response('200 OK', [('Content-Type', 'text/plain')])
+    return ['application']
+
+
+class BrokerTest(unittest.TestCase):
+
+    def test_wait(self):
+        '''Subscribers wait for a sequence number greater than theirs'''
+        broker = Broker()
+        broker.publish('board', 3)
+        self.assertEqual(broker.wait('board', 2, 0), 3)
+        self.assertIsNone(broker.wait('board', 3, 0.01))
+        self.assertIsNone(broker.wait('other', 0, 0.01))
+        # late publications are ignored
+        broker.publish('board', 1)
+        self.assertEqual(broker.wait('board', 0, 0), 3)
+
+    def test_notify(self):
+        '''Waiting subscribers are woken up by the publications'''
+        broker = Broker()
+        results = []
+        thread = threading.Thread(target=lambda: results.append(broker.wait('board', 0, 5)))
+        thread.start()
+        time.sleep(0.05)
+        broker.publish('board', 7)
+        thread.join()
+        self.assertEqual(results, [7])
+
+    def test_fanout(self):
+        '''Processes share their publications through a SQLite file'''
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, 'push.db')
+            broker1, broker2 = Broker(), Broker()
+            fanout1 = SQLiteFanout(path, broker1, 3600)
+            fanout2 = SQLiteFanout(path, broker2, 3600)
+            fanout1.publish('board', 4)
+            fanout2.poll()
+            self.assertEqual(broker2.wait('board', 0, 0), 4)
+            self.assertEqual(fanout2.poll(), 0)
+        finally:
+            shutil.rmtree(tmpdir)
+
+
+class PushWSGIMiddlewareTest(unittest.TestCase):
+
+    def setUp(self):
+        self.broker = Broker()
+        self.app = PushWSGIMiddleware(application, timeout=0.05, keepalive=0.02, broker=self.broker)
+
+    def test_application(self):
+        '''The other URLs are served by the application'''
+        response = Request.blank('/board/1').get_response(self.app)
+        self.assertEqual(response.body, 'application')
+
+    def test_long_polling(self):
+        '''The new sequence number, or null on timeout'''
+        response = Request.blank('/push/board?last=0').get_response(self.app)
+        self.assertEqual(json.loads(response.body), {'last': None})
+        self.broker.publish('board', 2)
+        response = Request.blank('/push/board?last=0').get_response(self.app)
+        self.assertEqual(json.loads(response.body), {'last': 2})
+        self.assertEqual(Request.blank('/push/').get_response(self.app).status_int, 404)
+        self.assertEqual(Request.blank('/push/board?last=x').get_response(self.app).status_int, 400)
+
+    def test_event_stream(self):
+        '''The sequence numbers as Server-Sent Events, after the Last-Event-ID'''
+        self.broker.publish('board', 2)
+        request = Request.blank('/push/board', headers={'Accept': 'text/event-stream', 'Last-Event-ID': '1'})
+        response = request.get_response(self.app)
+        self.assertEqual(response.content_type, 'text/event-stream')
+        self.assertIn('id: 2\ndata: 2\n\n', response.body)
+        self.assertIn(':\n\n', response.body)
@@ -10,7 +10,7 @@
 
 import unittest
 
-from kansha.services.search import schema, sqliteengine, elasticengine
+from kansha.services.search import schema, sqliteengine, fts5engine, elasticengine
 
 #TODO: test all types on schema, doc creation and search
 
@@ -192,6 +192,28 @@ class SearchTestCase(object):
     def test_add_document(self):
         self.load_documents()
 
+    def test_add_documents(self):
+        docs = [self.MyDocument('doc%d' % i, title=u'Titre %d' % i, tags=u'bulk',
+                                pages=i, description=u'', price=1.0)
+                for i in range(10)]
+        docs.append(self.Person('p1', firstname=u'John', lastname=u'Doe', height=180,
+                                weight=80.5, age=40))
+        self.engine.add_documents(docs)
+        self.engine.commit(sync=True)
+        res = self.engine.search(self.MyDocument.match(u'bulk'), size=20)
+        self.assertEqual(len(res), 10)
+        res = self.engine.search(self.Person.lastname == u'Doe')
+        self.assertEqual(len(res), 1)
+
+    def test_update_documents(self):
+        self.load_documents()
+        docs = [self.MyDocument.delta('doc1', title=u'Titre augmenté'),
+                self.MyDocument.delta('doc2', title=u'Tests augmentés')]
+        self.engine.update_documents(docs)
+        self.engine.commit(sync=True)
+        res = self.engine.search(self.MyDocument.match(u'augment'))
+        self.assertEqual(len(res), 2)
+
     def test_remove_document(self):
         self.load_documents()
         self.engine.delete_document(self.MyDocument, 'doc1')
@@ -271,6 +293,29 @@ class SearchTestCase(object):
         res = self.engine.search(query)
         self.assertEqual(len(res), 0)
 
+    def test_ranking(self):
+        self.load_documents()
+        doc3 = self.MyDocument(
+            'doc3', title=u'Services', tags=u'services',
+            pages=12, description=u'Services, services and more services.', price=1.0)
+        self.engine.add_document(doc3)
+        self.engine.commit(sync=True)
+        res = self.engine.search(self.MyDocument.match(u'services'))
+        self.assertEqual(len(res), 3)
+        self.assertEqual(res[0][1]._id, 'doc3')
+        self.assertTrue(res[0][0] > res[-1][0])
+
+    def test_match_and_filter(self):
+        self.load_documents()
+        query = self.MyDocument.match(u'best') & (self.MyDocument.pages == 89)
+        self.assertEqual(len(self.engine.search(query)), 2)
+        query = self.MyDocument.match(u'best') & (self.MyDocument.pages == 90)
+        self.assertEqual(len(self.engine.search(query)), 0)
+        query = self.MyDocument.match(u'best') & (self.MyDocument.price > 9.95)
+        res = self.engine.search(query)
+        self.assertEqual(len(res), 1)
+        self.assertEqual(res[0][1]._id, 'doc1')
+
     def test_special_chars(self):
         self.load_documents()
         query = self.MyDocument.match('"best')
@@ -306,6 +351,41 @@ class TestSQLiteEngine(SearchTestCase, unittest.TestCase):
     def _create_search_engine(self):
         return sqliteengine.SQLiteFTSEngine(self.collection, u'/tmp')
 
+    def test_bulk_pragmas(self):
+        '''Durability is only traded for speed on explicit bulk loads'''
+        synchronous = lambda: self.engine.connection.execute('PRAGMA synchronous').fetchone()[0]
+        default = synchronous()
+        self.engine.add_documents([self.Person('p1', firstname=u'John', lastname=u'Doe', height=180,
+                                               weight=80.5, age=40)])
+        self.engine.commit()
+        self.assertEqual(synchronous(), default)
+        self.engine.add_documents([self.Person('p2', firstname=u'Joan', lastname=u'Watson', height=170,
+                                               weight=60, age=42)], bulk=True)
+        self.engine.commit()
+        self.assertEqual(synchronous(), 0)
+
+
+class TestSQLiteFTS5Engine(SearchTestCase, unittest.TestCase):
+
+    def _create_search_engine(self):
+        try:
+            return fts5engine.SQLiteFTS5Engine(self.collection, u'/tmp')
+        except ImportError as exc:
+            self.skipTest(unicode(exc))
+
+    def test_card_moved(self):
+        self.load_documents()
+        self.engine.update_document(self.MyDocument.delta('doc1', pages=90))
+        self.engine.commit(sync=True)
+        res = self.engine.search(self.MyDocument.match(u'best') & (self.MyDocument.pages == 90))
+        self.assertEqual(len(res), 1)
+        self.assertEqual(res[0][1]._id, 'doc1')
+
+    def test_optimize(self):
+        self.load_documents()
+        self.engine.optimize()
+        self.assertEqual(len(self.engine.search(self.MyDocument.match(u'best'))), 2)
+
 
 class TestElasticEngine(SearchTestCase, unittest.TestCase):
 
@@ -322,6 +402,15 @@ class TestSQLiteEngineImpSchema(ImpSchemaSearchTestCase, unittest.TestCase):
         return sqliteengine.SQLiteFTSEngine(self.collection, u'/tmp')
 
 
+class TestSQLiteFTS5EngineImpSchema(ImpSchemaSearchTestCase, unittest.TestCase):
+
+    def _create_search_engine(self):
+        try:
+            return fts5engine.SQLiteFTS5Engine(self.collection, u'/tmp')
+        except ImportError as exc:
+            self.skipTest(unicode(exc))
+
+
 class TestElasticEngineImpSchema(ImpSchemaSearchTestCase, unittest.TestCase):
 
     def _create_search_engine(self):
@@ -8,6 +8,9 @@
 # this distribution.
 #--
 
+import os
+import shutil
+import tempfile
 import pkg_resources
 import unittest
 
@@ -92,3 +95,90 @@ class SimpleAssetsManagerTest(unittest.TestCase):
         self.assertEqual(file_id, "test.jpg")
         res_data, _ = self.dam.load("test.jpg")
         self.assertEqual(res_data, data)
+
+
+class SharedAssetsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.basedir = tempfile.mkdtemp()
+        self.dam = simpleassetsmanager.SimpleAssetsManager(
+            '', None, basedir=self.basedir, baseurl='kansha', max_size=2048, workers=0)
+        package = pkg_resources.Requirement.parse('kansha')
+        test_file = pkg_resources.resource_filename(
+            package, 'kansha/services/dummyassetsmanager/tie.jpg')
+        with open(test_file, 'r') as f:
+            self.data = f.read()
+
+    def tearDown(self):
+        shutil.rmtree(self.basedir)
+
+    def blobs(self):
+        return [filename for __, __, filenames in os.walk(os.path.join(self.basedir, 'blobs'))
+                for filename in filenames if not filename.startswith('.')]
+
+    def test_deduplication(self):
+        """SharedAssetsTest - Identical files and copies share their bytes and derived images"""
+        file_id = self.dam.save(self.data, metadata={'filename': 'tie.jpg'})
+        other_id = self.dam.save(self.data, metadata={'filename': 'other.jpg'})
+        copy_id = self.dam.copy(file_id)
+        self.assertEqual(len(set([file_id, other_id, copy_id])), 3)
+        # bytes, medium, thumbnail and references
+        self.assertEqual(len(self.blobs()), 4)
+        self.assertEqual(self.dam.load(copy_id), (self.data, {'filename': 'tie.jpg'}))
+        self.assertEqual(self.dam.get_metadata(other_id), {'filename': 'other.jpg'})
+
+        self.dam.delete(file_id)
+        self.dam.delete(copy_id)
+        self.assertEqual(self.dam.load(other_id, 'thumb')[1], {'filename': 'other.jpg'})
+        self.dam.delete(other_id)
+        self.assertEqual(self.blobs(), [])
+
+    def test_migrate(self):
+        """SharedAssetsTest - Files stored before are moved to the blobs"""
+        for file_id in ('old1', 'old2'):
+            with open(os.path.join(self.basedir, file_id), 'w') as f:
+                f.write(self.data)
+            with open(os.path.join(self.basedir, file_id + '.metadata'), 'w') as f:
+                f.write('{"filename": "%s.jpg"}' % file_id)
+        self.assertEqual(self.dam.load('old1')[0], self.data)
+
+        self.assertEqual(list(self.dam.migrate_all()), [('old1', False), ('old2', True)])
+        self.assertEqual(list(self.dam.migrate_all()), [])
+        self.assertFalse(os.path.exists(os.path.join(self.basedir, 'old1')))
+        self.assertEqual(self.dam.load('old2'), (self.data, {'filename': 'old2.jpg'}))
+        self.assertEqual(len(self.blobs()), 2)
+
+
+class BackgroundGenerationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.basedir = tempfile.mkdtemp()
+        self.dam = simpleassetsmanager.SimpleAssetsManager(
+            '', None, basedir=self.basedir, baseurl='kansha', max_size=2048, workers=1)
+        package = pkg_resources.Requirement.parse('kansha')
+        test_file = pkg_resources.resource_filename(
+            package, 'kansha/services/dummyassetsmanager/tie.jpg')
+        with open(test_file, 'r') as f:
+            self.data = f.read()
+
+    def tearDown(self):
+        simpleassetsmanager._jobs.join()
+        shutil.rmtree(self.basedir)
+
+    def test_derived_images(self):
+        """BackgroundGenerationTest - The thumbnail and medium sizes are generated by the workers"""
+        file_id = self.dam.save(self.data, metadata={'filename': 'tie.jpg', 'content-type': 'image/jpeg'})
+        simpleassetsmanager._jobs.join()
+        self.assertTrue(os.path.exists(self.dam._get_filename(file_id, 'thumb')))
+        self.assertTrue(os.path.exists(self.dam._get_filename(file_id, 'medium')))
+
+    def test_cover(self):
+        """BackgroundGenerationTest - A placeholder is served until the cover is generated"""
+        file_id = self.dam.save(self.data, metadata={'filename': 'tie.jpg', 'content-type': 'image/jpeg'})
+        simpleassetsmanager._jobs.join()
+        self.assertEqual(self.dam.get_placeholder(file_id, 'cover')[1], 'image/gif')
+        self.dam.create_cover(file_id, 0, 0, 100, 50)
+        simpleassetsmanager._jobs.join()
+        width, height = simpleassetsmanager.Image.open(self.dam._get_filename(file_id, 'cover')).size
+        self.assertTrue(width <= self.dam.COVER_SIZE[0] and height <= self.dam.COVER_SIZE[1])
+        self.assertEqual(self.dam.get_placeholder(file_id, 'large'), None)